@@ -16,11 +16,18 @@ from .models import (
     AcademicDepartment,
     WeeklyLessonPlan,
     CoursePlan,
+    BackgroundJob,
+    AttainmentRun,
+    DirtyAttainmentScope,
 )
 from users.models import (
     UserProfile,
 )  # Import UserProfile if needed for custom admin (e.g. Department HOD display)
 from django import forms
+from django.db.models import Avg, Count
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from datetime import timedelta
 
 
 # --- Academic Year Admin ---
@@ -205,7 +212,8 @@ class COPOMappingAdmin(admin.ModelAdmin):
 # --- Assessment Type Admin ---
 @admin.register(AssessmentType)
 class AssessmentTypeAdmin(admin.ModelAdmin):
-    list_display = ("name",)
+    list_display = ("name", "is_external")
+    list_filter = ("is_external",)
     search_fields = ("name",)
     ordering = ["name"]
 
@@ -288,6 +296,9 @@ class CourseOutcomeAttainmentAdmin(admin.ModelAdmin):
         "course_outcome",
         "academic_year", # <-- This is direct FK, keep as is
         "attainment_percentage",
+        "attainment_level",
+        "ci_lower",
+        "ci_upper",
         "get_course_code",
         "get_department_name",
     )
@@ -333,7 +344,7 @@ class CourseOutcomeAttainmentAdmin(admin.ModelAdmin):
 # --- Program Outcome Attainment Admin ---
 @admin.register(ProgramOutcomeAttainment)
 class ProgramOutcomeAttainmentAdmin(admin.ModelAdmin):
-    list_display = ("program_outcome", "academic_year", "attainment_percentage")
+    list_display = ("program_outcome", "academic_year", "attainment_percentage", "attainment_level")
     list_filter = ("academic_year", "program_outcome") # Keep AY
     search_fields = (
         "program_outcome__code",
@@ -344,6 +355,101 @@ class ProgramOutcomeAttainmentAdmin(admin.ModelAdmin):
     autocomplete_fields = ["program_outcome", "academic_year"] # Keep AY
 
 
+
+
+# --- Attainment Run Admin ---
+@admin.register(AttainmentRun)
+class AttainmentRunAdmin(admin.ModelAdmin):
+    list_display = (
+        "started_at",
+        "kind",
+        "get_scope",
+        "academic_year",
+        "engine",
+        "source",
+        "triggered_by",
+        "skipped",
+        "total_seconds",
+        "load_seconds",
+        "compute_seconds",
+        "write_seconds",
+        "rows_read",
+        "rows_written",
+        "query_count",
+    )
+    list_filter = ("kind", "source", "engine", "skipped", "academic_year")
+    search_fields = ("course__code", "department__name", "triggered_by__username")
+    date_hierarchy = "started_at"
+    list_select_related = ("course", "department", "academic_year", "triggered_by")
+    change_list_template = "admin/academics/attainmentrun/change_list.html"
+    trend_days = 365
+
+    def get_scope(self, obj):
+        if obj.course:
+            return obj.course.code
+        return obj.department.name if obj.department else "-"
+
+    get_scope.short_description = "Scope"
+
+    def has_add_permission(self, request):
+        return False
+
+    def changelist_view(self, request, extra_context=None):
+        # Daily average duration of recomputed runs, per kind, for the trend chart
+        since = timezone.now() - timedelta(days=self.trend_days)
+        rows = (
+            AttainmentRun.objects.filter(started_at__gte=since, skipped=False)
+            .annotate(day=TruncDate("started_at"))
+            .values("day", "kind")
+            .annotate(avg_seconds=Avg("total_seconds"), avg_rows=Avg("rows_read"), runs=Count("pk"))
+            .order_by("day")
+        )
+        days = sorted({row["day"] for row in rows})
+        series = {kind: {} for kind in AttainmentRun.Kind.values}
+        for row in rows:
+            series[row["kind"]][row["day"]] = row
+        extra_context = extra_context or {}
+        extra_context["run_trend"] = {
+            "labels": [day.isoformat() for day in days],
+            "datasets": [
+                {
+                    "label": f"{label} (avg seconds)",
+                    "seconds": [round(series[kind][day]["avg_seconds"], 3) if day in series[kind] else None for day in days],
+                    "rows": [round(series[kind][day]["avg_rows"]) if day in series[kind] else None for day in days],
+                }
+                for kind, label in AttainmentRun.Kind.choices
+            ],
+        }
+        return super().changelist_view(request, extra_context=extra_context)
+
+# --- Background Job Admin ---
+@admin.register(BackgroundJob)
+class BackgroundJobAdmin(admin.ModelAdmin):
+    list_display = ("id", "task", "status", "attempts", "max_attempts", "created_by", "created_at", "finished_at")
+    list_filter = ("status", "task")
+    search_fields = ("task", "created_by__username")
+    readonly_fields = ("created_at", "started_at", "lease_expires_at", "finished_at", "worker")
+    actions = ["requeue_jobs"]
+
+    @admin.action(description="Re-queue selected jobs")
+    def requeue_jobs(self, request, queryset):
+        # Running jobs are left alone unless their lease has passed, i.e. their worker was lost
+        now = timezone.now()
+        updated = queryset.exclude(status=BackgroundJob.Status.RUNNING, lease_expires_at__gte=now).update(
+            status=BackgroundJob.Status.QUEUED, attempts=0, run_after=now, finished_at=None, lease_expires_at=None
+        )
+        self.message_user(request, f"{updated} job(s) re-queued.")
+
+# --- Dirty Attainment Ledger Admin ---
+@admin.register(DirtyAttainmentScope)
+class DirtyAttainmentScopeAdmin(admin.ModelAdmin):
+    list_display = ("marked_at", "course", "department", "academic_year", "claimed_at")
+    list_filter = ("academic_year", "department")
+    list_select_related = ("course", "department", "academic_year")
+
+    def has_add_permission(self, request):
+        return False
+
 # --- ADD THIS NEW ADMIN REGISTRATION ---
 @admin.register(WeeklyLessonPlan)
 class WeeklyLessonPlanAdmin(admin.ModelAdmin):
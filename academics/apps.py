@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class AcademicsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'academics'
+
+    def ready(self):
+        from . import signals  # noqa: F401  (registers the signal receivers)
+        from . import tasks  # noqa: F401  (registers the background job handlers)
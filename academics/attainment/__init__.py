@@ -0,0 +1,287 @@
+# academics/attainment/__init__.py
+from functools import partial
+
+from django.conf import settings
+
+from ..models import AttainmentRun
+from . import cia, incremental, matrix, scores, sql
+from .bootstrap import bootstrap_intervals
+from .fingerprint import course_input_fingerprint, is_unchanged, store_fingerprint
+from .locks import run_coalesced
+from .persistence import AttainmentDiff, save_co_attainment, save_po_attainment
+from .pipeline import stream_marks, stream_student_co_totals
+from .runs import RunRecorder
+from .scores import refresh_student_co_scores, student_co_scores
+from .trends import department_trends, refresh_co_trends, refresh_po_trends
+
+
+ENGINES = ("sql", "matrix", "scores", "cia")
+
+
+def get_engine_name(engine=None):
+    """Returns the engine to use: the explicit argument, else settings.ATTAINMENT_ENGINE."""
+    engine = engine or getattr(settings, "ATTAINMENT_ENGINE", "sql")
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown attainment engine '{engine}'. Choose one of: {', '.join(ENGINES)}.")
+    return engine
+
+
+def compute_co_tallies(academic_year_obj, course_obj=None, department_obj=None, success_threshold=60.0, engine=None):
+    """
+    Returns {course_outcome_id: (students_counted, students_above_threshold)} for
+    the scope using the configured engine. The 'sql' and 'matrix' engines read
+    the streamed exam marks and submissions; 'scores' reads the precomputed
+    StudentCOScore rows; 'cia' aggregates submissions per CIA component of the
+    course plan before rolling them up to COs (see cia.py).
+    """
+    engine = get_engine_name(engine)
+    if engine == "matrix":
+        return matrix.tally_co_attainment(academic_year_obj, course_obj, department_obj, success_threshold)
+    if engine == "scores":
+        return scores.tally_co_attainment(academic_year_obj, course_obj, department_obj, success_threshold)
+    if engine == "cia":
+        return cia.tally_co_attainment(academic_year_obj, course_obj, department_obj, success_threshold)
+    return sql.tally_co_attainment(academic_year_obj, course_obj, department_obj, success_threshold)
+
+
+def compute_co_attainment(academic_year_obj, course_obj=None, department_obj=None, success_threshold=60.0, engine=None):
+    """Returns {course_outcome_id: attainment_percentage} for the scope using the configured engine."""
+    return sql.attainment_from_tallies(
+        compute_co_tallies(academic_year_obj, course_obj, department_obj, success_threshold, engine)
+    )
+
+
+def refresh_scores(engine, academic_year_obj, course_obj=None, department_obj=None):
+    """
+    Brings the per-student StudentCOScore rows of a scope in line with the marks
+    just used for its attainment, so student pages read them directly. The
+    'scores' engine computed from those rows, so they are already current.
+    """
+    if engine != "scores":
+        refresh_student_co_scores(academic_year_obj, course_obj, department_obj)
+
+
+def _coalesced(commit, kind, academic_year_obj, func, course_obj=None, department_obj=None, **variant):
+    """
+    Runs a calculation through locks.run_coalesced, joining only runs with the
+    same variant (engine, success_threshold, force); dry runs write nothing, so
+    they run on their own.
+    """
+    if not commit:
+        return func()
+    return run_coalesced(kind, academic_year_obj, func, course_obj=course_obj, department_obj=department_obj, **variant)
+
+
+def recalculate_course(
+    course_obj, academic_year_obj, success_threshold=60.0, engine=None, force=False, commit=True, user=None,
+    source=AttainmentRun.Source.WEB,
+):
+    """
+    Recomputes and saves the CO attainment of a course for a year, unless its
+    inputs are unchanged since the last saved run (see fingerprint.py). Returns
+    an AttainmentDiff, or None when the run was skipped. Every saved run is
+    recorded as an AttainmentRun; with commit=False nothing is saved, including
+    the fingerprint and the run record. A call made while the same course and
+    year are being calculated with the same engine, threshold and force waits for
+    that run and returns its result.
+    """
+    return _coalesced(
+        commit,
+        AttainmentRun.Kind.CO,
+        academic_year_obj,
+        partial(_recalculate_course, course_obj, academic_year_obj, success_threshold, engine, force, commit, user, source),
+        course_obj=course_obj,
+        engine=get_engine_name(engine),
+        success_threshold=success_threshold,
+        force=force,
+    )
+
+
+def _recalculate_course(course_obj, academic_year_obj, success_threshold, engine, force, commit, user, source):
+    engine = get_engine_name(engine)
+    with RunRecorder(
+        AttainmentRun.Kind.CO, academic_year_obj, course_obj=course_obj, engine=engine, user=user, source=source,
+        record=commit, success_threshold=success_threshold,
+    ) as recorder:
+        with recorder.phase("load"):
+            fingerprint = course_input_fingerprint(course_obj, academic_year_obj, success_threshold, engine)
+            if not force and is_unchanged(course_obj, academic_year_obj, fingerprint):
+                recorder.run.skipped = True
+                return None
+
+        with recorder.phase("compute"):
+            tallies = compute_co_tallies(
+                academic_year_obj, course_obj=course_obj, success_threshold=success_threshold, engine=engine
+            )
+            results = sql.attainment_from_tallies(tallies)
+            intervals = bootstrap_intervals(tallies)
+        with recorder.phase("write"):
+            diff = save_co_attainment(results, academic_year_obj, commit=commit, intervals=intervals)
+            if commit:
+                refresh_scores(engine, academic_year_obj, course_obj=course_obj)
+                incremental.rebuild_tallies(academic_year_obj, course_obj=course_obj, success_threshold=success_threshold)
+                refresh_co_trends(academic_year_obj, course_obj=course_obj)
+                store_fingerprint(course_obj, academic_year_obj, fingerprint)
+        recorder.run.rows_written = diff.changed
+        recorder.run.result = diff.as_dict()
+    return diff
+
+
+def recalculate_department_co(
+    department_obj, academic_year_obj, success_threshold=60.0, engine=None, commit=True, user=None,
+    source=AttainmentRun.Source.WEB,
+):
+    """
+    Recomputes and saves the CO attainment of every course in a department for a
+    year in one batch, recording the run. Returns an AttainmentDiff. Concurrent
+    calls for the same department, year, engine and threshold share one run.
+    """
+    return _coalesced(
+        commit,
+        AttainmentRun.Kind.CO,
+        academic_year_obj,
+        partial(
+            _recalculate_department_co, department_obj, academic_year_obj, success_threshold, engine, commit, user, source
+        ),
+        department_obj=department_obj,
+        engine=get_engine_name(engine),
+        success_threshold=success_threshold,
+    )
+
+
+def _recalculate_department_co(department_obj, academic_year_obj, success_threshold, engine, commit, user, source):
+    engine = get_engine_name(engine)
+    with RunRecorder(
+        AttainmentRun.Kind.CO, academic_year_obj, department_obj=department_obj, engine=engine, user=user,
+        source=source, record=commit, success_threshold=success_threshold,
+    ) as recorder:
+        with recorder.phase("compute"):
+            tallies = compute_co_tallies(
+                academic_year_obj, department_obj=department_obj, success_threshold=success_threshold, engine=engine
+            )
+            results = sql.attainment_from_tallies(tallies)
+            intervals = bootstrap_intervals(tallies)
+        with recorder.phase("write"):
+            diff = save_co_attainment(results, academic_year_obj, commit=commit, intervals=intervals)
+            if commit:
+                refresh_scores(engine, academic_year_obj, department_obj=department_obj)
+                incremental.rebuild_tallies(
+                    academic_year_obj, department_obj=department_obj, success_threshold=success_threshold
+                )
+                refresh_co_trends(academic_year_obj, department_obj=department_obj)
+        recorder.run.rows_written = diff.changed
+        recorder.run.result = diff.as_dict()
+    return diff
+
+
+def recalculate_department_po(department_obj, academic_year_obj, commit=True, user=None, source=AttainmentRun.Source.WEB):
+    """
+    Recomputes and saves the PO attainment of a department for a year from the
+    stored CO attainment, along with every student's PO attainment from their CO
+    scores, recording the run. Returns an AttainmentDiff for the class-level rows.
+    Concurrent calls for the same department and year share one run.
+    """
+    return _coalesced(
+        commit,
+        AttainmentRun.Kind.PO,
+        academic_year_obj,
+        partial(_recalculate_department_po, department_obj, academic_year_obj, commit, user, source),
+        department_obj=department_obj,
+    )
+
+
+def _recalculate_department_po(department_obj, academic_year_obj, commit, user, source):
+    with RunRecorder(
+        AttainmentRun.Kind.PO, academic_year_obj, department_obj=department_obj, user=user, source=source, record=commit,
+    ) as recorder:
+        with recorder.phase("compute"):
+            results = compute_po_attainment(department_obj, academic_year_obj)
+            student_results = compute_student_po_attainment(department_obj, academic_year_obj) if commit else None
+        with recorder.phase("write"):
+            diff = save_po_attainment(results, academic_year_obj, commit=commit)
+            if commit:
+                write_student_po_attainment(department_obj, academic_year_obj, *student_results)
+                refresh_po_trends(academic_year_obj, department_obj=department_obj)
+        recorder.run.rows_written = diff.changed
+        recorder.run.result = diff.as_dict()
+    return diff
+
+
+def compare_engines(academic_year_obj, course_obj=None, department_obj=None, success_threshold=60.0):
+    """
+    Runs the 'sql' and 'matrix' engines over the same scope without saving and
+    returns the COs whose results differ as {course_outcome_id: (sql_result, matrix_result)}.
+    """
+    results = {
+        name: compute_co_attainment(academic_year_obj, course_obj, department_obj, success_threshold, engine=name)
+        for name in ("sql", "matrix")
+    }
+    co_ids = set(results["sql"]) | set(results["matrix"])
+    return {
+        co_id: (results["sql"].get(co_id), results["matrix"].get(co_id))
+        for co_id in co_ids
+        if results["sql"].get(co_id) != results["matrix"].get(co_id)
+    }
+
+
+
+def compute_po_attainment(department_obj, academic_year_obj, co_attainment=None):
+    """
+    Returns {program_outcome_id: attainment_percentage} for every PO of a department,
+    weighting the year's CO attainment by the CO-PO correlation levels.
+    """
+    from . import po
+    return po.compute_po_attainment(department_obj, academic_year_obj, co_attainment)
+
+
+def compute_student_po_attainment(department_obj, academic_year_obj):
+    """
+    Returns (po_ids, student_ids, attainment) with one row of PO percentages per
+    student of the department, computed in one batched matrix product.
+    """
+    from . import po
+    return po.compute_student_po_attainment(department_obj, academic_year_obj)
+
+
+def write_student_po_attainment(department_obj, academic_year_obj, po_ids, student_ids, attainment):
+    """Replaces the stored StudentPOAttainment rows of a department-year; returns the rows written."""
+    from . import po
+    return po.write_student_po_attainment(department_obj, academic_year_obj, po_ids, student_ids, attainment)
+
+
+def sweep_co_attainment(academic_year_obj, course_obj=None, department_obj=None, thresholds=None, engine=None):
+    """
+    Returns {course_outcome_id: (students_counted, attainment per threshold)} for
+    the scope; thresholds default to every whole percentage from 0 to 100.
+    """
+    from . import sweep
+    return sweep.sweep_co_attainment(
+        academic_year_obj, course_obj, department_obj, thresholds or sweep.DEFAULT_THRESHOLDS, engine
+    )
+
+
+__all__ = [
+    "ENGINES",
+    "AttainmentDiff",
+    "bootstrap_intervals",
+    "compare_engines",
+    "compute_co_attainment",
+    "compute_co_tallies",
+    "compute_po_attainment",
+    "compute_student_po_attainment",
+    "department_trends",
+    "get_engine_name",
+    "recalculate_course",
+    "recalculate_department_co",
+    "recalculate_department_po",
+    "refresh_co_trends",
+    "refresh_po_trends",
+    "refresh_student_co_scores",
+    "save_co_attainment",
+    "save_po_attainment",
+    "stream_marks",
+    "stream_student_co_totals",
+    "student_co_scores",
+    "sweep_co_attainment",
+    "write_student_po_attainment",
+]
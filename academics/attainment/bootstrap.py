@@ -0,0 +1,65 @@
+# academics/attainment/bootstrap.py
+"""
+Bootstrap confidence intervals for CO attainment. A CO's attainment is the pass
+rate of its per-student pass/fail vector, so each interval comes from resampling
+that vector with replacement: one (resamples x students) NumPy draw matrix per
+CO, with no Python loop over the resamples.
+
+Only the order of the vector differs between students, and order does not matter
+when resampling, so the vector is rebuilt from the CO's (counted, passed) tally
+with the passes first; a draw then passes when its index is below `passed`. The
+generator is seeded by the CO id, so unchanged inputs give unchanged intervals.
+"""
+from decimal import Decimal
+
+import numpy as np
+from django.conf import settings
+
+from .sql import TWO_PLACES
+
+
+DEFAULT_RESAMPLES = 1000
+CONFIDENCE = 0.95
+SEED = 17
+
+
+def get_resamples():
+    """Returns settings.ATTAINMENT_BOOTSTRAP_RESAMPLES, validated."""
+    resamples = getattr(settings, "ATTAINMENT_BOOTSTRAP_RESAMPLES", DEFAULT_RESAMPLES)
+    if not isinstance(resamples, int) or resamples < 1:
+        raise ValueError(f"ATTAINMENT_BOOTSTRAP_RESAMPLES must be a positive whole number, got {resamples!r}.")
+    return resamples
+
+
+def _percentage(value):
+    return Decimal(repr(float(value))).quantize(TWO_PLACES)
+
+
+def bootstrap_interval(co_id, counted, passed, resamples=None):
+    """
+    Returns the (lower, upper) 95% percentile bootstrap interval of a CO's
+    attainment percentage from its tally, or (None, None) when no student counts.
+    """
+    if counted <= 0:
+        return None, None
+    if passed in (0, counted):
+        # Every resample of an all-pass or all-fail vector is the vector itself
+        percentage = _percentage(passed * 100 / counted)
+        return percentage, percentage
+    resamples = resamples or get_resamples()
+    rng = np.random.default_rng((SEED, co_id))
+    draws = rng.integers(0, counted, size=(resamples, counted), dtype=np.int32)
+    rates = np.count_nonzero(draws < passed, axis=1) * (100.0 / counted)
+    tail = (1 - CONFIDENCE) / 2 * 100
+    lower, upper = np.percentile(rates, [tail, 100 - tail])
+    return _percentage(lower), _percentage(upper)
+
+
+def bootstrap_intervals(tallies, resamples=None):
+    """Returns {co_id: (lower, upper)} for {co_id: (counted, passed)} tallies."""
+    resamples = resamples or get_resamples()
+    return {
+        co_id: bootstrap_interval(co_id, counted, passed, resamples)
+        for co_id, (counted, passed) in tallies.items()
+        if counted > 0
+    }
@@ -0,0 +1,158 @@
+# academics/attainment/cia.py
+"""
+CIA-component attainment (the 'cia' engine): marks are aggregated per CIA
+component of the course plan first and then rolled up to COs, instead of being
+summed per CO across every assignment.
+
+A student's marks in a component are the sum over the component's assignments
+(Assignment.cia_component) they were graded on, scaled to the component's
+weight, the marks it counts for in CIA; a component without a weight counts its
+marks as they are. The component then adds those marks to the internal totals of
+every CO in its cos_covered. Exam marks, and submissions to assignments outside
+any component (or in a component that covers no COs), are read per CO as in the
+flat calculation, and the course plan's internal:external ratio applies on top.
+
+The component structure of the whole scope is prefetched in one query, and the
+per-component marks come from one grouped query streamed alongside the per-CO
+rows, so the query count does not grow with the number of components.
+"""
+import heapq
+from collections import defaultdict
+from decimal import Decimal, Inexact, localcontext
+from fractions import Fraction
+from itertools import groupby
+
+from django.db.models import F
+
+from ..models import CIAComponent
+from .pipeline import DEFAULT_CHUNK_SIZE, stream_student_cia_component_totals
+from .pipeline import stream_student_co_components as stream_flat_components
+from .sql import DEFAULT_SUCCESS_THRESHOLD
+from .weighting import co_component_weights, is_passing
+
+
+def component_structure(academic_year_obj, course_obj=None, department_obj=None):
+    """
+    Returns {component_id: (weight, co_ids)} for the CIA components in scope that
+    cover at least one CO of their own course, from one query. weight is None
+    for components that count their marks unscaled.
+    """
+    links = CIAComponent.cos_covered.through.objects.filter(courseoutcome__course=F("ciacomponent__course_plan__course"))
+    if course_obj is not None:
+        links = links.filter(ciacomponent__course_plan__course=course_obj)
+    elif department_obj is not None:
+        links = links.filter(ciacomponent__course_plan__course__department=department_obj)
+    else:
+        links = links.filter(
+            ciacomponent__course_plan__course__semester__academic_department__academic_year=academic_year_obj
+        )
+
+    structure = {}
+    for component_id, weight, co_id in links.values_list("ciacomponent_id", "ciacomponent__weight", "courseoutcome_id"):
+        structure.setdefault(component_id, (weight, []))[1].append(co_id)
+    return structure
+
+
+# Wide enough that multiplying totals through by a denominator never rounds
+EXACT_PRECISION = 80
+
+
+def _scaled(obtained, max_marks, weight):
+    """obtained out of max_marks rescaled to weight: a Decimal where that is exact, else a Fraction."""
+    with localcontext() as context:
+        context.clear_flags()
+        scaled = obtained * weight / max_marks
+        if not context.flags[Inexact]:
+            return scaled
+    return Fraction(obtained * weight) / Fraction(max_marks)
+
+
+def _add(total, value):
+    try:
+        return total + value
+    except TypeError:
+        # A Decimal and a Fraction
+        return Fraction(total) + Fraction(value)
+
+
+def exact_components(components):
+    """
+    The (internal_obtained, internal_max, external_obtained, external_max) totals
+    as Decimals with the same ratios: a Fraction internal_obtained is replaced by
+    its numerator and the other totals are multiplied by its denominator. Exact
+    under a decimal context of EXACT_PRECISION digits.
+    """
+    internal_obtained, internal_max, external_obtained, external_max = components
+    if not isinstance(internal_obtained, Fraction):
+        return components
+    denominator = internal_obtained.denominator
+    return (
+        Decimal(internal_obtained.numerator),
+        internal_max * denominator,
+        external_obtained * denominator,
+        external_max * denominator,
+    )
+
+
+def stream_student_co_components(academic_year_obj, course_obj=None, department_obj=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Yields (student_id, co_id, internal_obtained, internal_max, external_obtained,
+    external_max, items) per student and CO like pipeline.stream_student_co_components,
+    with the submissions to CIA components counted through their components.
+    internal_obtained is a Fraction where a scaled component has no exact decimal.
+    """
+    structure = component_structure(academic_year_obj, course_obj, department_obj)
+    component_ids = list(structure)
+    flat = stream_flat_components(
+        academic_year_obj, course_obj, department_obj, chunk_size, excluded_components=component_ids
+    )
+    components = stream_student_cia_component_totals(academic_year_obj, component_ids, chunk_size) if structure else ()
+    rows = heapq.merge(
+        ((row[0], False, row) for row in flat),
+        ((row[0], True, row) for row in components),
+        key=lambda row: row[0],
+    )
+
+    for student_id, group in groupby(rows, key=lambda row: row[0]):
+        totals = {}
+        for _, is_component, row in group:
+            if not is_component:
+                _, co_id, *co_totals = row
+                current = totals.get(co_id)
+                totals[co_id] = co_totals if current is None else [_add(*pair) for pair in zip(current, co_totals)]
+                continue
+            _, component_id, obtained, max_marks, items = row
+            weight, co_ids = structure[component_id]
+            if weight is not None:
+                obtained, max_marks = (_scaled(obtained, max_marks, weight), weight) if max_marks > 0 else (0, 0)
+            for co_id in co_ids:
+                current = totals.get(co_id)
+                if current is None:
+                    totals[co_id] = [obtained, max_marks, 0, 0, items]
+                else:
+                    internal_obtained, internal_max, external_obtained, external_max, co_items = current
+                    totals[co_id] = [
+                        _add(internal_obtained, obtained), internal_max + max_marks, external_obtained, external_max,
+                        co_items + items,
+                    ]
+        for co_id in sorted(totals):
+            yield (student_id, co_id, *totals[co_id])
+
+
+def tally_co_attainment(academic_year_obj, course_obj=None, department_obj=None, success_threshold=DEFAULT_SUCCESS_THRESHOLD):
+    """
+    Returns {course_outcome_id: (students_counted, students_above_threshold)} for
+    the scope from the CIA-component totals, like sql.tally_co_attainment.
+    """
+    students_counted = defaultdict(int)
+    students_above_threshold = defaultdict(int)
+    threshold = Decimal(str(success_threshold))
+    weights = co_component_weights(academic_year_obj, course_obj, department_obj)
+
+    with localcontext(prec=EXACT_PRECISION):
+        for _, co_id, *components, _ in stream_student_co_components(academic_year_obj, course_obj, department_obj):
+            students_counted[co_id] += 1
+            if is_passing(*exact_components(components), weights.get(co_id), threshold):
+                students_above_threshold[co_id] += 1
+
+    return {co_id: (counted, students_above_threshold[co_id]) for co_id, counted in students_counted.items()}
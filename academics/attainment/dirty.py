@@ -0,0 +1,231 @@
+# academics/attainment/dirty.py
+"""
+The dirty-scope ledger: which (course, academic year) CO attainment and which
+(department, academic year) PO attainment may be out of date since the last
+calculation. The grade, CO-link and CO-PO mapping signals mark scopes here;
+`manage.py recompute_dirty` drains the ledger and recalculates only those.
+
+Marks are coalesced per transaction. Each signal only adds to a per-thread set:
+grade writes record their assessment or assignment id, link and mapping writes
+their resolved scope keys. When the transaction commits, the recorded ids are
+resolved to scopes in at most two queries and everything is written with a
+single INSERT ... ON CONFLICT DO NOTHING, so a bulk grade import costs a few
+statements in total. Every mark registers the flush, so the first commit after
+it writes whatever is pending; keys left by a rolled-back transaction are
+written with the next commit, which only over-marks, and recalculate_course
+skips courses whose inputs did not change.
+
+Draining claims rows rather than deleting them: a claimed row is deleted only
+once its scope has been recalculated, and a claim older than CLAIM_LEASE (a
+crashed run) can be taken again. Marking a claimed scope releases the claim, so
+the changes made during a recalculation are picked up by the next run.
+"""
+import datetime
+import threading
+from functools import reduce
+from operator import or_
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from ..models import (
+    Assessment,
+    Assignment,
+    CourseOutcome,
+    CourseOutcomeAttainment,
+    DirtyAttainmentScope,
+)
+
+
+_pending = threading.local()
+
+CLAIM_LEASE = datetime.timedelta(hours=1)
+
+
+def _state():
+    if not hasattr(_pending, "keys"):
+        _pending.keys = set()  # (course_id or None, department_id, academic_year_id)
+        _pending.sources = set()  # ("assessment" | "assignment", id), resolved on flush
+    return _pending
+
+
+def _add(keys=(), sources=()):
+    state = _state()
+    state.keys.update(keys)
+    state.sources.update(sources)
+    # Registered on every call: a rolled-back transaction drops its callbacks but not the pending keys
+    transaction.on_commit(flush, robust=True)
+
+
+def _source_scopes(sources):
+    """Scope keys whose CO attainment reads the marks of the given assessments and assignments."""
+    scopes = set()
+    for source, links, year_field in (
+        ("assessment", Assessment.assesses_cos.through.objects, "assessment__academic_year"),
+        (
+            "assignment",
+            Assignment.assesses_cos.through.objects,
+            "assignment__course__semester__academic_department__academic_year",
+        ),
+    ):
+        source_ids = [source_id for kind, source_id in sources if kind == source]
+        if not source_ids:
+            continue
+        scopes.update(
+            key
+            for key in links.filter(**{f"{source}_id__in": source_ids})
+            .values_list("courseoutcome__course", "courseoutcome__course__department", year_field)
+            .distinct()
+            if key[2] is not None
+        )
+    return scopes
+
+
+def _scope_match(key):
+    course_id, department_id, academic_year_id = key
+    if course_id is not None:
+        return Q(course_id=course_id, academic_year_id=academic_year_id)
+    return Q(course__isnull=True, department_id=department_id, academic_year_id=academic_year_id)
+
+
+def flush():
+    """
+    Writes the pending scopes to the ledger in one statement, leaving already
+    dirty scopes as they are, and releases the claims on any of them.
+    """
+    state = _state()
+    keys, sources = state.keys, state.sources
+    state.keys, state.sources = set(), set()
+    keys |= _source_scopes(sources)
+    if not keys:
+        return
+    DirtyAttainmentScope.objects.bulk_create(
+        [
+            DirtyAttainmentScope(course_id=course_id, department_id=department_id, academic_year_id=academic_year_id)
+            for course_id, department_id, academic_year_id in keys
+        ],
+        ignore_conflicts=True,
+    )
+    DirtyAttainmentScope.objects.filter(reduce(or_, map(_scope_match, keys)), claimed_at__isnull=False).update(
+        claimed_at=None
+    )
+
+
+# --- Resolving writes to scopes ---
+
+def mark_assessment(assessment_id):
+    """Marks the courses assessed by an exam as dirty after one of its marks changed."""
+    _add(sources=[("assessment", assessment_id)])
+
+
+def mark_assignment(assignment_id):
+    """Marks the courses assessed by an assignment as dirty after one of its submissions was graded."""
+    _add(sources=[("assignment", assignment_id)])
+
+
+def mark_outcome_links(source, source_ids, co_ids):
+    """
+    Marks the scopes touched by adding or removing CO links of assessments or
+    assignments (source is "assessment" or "assignment"): every linked CO's
+    course in each source's academic year.
+    """
+    if source == "assessment":
+        years = Assessment.objects.filter(pk__in=source_ids).values_list("academic_year", flat=True)
+    else:
+        years = Assignment.objects.filter(pk__in=source_ids).values_list(
+            "course__semester__academic_department__academic_year", flat=True
+        )
+    years = {year for year in years.distinct() if year is not None}
+    courses = set(CourseOutcome.objects.filter(pk__in=co_ids).values_list("course", "course__department"))
+    _add(keys=[(course_id, department_id, year) for course_id, department_id in courses for year in years])
+
+
+def mark_mapping(co_id):
+    """Marks the PO attainment of every year the CO has attainment in as dirty after its CO-PO mapping changed."""
+    _add(
+        keys=[
+            (None, department_id, academic_year_id)
+            for department_id, academic_year_id in CourseOutcomeAttainment.objects.filter(course_outcome_id=co_id)
+            .exclude(course_outcome__course__department__isnull=True)
+            .values_list("course_outcome__course__department", "academic_year")
+            .distinct()
+        ]
+    )
+
+
+def mark_course(course_id):
+    """
+    Marks the CO attainment of every year the course has attainment in as dirty
+    after the CIA components of its course plan changed.
+    """
+    _add(
+        keys=[
+            (course_id, department_id, academic_year_id)
+            for department_id, academic_year_id in CourseOutcomeAttainment.objects.filter(
+                course_outcome__course_id=course_id
+            )
+            .values_list("course_outcome__course__department", "academic_year")
+            .distinct()
+        ]
+    )
+
+
+# --- Draining ---
+
+@transaction.atomic
+def claim(limit=None):
+    """
+    Claims the oldest unclaimed dirty scopes (all of them, or up to `limit`) and
+    returns them; claims older than CLAIM_LEASE count as unclaimed. Rows locked
+    by a concurrent drain are skipped. The rows stay on the ledger until
+    release() deletes them.
+    """
+    now = timezone.now()
+    scopes = (
+        DirtyAttainmentScope.objects.select_for_update(skip_locked=True, of=("self",))
+        .filter(Q(claimed_at__isnull=True) | Q(claimed_at__lt=now - CLAIM_LEASE))
+        .select_related("course")
+        .order_by("marked_at", "pk")
+    )
+    scopes = list(scopes[:limit] if limit else scopes)
+    DirtyAttainmentScope.objects.filter(pk__in=[scope.pk for scope in scopes]).update(claimed_at=now)
+    for scope in scopes:
+        scope.claimed_at = now
+    return scopes
+
+
+def _claimed(scopes):
+    """The rows of claimed scopes still under those claims, i.e. not marked again or reclaimed since."""
+    return DirtyAttainmentScope.objects.filter(
+        pk__in=[scope.pk for scope in scopes], claimed_at__in={scope.claimed_at for scope in scopes}
+    )
+
+
+def release(scopes):
+    """Deletes claimed scopes once they have been recalculated, unless they were marked again meanwhile."""
+    _claimed(scopes).delete()
+
+
+def unclaim(scopes):
+    """Returns claimed scopes to the ledger for the next run, e.g. after a failed recalculation."""
+    _claimed(scopes).update(claimed_at=None)
+
+
+def remark(scopes):
+    """
+    Puts scopes that were not claimed rows back on the ledger, keeping their
+    original marked_at, e.g. the PO scope of a course whose rollup failed.
+    """
+    DirtyAttainmentScope.objects.bulk_create(
+        [
+            DirtyAttainmentScope(
+                course_id=scope.course_id,
+                department_id=scope.department_id,
+                academic_year_id=scope.academic_year_id,
+                marked_at=scope.marked_at,
+            )
+            for scope in scopes
+        ],
+        ignore_conflicts=True,
+    )
@@ -0,0 +1,108 @@
+# academics/attainment/fingerprint.py
+"""
+Cheap fingerprints of the inputs to a course's CO attainment for a year: mark
+counts, checksums and latest grading time from both mark sources, plus the CO
+links, max marks, external flags, CO-PO mappings, the assessment ratio, the
+level bands and the bootstrap resample count, and for the 'cia' engine the CIA
+components' weights, COs, assignments and marks. A run whose fingerprint matches
+the one stored by the previous run would produce the same results, so it is
+skipped.
+"""
+import hashlib
+
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Max, Sum
+
+from ..models import (
+    Assessment,
+    Assignment,
+    COPOMapping,
+    CIAComponent,
+    CourseAttainmentFingerprint,
+    CoursePlan,
+    StudentMark,
+    Submission,
+)
+from .bootstrap import get_resamples
+from .weighting import get_level_bands
+
+
+def _mark_checksum():
+    # Sensitive to which student holds which mark, not just the total
+    return Sum(ExpressionWrapper(F("marks_obtained") * F("student_id"), output_field=DecimalField()))
+
+
+def _cia_inputs(course_obj, academic_year_obj):
+    components = CIAComponent.cos_covered.through.objects.filter(ciacomponent__course_plan__course=course_obj).values_list(
+        "ciacomponent_id", "courseoutcome_id", "ciacomponent__weight"
+    )
+    component_assignments = Assignment.objects.filter(
+        cia_component__course_plan__course=course_obj,
+        course__semester__academic_department__academic_year=academic_year_obj,
+    ).values_list("pk", "cia_component_id", "max_marks")
+    component_submissions = Submission.objects.filter(
+        marks_obtained__isnull=False,
+        assignment__in=component_assignments.values("pk"),
+    ).aggregate(
+        count=Count("pk"), total=Sum("marks_obtained"), checksum=_mark_checksum(), graded_at=Max("graded_at"), last=Max("pk")
+    )
+    return (
+        sorted(components.order_by()),
+        sorted(component_assignments.order_by()),
+        sorted(component_submissions.items()),
+    )
+
+
+def course_input_fingerprint(course_obj, academic_year_obj, success_threshold, engine):
+    """Returns a hex digest of the inputs to the course's CO attainment for the year."""
+    submissions = Submission.objects.filter(
+        marks_obtained__isnull=False,
+        assignment__course__semester__academic_department__academic_year=academic_year_obj,
+        assignment__assesses_cos__course=course_obj,
+    ).aggregate(
+        count=Count("pk"), total=Sum("marks_obtained"), checksum=_mark_checksum(), graded_at=Max("graded_at"), last=Max("pk")
+    )
+    exam_marks = StudentMark.objects.filter(
+        assessment__academic_year=academic_year_obj,
+        assessment__assesses_cos__course=course_obj,
+    ).aggregate(count=Count("pk"), total=Sum("marks_obtained"), checksum=_mark_checksum(), last=Max("pk"))
+    assignment_links = Assignment.assesses_cos.through.objects.filter(
+        courseoutcome__course=course_obj,
+        assignment__course__semester__academic_department__academic_year=academic_year_obj,
+    ).values_list("assignment_id", "courseoutcome_id", "assignment__max_marks")
+    assessment_links = Assessment.assesses_cos.through.objects.filter(
+        courseoutcome__course=course_obj,
+        assessment__academic_year=academic_year_obj,
+    ).values_list("assessment_id", "courseoutcome_id", "assessment__max_marks", "assessment__assessment_type__is_external")
+    mappings = COPOMapping.objects.filter(course_outcome__course=course_obj).values_list(
+        "course_outcome_id", "program_outcome_id", "correlation_level"
+    )
+
+    assessment_ratio = CoursePlan.objects.filter(course=course_obj).values_list("assessment_ratio", flat=True).first()
+
+    inputs = (
+        engine,
+        str(success_threshold),
+        assessment_ratio,
+        get_level_bands(),
+        get_resamples(),
+        sorted(submissions.items()),
+        sorted(exam_marks.items()),
+        sorted(assignment_links.order_by()),
+        sorted(assessment_links.order_by()),
+        sorted(mappings.order_by()),
+        _cia_inputs(course_obj, academic_year_obj) if engine == "cia" else (),
+    )
+    return hashlib.sha256(repr(inputs).encode()).hexdigest()
+
+
+def is_unchanged(course_obj, academic_year_obj, fingerprint):
+    """True when the last stored run for the course and year had the same inputs."""
+    return CourseAttainmentFingerprint.objects.filter(
+        course=course_obj, academic_year=academic_year_obj, fingerprint=fingerprint
+    ).exists()
+
+
+def store_fingerprint(course_obj, academic_year_obj, fingerprint):
+    CourseAttainmentFingerprint.objects.update_or_create(
+        course=course_obj, academic_year=academic_year_obj, defaults={"fingerprint": fingerprint}
+    )
@@ -0,0 +1,423 @@
+# academics/attainment/incremental.py
+"""
+Incremental CO attainment: every graded mark adds (or removes) its contribution
+to the running totals of the (student, CO, academic year) it counts towards, and
+the class-level tally only moves when a student's counted/passed state flips.
+
+Each tally keeps the threshold of the last batch run of its CO (the default
+until one has run), and grade writes decide passes at that threshold, so they
+never replace a batch result with one at another threshold. The tallies pool
+internal and external marks, so the CO attainment is only rewritten from them
+for COs whose batch result is that pooled count: courses without an assessment
+ratio, under any engine but 'cia'.
+The other COs are left to the dirty-scope ledger, which every grade write marks,
+and `manage.py recompute_dirty` recalculates them with the configured engine.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import F
+
+from ..models import (
+    AcademicYear,
+    Assessment,
+    Assignment,
+    Course,
+    CourseOutcomeAttainmentTally,
+    StudentCOScore,
+)
+from users.models import UserProfile
+from .bootstrap import bootstrap_intervals
+from .persistence import save_co_attainment
+from .scores import load_scores, pooled_tallies, scope_filter, score_percentage, write_scores
+from . import weighting
+from .sql import DEFAULT_SUCCESS_THRESHOLD, TWO_PLACES
+from .trends import refresh_co_trends
+
+
+def is_passing(obtained, max_marks, success_threshold=DEFAULT_SUCCESS_THRESHOLD):
+    """weighting.is_passing for the pooled totals of the running state; zero max marks never pass."""
+    return weighting.is_passing(obtained, max_marks, 0, 0, None, Decimal(str(success_threshold)))
+
+
+def attainment_from_tally(students_counted, students_above_threshold):
+    return (Decimal(students_above_threshold * 100) / Decimal(students_counted)).quantize(TWO_PLACES)
+
+
+# --- Contributions of a single mark ---
+
+def submission_contribution(assignment_id, student_id, marks_obtained):
+    """Returns (student_id, academic_year_id, co_ids, obtained, max_marks) for a graded submission, else None."""
+    if marks_obtained is None:
+        return None
+    assignment = (
+        Assignment.objects.filter(pk=assignment_id)
+        .values("max_marks", "course__semester__academic_department__academic_year")
+        .first()
+    )
+    if not assignment or assignment["course__semester__academic_department__academic_year"] is None:
+        return None
+    co_ids = list(
+        Assignment.assesses_cos.through.objects.filter(assignment_id=assignment_id).values_list("courseoutcome_id", flat=True)
+    )
+    return (
+        student_id,
+        assignment["course__semester__academic_department__academic_year"],
+        co_ids,
+        Decimal(marks_obtained),
+        Decimal(assignment["max_marks"]),
+    )
+
+
+def student_mark_contribution(assessment_id, user_id, marks_obtained):
+    """Returns (student_id, academic_year_id, co_ids, obtained, max_marks) for an exam mark, else None."""
+    if marks_obtained is None:
+        return None
+    student_id = UserProfile.objects.filter(user_id=user_id).values_list("pk", flat=True).first()
+    assessment = Assessment.objects.filter(pk=assessment_id).values("max_marks", "academic_year").first()
+    if student_id is None or not assessment:
+        return None
+    co_ids = list(
+        Assessment.assesses_cos.through.objects.filter(assessment_id=assessment_id).values_list("courseoutcome_id", flat=True)
+    )
+    return (student_id, assessment["academic_year"], co_ids, Decimal(marks_obtained), Decimal(assessment["max_marks"]))
+
+
+def apply_student_mark_changes(assessment_id, changes, success_threshold=DEFAULT_SUCCESS_THRESHOLD):
+    """
+    Applies a batch of exam mark changes [(user_id, old_marks, new_marks)] to the
+    running state, as the StudentMark signals would one save at a time; old_marks
+    is None for a new mark. Takes a fixed number of queries however many marks
+    changed (see apply_score_deltas). success_threshold only applies to COs
+    without a tally yet.
+    """
+    assessment = Assessment.objects.select_related("academic_year").filter(pk=assessment_id).first()
+    if assessment is None or not changes:
+        return
+    co_ids = Assessment.assesses_cos.through.objects.filter(assessment_id=assessment_id).values_list(
+        "courseoutcome_id", flat=True
+    )
+    student_ids = dict(
+        UserProfile.objects.filter(user_id__in=[user_id for user_id, _, _ in changes]).values_list("user_id", "pk")
+    )
+    max_marks = Decimal(assessment.max_marks)
+    deltas = {}
+    for user_id, old, new in changes:
+        if user_id not in student_ids:
+            continue
+        # A changed mark moves only the obtained total; a new one also adds its max marks and an item
+        delta = (Decimal(new) - Decimal(old or 0), Decimal(0) if old is not None else max_marks, int(old is None))
+        for co_id in co_ids:
+            deltas[(student_ids[user_id], co_id)] = delta
+    apply_score_deltas(assessment.academic_year, deltas, success_threshold)
+
+
+def apply_contribution(contribution, sign, success_threshold=DEFAULT_SUCCESS_THRESHOLD):
+    """Adds (sign=1) or removes (sign=-1) one mark's contribution from the running state."""
+    if not contribution:
+        return
+    student_id, academic_year_id, co_ids, obtained, max_marks = contribution
+    for co_id in co_ids:
+        apply_score_delta(
+            student_id, co_id, academic_year_id, sign * obtained, sign * max_marks, sign, success_threshold
+        )
+
+
+def apply_change(old, new, success_threshold=DEFAULT_SUCCESS_THRESHOLD):
+    """Replaces an old contribution by a new one, skipping the work when nothing changed."""
+    if old == new:
+        return
+    apply_contribution(old, -1, success_threshold)
+    apply_contribution(new, 1, success_threshold)
+
+
+# --- Running state ---
+
+@transaction.atomic
+def apply_score_delta(student_id, co_id, academic_year_id, d_obtained, d_max, d_items, success_threshold=DEFAULT_SUCCESS_THRESHOLD):
+    """
+    Moves one student's totals for a CO by the given deltas, then adjusts the CO's
+    tally by the change in that student's counted/passed state and rewrites the
+    CO attainment from the tally (see save_tally_attainment). Passes are decided
+    at the tally's threshold; success_threshold only applies to a CO without one.
+    """
+    score, _ = StudentCOScore.objects.get_or_create(
+        student_id=student_id, course_outcome_id=co_id, academic_year_id=academic_year_id
+    )
+    score = StudentCOScore.objects.select_for_update().get(pk=score.pk)
+    success_threshold = tally_thresholds(academic_year_id, [co_id]).get(co_id, success_threshold)
+
+    was_counted = score.graded_items > 0
+    was_passing = was_counted and is_passing(score.obtained, score.max_marks, success_threshold)
+
+    score.obtained += d_obtained
+    score.max_marks += d_max
+    score.graded_items = max(score.graded_items + d_items, 0)
+    score.percentage = score_percentage(score.obtained, score.max_marks)
+    if score.graded_items == 0:
+        score.delete()
+    else:
+        score.save(update_fields=["obtained", "max_marks", "percentage", "graded_items"])
+
+    is_counted = score.graded_items > 0
+    now_passing = is_counted and is_passing(score.obtained, score.max_marks, success_threshold)
+    d_counted = int(is_counted) - int(was_counted)
+    d_above = int(now_passing) - int(was_passing)
+    if not (d_counted or d_above):
+        return
+
+    tally, _ = CourseOutcomeAttainmentTally.objects.get_or_create(
+        course_outcome_id=co_id, academic_year_id=academic_year_id, defaults={"success_threshold": success_threshold}
+    )
+    CourseOutcomeAttainmentTally.objects.filter(pk=tally.pk).update(
+        students_counted=F("students_counted") + d_counted,
+        students_above_threshold=F("students_above_threshold") + d_above,
+    )
+    tally.refresh_from_db()
+    save_tally_attainment(
+        AcademicYear.objects.get(pk=academic_year_id),
+        {co_id: (tally.students_counted, tally.students_above_threshold)},
+    )
+
+
+@transaction.atomic
+def apply_score_deltas(academic_year_obj, deltas, success_threshold=DEFAULT_SUCCESS_THRESHOLD):
+    """
+    Batch form of apply_score_delta for {(student_id, co_id): (d_obtained, d_max,
+    d_items)}: the affected scores are locked in (CO, student) order and read in
+    one query, the missing ones created and locked in one more, and all of them
+    written back with one upsert. Every CO's tally is then moved once by the net
+    change in its students' counted/passed states, followed by one write of the
+    CO attainment of the COs whose tally moved. As in apply_score_delta, passes
+    are decided at each CO's tally threshold.
+    """
+    if not deltas:
+        return
+
+    def lock_scores(keys):
+        return {
+            (score.student_id, score.course_outcome_id): score
+            for score in StudentCOScore.objects.select_for_update()
+            .filter(
+                academic_year=academic_year_obj,
+                course_outcome_id__in={co_id for _, co_id in keys},
+                student_id__in={student_id for student_id, _ in keys},
+            )
+            .order_by("course_outcome_id", "student_id")
+        }
+
+    scores = lock_scores(deltas)
+    missing = [key for key in deltas if key not in scores]
+    if missing:
+        StudentCOScore.objects.bulk_create(
+            [
+                StudentCOScore(student_id=student_id, course_outcome_id=co_id, academic_year=academic_year_obj)
+                for student_id, co_id in missing
+            ],
+            ignore_conflicts=True,
+        )
+        scores.update(lock_scores(missing))
+
+    thresholds = tally_thresholds(academic_year_obj, {co_id for _, co_id in deltas})
+    tally_deltas = defaultdict(lambda: [0, 0])
+    kept, emptied = [], []
+    for key, (d_obtained, d_max, d_items) in deltas.items():
+        score = scores[key]
+        threshold = thresholds.get(key[1], success_threshold)
+        was_counted = score.graded_items > 0
+        was_passing = was_counted and is_passing(score.obtained, score.max_marks, threshold)
+
+        score.obtained += d_obtained
+        score.max_marks += d_max
+        score.graded_items = max(score.graded_items + d_items, 0)
+        score.percentage = score_percentage(score.obtained, score.max_marks)
+        (kept if score.graded_items else emptied).append(score)
+
+        is_counted = score.graded_items > 0
+        now_passing = is_counted and is_passing(score.obtained, score.max_marks, threshold)
+        tally_deltas[key[1]][0] += int(is_counted) - int(was_counted)
+        tally_deltas[key[1]][1] += int(now_passing) - int(was_passing)
+
+    StudentCOScore.objects.bulk_create(
+        kept,
+        update_conflicts=True,
+        unique_fields=["student", "course_outcome", "academic_year"],
+        update_fields=["obtained", "max_marks", "percentage", "graded_items"],
+    )
+    StudentCOScore.objects.filter(pk__in=[score.pk for score in emptied]).delete()
+
+    moved = {co_id: change for co_id, change in tally_deltas.items() if any(change)}
+    if not moved:
+        return
+    CourseOutcomeAttainmentTally.objects.bulk_create(
+        [
+            CourseOutcomeAttainmentTally(
+                course_outcome_id=co_id,
+                academic_year=academic_year_obj,
+                success_threshold=thresholds.get(co_id, success_threshold),
+            )
+            for co_id in moved
+        ],
+        ignore_conflicts=True,
+    )
+    for co_id in sorted(moved):
+        d_counted, d_above = moved[co_id]
+        CourseOutcomeAttainmentTally.objects.filter(course_outcome_id=co_id, academic_year=academic_year_obj).update(
+            students_counted=F("students_counted") + d_counted,
+            students_above_threshold=F("students_above_threshold") + d_above,
+        )
+    save_tally_attainment(
+        academic_year_obj,
+        {
+            co_id: (counted, above)
+            for co_id, counted, above in CourseOutcomeAttainmentTally.objects.filter(
+                academic_year=academic_year_obj, course_outcome_id__in=moved
+            ).values_list("course_outcome_id", "students_counted", "students_above_threshold")
+        },
+    )
+
+
+def tally_thresholds(academic_year, co_ids=None):
+    """Returns {co_id: success_threshold} of the stored tallies of an academic year (object or id)."""
+    tallies = CourseOutcomeAttainmentTally.objects.filter(academic_year=academic_year)
+    if co_ids is not None:
+        tallies = tallies.filter(course_outcome_id__in=co_ids)
+    return dict(tallies.values_list("course_outcome_id", "success_threshold"))
+
+
+# --- Full recompute, used to verify and repair the running state ---
+
+def tallies_from_scores(scores, thresholds=None):
+    """
+    Returns {co_id: [students_counted, students_above_threshold]} for a set of
+    rebuilt scores, deciding passes at the CO's threshold in thresholds (see
+    tally_thresholds) or the default.
+    """
+    thresholds = thresholds or {}
+    tallies = defaultdict(lambda: [0, 0])
+    for (_, co_id), (obtained, max_marks, _) in scores.items():
+        tallies[co_id][0] += 1
+        if is_passing(obtained, max_marks, thresholds.get(co_id, DEFAULT_SUCCESS_THRESHOLD)):
+            tallies[co_id][1] += 1
+    return dict(tallies)
+
+
+def find_drift(academic_year_obj):
+    """
+    Compares the running state for an academic year with a full recompute at
+    each tally's threshold. Returns (scores, tallies, score_drift, tally_drift);
+    each drift entry is (key, stored, expected).
+    """
+    scores = load_scores(academic_year_obj)
+    tallies = tallies_from_scores(scores, tally_thresholds(academic_year_obj))
+
+    stored_scores = {
+        (row[0], row[1]): [row[2], row[3], row[4]]
+        for row in StudentCOScore.objects.filter(academic_year=academic_year_obj).values_list(
+            "student_id", "course_outcome_id", "obtained", "max_marks", "graded_items"
+        )
+    }
+    stored_tallies = {
+        row[0]: [row[1], row[2]]
+        for row in CourseOutcomeAttainmentTally.objects.filter(academic_year=academic_year_obj).values_list(
+            "course_outcome_id", "students_counted", "students_above_threshold"
+        )
+    }
+
+    score_drift = [
+        (key, stored_scores.get(key), scores.get(key))
+        for key in set(scores) | set(stored_scores)
+        if stored_scores.get(key) != scores.get(key)
+    ]
+    tally_drift = [
+        (co_id, stored_tallies.get(co_id, [0, 0]), tallies.get(co_id, [0, 0]))
+        for co_id in set(tallies) | set(stored_tallies)
+        if stored_tallies.get(co_id, [0, 0]) != tallies.get(co_id, [0, 0])
+    ]
+    return scores, tallies, score_drift, tally_drift
+
+
+@transaction.atomic
+def replace_state(academic_year_obj, scores, tallies, chunk_size=1000):
+    """
+    Overwrites the running state (scores and tallies) for an academic year with
+    rebuilt values, keeping the threshold of each CO's tally.
+    """
+    thresholds = tally_thresholds(academic_year_obj)
+    write_scores(
+        academic_year_obj,
+        ((student_id, co_id, *totals) for (student_id, co_id), totals in scores.items()),
+        chunk_size=chunk_size,
+    )
+    CourseOutcomeAttainmentTally.objects.filter(academic_year=academic_year_obj).delete()
+    CourseOutcomeAttainmentTally.objects.bulk_create(
+        [
+            CourseOutcomeAttainmentTally(
+                course_outcome_id=co_id,
+                academic_year=academic_year_obj,
+                students_counted=counted,
+                students_above_threshold=above,
+                success_threshold=thresholds.get(co_id, DEFAULT_SUCCESS_THRESHOLD),
+            )
+            for co_id, (counted, above) in tallies.items()
+        ],
+        batch_size=chunk_size,
+    )
+
+
+def tally_outcomes(co_ids):
+    """The COs among co_ids whose batch attainment is their pooled tally (see the module docstring)."""
+    from . import get_engine_name
+
+    if get_engine_name() == "cia":
+        return set()
+    return set(co_ids) - set(weighting.co_component_weights(None, co_ids=co_ids))
+
+
+def save_tally_attainment(academic_year_obj, tallies):
+    """
+    Writes the CO attainment implied by each tally of a CO in tally_outcomes,
+    skipping unchanged rows, and refreshes the trend cells of their courses;
+    returns an AttainmentDiff.
+    """
+    tallies = {co_id: tally for co_id, tally in tallies.items() if co_id in tally_outcomes(tallies)}
+    diff = save_co_attainment(
+        {
+            co_id: attainment_from_tally(counted, above)
+            for co_id, (counted, above) in tallies.items()
+            if counted > 0
+        },
+        academic_year_obj,
+        intervals=bootstrap_intervals(tallies),
+    )
+    # Sample sizes move with the tallies even when the percentages do not
+    for course in Course.objects.filter(course_outcomes__in=tallies).distinct():
+        refresh_co_trends(academic_year_obj, course_obj=course)
+    return diff
+
+
+@transaction.atomic
+def rebuild_tallies(academic_year_obj, course_obj=None, department_obj=None, success_threshold=DEFAULT_SUCCESS_THRESHOLD):
+    """
+    Replaces the tallies of a scope with the pooled counts of its StudentCOScore
+    rows at the given threshold, which the tallies keep; the rows must be
+    current. Batch recalculation calls this after refreshing the scores so later
+    grade writes start from the recalculated state, at its threshold.
+    """
+    scope = scope_filter(academic_year_obj, course_obj, department_obj)
+    CourseOutcomeAttainmentTally.objects.filter(scope).delete()
+    CourseOutcomeAttainmentTally.objects.bulk_create(
+        [
+            CourseOutcomeAttainmentTally(
+                course_outcome_id=co_id,
+                academic_year=academic_year_obj,
+                students_counted=counted,
+                students_above_threshold=above,
+                success_threshold=success_threshold,
+            )
+            for co_id, (counted, above) in pooled_tallies(
+                academic_year_obj, course_obj, department_obj, success_threshold
+            ).items()
+        ]
+    )
@@ -0,0 +1,134 @@
+# academics/attainment/locks.py
+"""
+Runs at most one attainment calculation per (kind, scope, academic year) at a
+time. Callers that arrive while a calculation of the same scope and variant
+(engine, success threshold, force) is in flight join it and get its result
+instead of recomputing and racing it on the writes; callers with another
+variant wait for it to finish and then run their own.
+
+Within a process, the first caller runs the calculation and the others wait for
+it on an Event. Across processes (web and worker processes on PostgreSQL), the
+running caller also holds a session-level advisory lock on the scope; a caller
+from another process that cannot take the lock waits for it, then returns the
+result recorded on the AttainmentRun the holder saved while it waited if that
+run had the same variant. A forced caller never joins a skipped run. Other
+databases have no advisory locks, so there only callers in the same process
+are coalesced.
+"""
+import hashlib
+import threading
+from decimal import Decimal
+
+from django.db import connection
+from django.utils import timezone
+
+from ..models import AttainmentRun
+from .persistence import AttainmentDiff
+
+
+_inflight = {}
+_inflight_guard = threading.Lock()
+
+
+class _Flight:
+    """One in-flight calculation and the callers waiting on it."""
+
+    def __init__(self, variant):
+        self.variant = variant
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+def lock_key(kind, academic_year_obj, course_obj=None, department_obj=None):
+    """A stable signed 64-bit advisory lock key for a calculation scope."""
+    scope = f"course:{course_obj.pk}" if course_obj is not None else f"department:{department_obj.pk}"
+    digest = hashlib.blake2b(f"attainment:{kind}:{scope}:{academic_year_obj.pk}".encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big", signed=True)
+
+
+def _joined_result(kind, academic_year_obj, course_obj, department_obj, since, variant):
+    """
+    The result of a run of the scope and variant that finished after `since`:
+    (True, diff) with diff None for a skipped run, or (False, None) when there
+    is none.
+    """
+    engine, success_threshold, force = variant
+    runs = AttainmentRun.objects.filter(
+        kind=kind,
+        academic_year=academic_year_obj,
+        course=course_obj,
+        department=department_obj if course_obj is None else None,
+        finished_at__gte=since,
+    )
+    if engine is not None:
+        runs = runs.filter(engine=engine)
+    if success_threshold is not None:
+        runs = runs.filter(success_threshold=Decimal(str(success_threshold)))
+    if force:
+        runs = runs.filter(skipped=False)
+    run = runs.order_by("-finished_at").first()
+    if run is None or not (run.skipped or run.result is not None):
+        return False, None
+    return True, None if run.skipped else AttainmentDiff.from_dict(run.result)
+
+
+def _run_with_advisory_lock(key, func, kind, academic_year_obj, course_obj, department_obj, variant):
+    if connection.vendor != "postgresql":
+        return func()
+    requested = timezone.now()
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT pg_try_advisory_lock(%s)", [key])
+        joined = not cursor.fetchone()[0]
+        if joined:
+            # Another process is calculating this scope: wait for it to finish
+            cursor.execute("SELECT pg_advisory_lock(%s)", [key])
+    try:
+        if joined:
+            found, result = _joined_result(kind, academic_year_obj, course_obj, department_obj, requested, variant)
+            if found:
+                return result
+        return func()
+    finally:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_advisory_unlock(%s)", [key])
+
+
+def run_coalesced(
+    kind, academic_year_obj, func, course_obj=None, department_obj=None, engine=None, success_threshold=None, force=False
+):
+    """
+    Calls func() unless a calculation of the same scope and variant is already
+    running, in which case this waits for that calculation and returns its
+    result. A running calculation of another variant is waited for first.
+    """
+    key = lock_key(kind, academic_year_obj, course_obj, department_obj)
+    variant = (engine, success_threshold, force)
+    while True:
+        with _inflight_guard:
+            flight = _inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = _inflight[key] = _Flight(variant)
+        if leader or flight.variant == variant:
+            break
+        flight.done.wait()
+
+    if not leader:
+        flight.done.wait()
+        if flight.error is not None:
+            raise flight.error
+        return flight.result
+
+    try:
+        flight.result = _run_with_advisory_lock(
+            key, func, kind, academic_year_obj, course_obj, department_obj, variant
+        )
+    except BaseException as error:
+        flight.error = error
+        raise
+    finally:
+        with _inflight_guard:
+            del _inflight[key]
+        flight.done.set()
+    return flight.result
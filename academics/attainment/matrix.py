@@ -0,0 +1,217 @@
+# academics/attainment/matrix.py
+"""
+Vectorized CO attainment over dense matrices. The graded items in scope
+(assignments and assessments) are linked to COs by an items x COs incidence
+matrix, built once from Assignment.assesses_cos and Assessment.assesses_cos and
+split into internal and external columns by the item's source and assessment
+type. Each item's marks are streamed ordered by student and taken in chunks of
+students; every chunk becomes a students x items marks array and a graded
+array, and one matrix product per component turns them into per-student CO
+totals. Passes are decided with each course's assessment ratio for the whole
+chunk at once, and the per-CO counts are accumulated across chunks, so memory
+is bounded by the chunk size rather than the number of marks.
+"""
+import heapq
+from itertools import groupby, islice
+
+import numpy as np
+
+from ..models import Assessment, Assignment, StudentMark, Submission
+from .runs import track_load
+from .sql import attainment_from_tallies
+from .weighting import co_component_weights
+
+
+DEFAULT_STUDENT_CHUNK_SIZE = 500
+
+
+class ScoreMatrix:
+    """
+    Dense students x items view of a chunk of graded work, together with the
+    items x COs incidence matrices of the internal and external items. Marks
+    are int64 hundredths of a mark, so every sum is exact.
+    """
+
+    def __init__(self, student_ids, marks, graded, max_marks, internal_incidence, external_incidence):
+        self.student_ids = student_ids
+        self.marks = marks  # students x items, 0 where ungraded
+        self.graded = graded  # students x items, 1 where graded
+        self.max_marks = max_marks  # items
+        self.internal_incidence = internal_incidence  # items x COs, 1 where an internal item assesses the CO
+        self.external_incidence = external_incidence  # items x COs, 1 where an external item assesses the CO
+
+    def co_totals(self):
+        """
+        Returns (internal_obtained, internal_max, external_obtained, external_max,
+        counted) as students x COs arrays; counted is True where the student has
+        graded work on the CO.
+        """
+        available = self.graded * self.max_marks
+        internal_obtained = self.marks @ self.internal_incidence
+        internal_max = available @ self.internal_incidence
+        external_obtained = self.marks @ self.external_incidence
+        external_max = available @ self.external_incidence
+        counted = (self.graded @ (self.internal_incidence + self.external_incidence)) > 0
+        return internal_obtained, internal_max, external_obtained, external_max, counted
+
+
+class Items:
+    """The graded items of a scope: their column positions, max marks and CO incidence."""
+
+    def __init__(self, academic_year_obj, course_obj=None, department_obj=None):
+        assignment_links = Assignment.assesses_cos.through.objects.filter(
+            assignment__course__semester__academic_department__academic_year=academic_year_obj,
+        )
+        assessment_links = Assessment.assesses_cos.through.objects.filter(assessment__academic_year=academic_year_obj)
+        if course_obj is not None:
+            assignment_links = assignment_links.filter(courseoutcome__course=course_obj)
+            assessment_links = assessment_links.filter(courseoutcome__course=course_obj)
+        elif department_obj is not None:
+            assignment_links = assignment_links.filter(courseoutcome__course__department=department_obj)
+            assessment_links = assessment_links.filter(courseoutcome__course__department=department_obj)
+        self.assignment_links = assignment_links
+        self.assessment_links = assessment_links
+
+        links = [
+            (("assignment", assignment_id), co_id, max_marks, False)
+            for assignment_id, co_id, max_marks in assignment_links.values_list(
+                "assignment_id", "courseoutcome_id", "assignment__max_marks"
+            )
+        ] + [
+            (("assessment", assessment_id), co_id, max_marks, bool(is_external))
+            for assessment_id, co_id, max_marks, is_external in assessment_links.values_list(
+                "assessment_id", "courseoutcome_id", "assessment__max_marks", "assessment__assessment_type__is_external"
+            )
+        ]
+        self.index = {item: i for i, item in enumerate(sorted({item for item, _, _, _ in links}))}
+        self.co_ids = sorted({co_id for _, co_id, _, _ in links})
+        co_index = {co_id: j for j, co_id in enumerate(self.co_ids)}
+
+        self.max_marks = np.zeros(len(self.index), dtype=np.int64)
+        self.internal_incidence = np.zeros((len(self.index), len(self.co_ids)), dtype=np.int64)
+        self.external_incidence = np.zeros((len(self.index), len(self.co_ids)), dtype=np.int64)
+        for item, co_id, max_marks, is_external in links:
+            i = self.index[item]
+            self.max_marks[i] = int(max_marks * 100)
+            (self.external_incidence if is_external else self.internal_incidence)[i, co_index[co_id]] = 1
+
+    def marks(self, chunk_size):
+        """Yields (student_id, item, marks_obtained) for every graded item in scope, ordered by student."""
+        submissions = (
+            Submission.objects.filter(
+                marks_obtained__isnull=False, assignment__in=self.assignment_links.values("assignment_id")
+            )
+            .order_by("student")
+            .values_list("student", "assignment_id", "marks_obtained")
+        )
+        exam_marks = (
+            StudentMark.objects.filter(
+                student__profile__isnull=False, assessment__in=self.assessment_links.values("assessment_id")
+            )
+            .order_by("student__profile")
+            .values_list("student__profile", "assessment_id", "marks_obtained")
+        )
+        return heapq.merge(
+            ((student_id, ("assignment", item_id), obtained) for student_id, item_id, obtained in
+             track_load(submissions.iterator(chunk_size=chunk_size))),
+            ((student_id, ("assessment", item_id), obtained) for student_id, item_id, obtained in
+             track_load(exam_marks.iterator(chunk_size=chunk_size))),
+            key=lambda row: row[0],
+        )
+
+    def score_matrices(self, student_chunk_size=DEFAULT_STUDENT_CHUNK_SIZE):
+        """Yields one ScoreMatrix per chunk of up to student_chunk_size students."""
+        students = (
+            (student_id, list(student_marks))
+            for student_id, student_marks in groupby(self.marks(student_chunk_size * 4), key=lambda row: row[0])
+        )
+        while chunk := list(islice(students, student_chunk_size)):
+            student_ids, rows, cols, values = [], [], [], []
+            for r, (student_id, student_marks) in enumerate(chunk):
+                student_ids.append(student_id)
+                for _, item, obtained in student_marks:
+                    rows.append(r)
+                    cols.append(self.index[item])
+                    values.append(int(obtained * 100))
+            marks = np.zeros((len(student_ids), len(self.index)), dtype=np.int64)
+            graded = np.zeros((len(student_ids), len(self.index)), dtype=np.int64)
+            marks[rows, cols] = values
+            graded[rows, cols] = 1
+            yield ScoreMatrix(
+                student_ids, marks, graded, self.max_marks, self.internal_incidence, self.external_incidence
+            )
+
+
+def passing(internal_obtained, internal_max, external_obtained, external_max, internal_weight, external_weight, threshold):
+    """
+    Vectorized weighting.is_passing over a chunk. Marks are int64 arrays in
+    hundredths of a mark; weights are int64 arrays, both zero where the course
+    pools its marks; the threshold is in hundredths of a percent. Everything
+    stays whole, so the comparisons are exact.
+    """
+    # The weighted test multiplies four factors; where that could pass 2**63 it runs on Python ints
+    largest = max(int(np.abs(array).max(initial=0)) for array in (internal_obtained, internal_max, external_obtained, external_max))
+    weight = int((internal_weight + external_weight).max(initial=0))
+    if 2 * 10000 * max(weight, 1) * max(largest, 1) ** 2 >= 2 ** 63:
+        internal_obtained, internal_max, external_obtained, external_max = (
+            array.astype(object) for array in (internal_obtained, internal_max, external_obtained, external_max)
+        )
+
+    # Students with zero max marks count towards the class but never pass
+    pooled_max = internal_max + external_max
+    pooled = (pooled_max > 0) & ((internal_obtained + external_obtained) * 10000 >= threshold * pooled_max)
+
+    has_ratio = (internal_weight + external_weight) > 0
+    internal_weight = np.where(internal_max > 0, internal_weight, 0)
+    external_weight = np.where(external_max > 0, external_weight, 0)
+    internal_max = np.where(internal_max > 0, internal_max, 1)
+    external_max = np.where(external_max > 0, external_max, 1)
+    weighted = (internal_weight + external_weight > 0) & (
+        10000 * (internal_weight * internal_obtained * external_max + external_weight * external_obtained * internal_max)
+        >= threshold * (internal_weight + external_weight) * internal_max * external_max
+    )
+    return np.where(has_ratio, weighted, pooled)
+
+
+def tally_co_attainment(
+    academic_year_obj, course_obj=None, department_obj=None, success_threshold=60.0,
+    student_chunk_size=DEFAULT_STUDENT_CHUNK_SIZE,
+):
+    """
+    Matrix counterpart of sql.tally_co_attainment: the same {course_outcome_id:
+    (students_counted, students_above_threshold)} from the incidence-matrix
+    products of each chunk of students. The threshold is taken to two decimal
+    places.
+    """
+    items = Items(academic_year_obj, course_obj, department_obj)
+    weights = co_component_weights(academic_year_obj, course_obj, department_obj)
+    internal_weight = np.array([weights.get(co_id, (0, 0))[0] for co_id in items.co_ids], dtype=np.int64)
+    external_weight = np.array([weights.get(co_id, (0, 0))[1] for co_id in items.co_ids], dtype=np.int64)
+    threshold = int(round(float(success_threshold) * 100))
+
+    students_counted = np.zeros(len(items.co_ids), dtype=np.int64)
+    students_passed = np.zeros(len(items.co_ids), dtype=np.int64)
+    for matrix in items.score_matrices(student_chunk_size):
+        *components, counted = matrix.co_totals()
+        passed = counted & passing(*components, internal_weight, external_weight, threshold)
+        students_counted += counted.sum(axis=0)
+        students_passed += passed.sum(axis=0)
+
+    return {
+        co_id: (int(students_counted[j]), int(students_passed[j]))
+        for j, co_id in enumerate(items.co_ids)
+        if students_counted[j] > 0
+    }
+
+
+def compute_co_attainment(
+    academic_year_obj, course_obj=None, department_obj=None, success_threshold=60.0,
+    student_chunk_size=DEFAULT_STUDENT_CHUNK_SIZE,
+):
+    """
+    Matrix counterpart of sql.compute_co_attainment: the same
+    {course_outcome_id: attainment_percentage} result, from tally_co_attainment.
+    """
+    return attainment_from_tallies(
+        tally_co_attainment(academic_year_obj, course_obj, department_obj, success_threshold, student_chunk_size)
+    )
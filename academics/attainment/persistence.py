@@ -0,0 +1,150 @@
+# academics/attainment/persistence.py
+"""
+Writes attainment results with one INSERT ... ON CONFLICT DO UPDATE per batch,
+skipping rows whose stored value already matches, and reports what changed.
+Each row's attainment level is banded from its percentage on the way in, for
+the whole batch at once; a row without a percentage has no level.
+"""
+from decimal import Decimal
+
+from ..models import CourseOutcomeAttainment, ProgramOutcomeAttainment
+from .weighting import attainment_levels
+
+
+DEFAULT_BATCH_SIZE = 500
+
+
+class AttainmentDiff:
+    """
+    The outcome of saving a set of attainment results: keys are course outcome
+    or program outcome ids.
+    """
+
+    def __init__(self):
+        self.inserted = {}  # id -> new value
+        self.updated = {}  # id -> (old value, new value)
+        self.unchanged = 0
+
+    @property
+    def changed(self):
+        return len(self.inserted) + len(self.updated)
+
+    def changes(self):
+        """Yields (id, old, new) for every inserted (old is None) or updated row."""
+        for key, new in self.inserted.items():
+            yield key, None, new
+        for key, (old, new) in self.updated.items():
+            yield key, old, new
+
+    def as_dict(self, labels=None):
+        """JSON-friendly summary; labels ({id: code}) names the rows in the change list."""
+        labels = labels or {}
+        return {
+            "inserted": len(self.inserted),
+            "updated": len(self.updated),
+            "unchanged": self.unchanged,
+            "changes": [
+                {
+                    "id": key,
+                    "label": labels.get(key, str(key)),
+                    "old": None if old is None else str(old),
+                    "new": None if new is None else str(new),
+                    "is_new": key in self.inserted,
+                }
+                for key, old, new in sorted(self.changes(), key=lambda change: str(labels.get(change[0], change[0])))
+            ],
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        """Rebuilds a diff from as_dict() output, e.g. the result recorded on an AttainmentRun."""
+        diff = cls()
+        diff.unchanged = data["unchanged"]
+        for change in data["changes"]:
+            new = None if change["new"] is None else Decimal(change["new"])
+            # An update from no attainment also has no old value
+            if change.get("is_new", change["old"] is None):
+                diff.inserted[change["id"]] = new
+            else:
+                diff.updated[change["id"]] = (None if change["old"] is None else Decimal(change["old"]), new)
+        return diff
+
+    def __str__(self):
+        return f"{len(self.inserted)} inserted, {len(self.updated)} updated, {self.unchanged} unchanged"
+
+
+def save_attainment(
+    model, key_field, results, academic_year_obj, commit=True, batch_size=DEFAULT_BATCH_SIZE, extra_fields=None
+):
+    """
+    Saves {key_id: attainment_percentage} for an academic year into an attainment
+    model unique on (key_field, academic_year), with the level of each percentage.
+    extra_fields ({field_name: {key_id: value}}) are stored alongside; keys
+    missing from one are saved as None. Existing values are read in one query;
+    only new or changed rows are written. With commit=False nothing is written
+    and the diff describes what would change.
+    """
+    diff = AttainmentDiff()
+    if not results:
+        return diff
+
+    extra_fields = extra_fields or {}
+    existing = {
+        key: tuple(stored)
+        for key, *stored in model.objects.filter(
+            academic_year=academic_year_obj, **{f"{key_field}__in": list(results)}
+        ).values_list(key_field, "attainment_percentage", "attainment_level", *extra_fields)
+    }
+    scored = {key: value for key, value in results.items() if value is not None}
+    levels = dict(zip(scored, (int(level) for level in attainment_levels(list(scored.values())))))
+    rows = []
+    for key, value in results.items():
+        extras = {field: values.get(key) for field, values in extra_fields.items()}
+        if key not in existing:
+            diff.inserted[key] = value
+        elif existing[key] != (value, levels.get(key), *extras.values()):
+            diff.updated[key] = (existing[key][0], value)
+        else:
+            diff.unchanged += 1
+            continue
+        rows.append(
+            model(
+                **{f"{key_field}_id": key},
+                academic_year=academic_year_obj,
+                attainment_percentage=value,
+                attainment_level=levels.get(key),
+                **extras,
+            )
+        )
+
+    if commit and rows:
+        model.objects.bulk_create(
+            rows,
+            batch_size=batch_size,
+            update_conflicts=True,
+            unique_fields=[key_field, "academic_year"],
+            update_fields=["attainment_percentage", "attainment_level", *extra_fields],
+        )
+    return diff
+
+
+def save_co_attainment(results, academic_year_obj, commit=True, intervals=None):
+    """
+    Writes {course_outcome_id: attainment_percentage} for an academic year, with
+    the {course_outcome_id: (ci_lower, ci_upper)} confidence intervals when
+    given; returns an AttainmentDiff.
+    """
+    extra_fields = None
+    if intervals is not None:
+        extra_fields = {
+            "ci_lower": {co_id: interval[0] for co_id, interval in intervals.items()},
+            "ci_upper": {co_id: interval[1] for co_id, interval in intervals.items()},
+        }
+    return save_attainment(
+        CourseOutcomeAttainment, "course_outcome", results, academic_year_obj, commit, extra_fields=extra_fields
+    )
+
+
+def save_po_attainment(results, academic_year_obj, commit=True):
+    """Writes {program_outcome_id: attainment_percentage} for an academic year; returns an AttainmentDiff."""
+    return save_attainment(ProgramOutcomeAttainment, "program_outcome", results, academic_year_obj, commit)
@@ -0,0 +1,152 @@
+# academics/attainment/pipeline.py
+"""
+One stream of graded work per (student, CO) from both mark sources: exam marks
+(StudentMark against Assessment.assesses_cos) and assignment submissions
+(Submission against Assignment.assesses_cos).
+
+Each source is read as a grouped query ordered by (student, CO) through a
+server-side cursor, the two ordered streams are merged, and adjacent rows for
+the same key are combined. Memory stays constant however many marks there are;
+only the current chunk of rows is held at a time.
+
+Exam marks of external assessment types (AssessmentType.is_external) come out
+as their own source, so the totals can be split into internal (CIA) and
+external components.
+
+The CIA engine (cia.py) reads the submissions to assignments of CIA components
+per (student, component) instead, and leaves them out of the per-CO stream.
+"""
+import heapq
+from decimal import Decimal
+from itertools import groupby
+
+from django.db.models import Count, Sum
+
+from ..models import StudentMark, Submission
+from .runs import track_load
+
+
+SOURCE_SUBMISSION = "submission"
+SOURCE_EXAM = "exam"
+SOURCE_EXTERNAL = "external"
+DEFAULT_CHUNK_SIZE = 2000
+
+
+def _submissions(academic_year_obj, course_obj=None, department_obj=None, excluded_components=()):
+    submissions = Submission.objects.filter(
+        marks_obtained__isnull=False,
+        assignment__course__semester__academic_department__academic_year=academic_year_obj,
+    )
+    if excluded_components:
+        submissions = submissions.exclude(assignment__cia_component__in=excluded_components)
+    if course_obj is not None:
+        return submissions.filter(assignment__assesses_cos__course=course_obj)
+    if department_obj is not None:
+        return submissions.filter(assignment__assesses_cos__course__department=department_obj)
+    return submissions.filter(assignment__assesses_cos__isnull=False)
+
+
+def _exam_marks(academic_year_obj, course_obj=None, department_obj=None):
+    marks = StudentMark.objects.filter(assessment__academic_year=academic_year_obj, student__profile__isnull=False)
+    if course_obj is not None:
+        return marks.filter(assessment__assesses_cos__course=course_obj)
+    if department_obj is not None:
+        return marks.filter(assessment__assesses_cos__course__department=department_obj)
+    return marks.filter(assessment__assesses_cos__isnull=False)
+
+
+def _stream(queryset, student_key, co_key, max_key, source, chunk_size, external_key=None):
+    """
+    One source as grouped rows ordered by (student, CO). With external_key, rows
+    are also grouped on that flag and flagged rows come out as SOURCE_EXTERNAL.
+    """
+    group_keys = [student_key, co_key] + ([external_key] if external_key else [])
+    rows = (
+        queryset.values(*group_keys)
+        .annotate(obtained=Sum("marks_obtained"), max_marks=Sum(max_key), items=Count("pk"))
+        .order_by(student_key, co_key)
+        .values_list(*group_keys, "obtained", "max_marks", "items")
+    )
+    for row in track_load(rows.iterator(chunk_size=chunk_size)):
+        student_id, co_id, *external, obtained, max_marks, items = row
+        row_source = SOURCE_EXTERNAL if external and external[0] else source
+        yield student_id, co_id, Decimal(obtained), Decimal(max_marks), items, row_source
+
+
+def stream_marks(
+    academic_year_obj, course_obj=None, department_obj=None, chunk_size=DEFAULT_CHUNK_SIZE, excluded_components=()
+):
+    """
+    Yields (student_id, co_id, obtained, max_marks, items, source) ordered by
+    (student_id, co_id), one row per source and key. student_id is a UserProfile id.
+    Submissions to assignments of the excluded CIA component ids are left out.
+    """
+    return heapq.merge(
+        _stream(
+            _submissions(academic_year_obj, course_obj, department_obj, excluded_components),
+            "student", "assignment__assesses_cos", "assignment__max_marks", SOURCE_SUBMISSION, chunk_size,
+        ),
+        _stream(
+            _exam_marks(academic_year_obj, course_obj, department_obj),
+            "student__profile", "assessment__assesses_cos", "assessment__max_marks", SOURCE_EXAM, chunk_size,
+            external_key="assessment__assessment_type__is_external",
+        ),
+        key=lambda row: (row[0], row[1]),
+    )
+
+
+def stream_student_co_totals(academic_year_obj, course_obj=None, department_obj=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Yields (student_id, co_id, obtained, max_marks, items) per student and CO across both sources."""
+    rows = stream_marks(academic_year_obj, course_obj, department_obj, chunk_size)
+    for (student_id, co_id), group in groupby(rows, key=lambda row: (row[0], row[1])):
+        obtained, max_marks, items = Decimal(0), Decimal(0), 0
+        for _, _, row_obtained, row_max, row_items, _ in group:
+            obtained += row_obtained
+            max_marks += row_max
+            items += row_items
+        yield student_id, co_id, obtained, max_marks, items
+
+
+def stream_student_co_components(
+    academic_year_obj, course_obj=None, department_obj=None, chunk_size=DEFAULT_CHUNK_SIZE, excluded_components=()
+):
+    """
+    Yields (student_id, co_id, internal_obtained, internal_max, external_obtained,
+    external_max, items) per student and CO: the totals split into internal marks
+    (submissions and internal exams) and external exam marks.
+    """
+    rows = stream_marks(academic_year_obj, course_obj, department_obj, chunk_size, excluded_components)
+    for (student_id, co_id), group in groupby(rows, key=lambda row: (row[0], row[1])):
+        internal_obtained, internal_max = Decimal(0), Decimal(0)
+        external_obtained, external_max = Decimal(0), Decimal(0)
+        items = 0
+        for _, _, row_obtained, row_max, row_items, source in group:
+            if source == SOURCE_EXTERNAL:
+                external_obtained += row_obtained
+                external_max += row_max
+            else:
+                internal_obtained += row_obtained
+                internal_max += row_max
+            items += row_items
+        yield student_id, co_id, internal_obtained, internal_max, external_obtained, external_max, items
+
+
+def stream_student_cia_component_totals(academic_year_obj, component_ids, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Yields (student_id, component_id, obtained, max_marks, items) ordered by
+    (student_id, component_id): each student's graded submissions to the
+    assignments of each given CIA component, summed in one grouped query.
+    """
+    rows = (
+        Submission.objects.filter(
+            marks_obtained__isnull=False,
+            assignment__course__semester__academic_department__academic_year=academic_year_obj,
+            assignment__cia_component__in=component_ids,
+        )
+        .values("student", "assignment__cia_component")
+        .annotate(obtained=Sum("marks_obtained"), max_marks=Sum("assignment__max_marks"), items=Count("pk"))
+        .order_by("student", "assignment__cia_component")
+        .values_list("student", "assignment__cia_component", "obtained", "max_marks", "items")
+    )
+    for student_id, component_id, obtained, max_marks, items in track_load(rows.iterator(chunk_size=chunk_size)):
+        yield student_id, component_id, Decimal(obtained), Decimal(max_marks), items
@@ -0,0 +1,204 @@
+# academics/attainment/po.py
+"""
+PO attainment for a department-year as a weighted average of CO attainment,
+weighted by the CO-PO correlation levels:
+
+    po_attainment = (W @ co_attainment) / (W @ has_attainment)
+
+where W is the sparse POs x COs correlation matrix. COs without attainment for
+the year carry no weight. A PO with no weighted CO has no attainment (None)
+rather than 0, which would read as a real 0%.
+
+Student-level PO attainment is the same weighted average taken over each
+student's own CO percentages, for every student of the department at once:
+
+    student_po = (S @ W.T) / (M @ W.T)
+
+where S is the students x COs percentage matrix and M marks the COs a student
+has a score for.
+"""
+from decimal import Decimal
+from itertools import islice
+
+import numpy as np
+from django.db import transaction
+
+from ..models import COPOMapping, CourseOutcomeAttainment, ProgramOutcome, StudentCOScore, StudentPOAttainment
+from .runs import track_load
+from .scores import scope_filter
+
+
+TWO_PLACES = Decimal("0.01")
+
+
+class CorrelationMatrix:
+    """
+    Sparse POs x COs matrix of correlation levels in coordinate form: entry k
+    has weight weights[k] at (po_index[k], co_index[k]).
+    """
+
+    def __init__(self, po_ids, co_ids, po_index, co_index, weights):
+        self.po_ids = po_ids
+        self.co_ids = co_ids
+        self.po_index = po_index
+        self.co_index = co_index
+        self.weights = weights
+
+    def dot(self, vector):
+        """Sparse matrix-vector product; vector is indexed like co_ids."""
+        result = np.zeros(len(self.po_ids), dtype=vector.dtype)
+        np.add.at(result, self.po_index, self.weights * vector[self.co_index])
+        return result
+
+    def dense(self):
+        """The COs x POs matrix W.T as a dense float array, for batched products."""
+        result = np.zeros((len(self.co_ids), len(self.po_ids)))
+        np.add.at(result, (self.co_index, self.po_index), self.weights)
+        return result
+
+
+def load_correlation_matrix(department_obj):
+    """
+    Loads the department's POs and the CO-PO mappings from its own courses with
+    two queries.
+    """
+    po_ids = list(
+        track_load(ProgramOutcome.objects.filter(department=department_obj).order_by("pk").values_list("pk", flat=True))
+    )
+    mappings = list(
+        track_load(
+            COPOMapping.objects.filter(
+                program_outcome__department=department_obj,
+                course_outcome__course__department=department_obj,
+                correlation_level__gt=0,
+            ).values_list("program_outcome_id", "course_outcome_id", "correlation_level")
+        )
+    )
+
+    co_ids = sorted({co_id for _, co_id, _ in mappings})
+    po_position = {pk: i for i, pk in enumerate(po_ids)}
+    co_position = {pk: i for i, pk in enumerate(co_ids)}
+    count = len(mappings)
+    return CorrelationMatrix(
+        po_ids,
+        co_ids,
+        np.fromiter((po_position[po_id] for po_id, _, _ in mappings), dtype=np.intp, count=count),
+        np.fromiter((co_position[co_id] for _, co_id, _ in mappings), dtype=np.intp, count=count),
+        np.fromiter((level for _, _, level in mappings), dtype=np.int64, count=count),
+    )
+
+
+def load_co_attainment_vector(department_obj, academic_year_obj):
+    """Returns {course_outcome_id: attainment_percentage} stored for the department's COs in a year."""
+    return dict(
+        track_load(
+            CourseOutcomeAttainment.objects.filter(
+                course_outcome__course__department=department_obj,
+                academic_year=academic_year_obj,
+                attainment_percentage__isnull=False,
+            ).values_list("course_outcome_id", "attainment_percentage")
+        )
+    )
+
+
+def compute_po_attainment(department_obj, academic_year_obj, co_attainment=None):
+    """
+    Returns {program_outcome_id: attainment_percentage} for every PO of the
+    department, None for a PO without any mapped CO attainment. co_attainment
+    ({co_id: percentage}) defaults to the stored CO attainment for the year.
+    """
+    matrix = load_correlation_matrix(department_obj)
+    if co_attainment is None:
+        co_attainment = load_co_attainment_vector(department_obj, academic_year_obj)
+
+    # Percentages have two decimal places, so hundredths keep the sums exact in int64
+    hundredths = np.zeros(len(matrix.co_ids), dtype=np.int64)
+    present = np.zeros(len(matrix.co_ids), dtype=np.int64)
+    for j, co_id in enumerate(matrix.co_ids):
+        percentage = co_attainment.get(co_id)
+        if percentage is not None:
+            hundredths[j] = int(Decimal(percentage).quantize(TWO_PLACES) * 100)
+            present[j] = 1
+
+    weighted = matrix.dot(hundredths)
+    total_weight = matrix.dot(present)
+
+    return {
+        po_id: (
+            (Decimal(int(weighted[i])) / Decimal(int(total_weight[i]) * 100)).quantize(TWO_PLACES)
+            if total_weight[i] > 0
+            else None
+        )
+        for i, po_id in enumerate(matrix.po_ids)
+    }
+
+
+def load_student_co_matrix(department_obj, academic_year_obj, co_ids, chunk_size=2000):
+    """
+    Reads the department's StudentCOScore percentages for the year into a
+    students x COs matrix of hundredths (columns ordered like co_ids) and a
+    matching 0/1 mask of the scores present. Returns (student_ids, scores, mask).
+    """
+    co_position = {pk: j for j, pk in enumerate(co_ids)}
+    rows = (
+        StudentCOScore.objects.filter(scope_filter(academic_year_obj, department_obj=department_obj), percentage__isnull=False)
+        .values_list("student_id", "course_outcome_id", "percentage")
+        .iterator(chunk_size=chunk_size)
+    )
+    student_position = {}
+    student_index, co_index, hundredths = [], [], []
+    for student_id, co_id, percentage in track_load(rows):
+        j = co_position.get(co_id)
+        if j is None:
+            continue  # CO not mapped to any PO
+        student_index.append(student_position.setdefault(student_id, len(student_position)))
+        co_index.append(j)
+        hundredths.append(int(percentage * 100))
+
+    scores = np.zeros((len(student_position), len(co_ids)))
+    mask = np.zeros_like(scores)
+    scores[student_index, co_index] = hundredths
+    mask[student_index, co_index] = 1
+    return list(student_position), scores, mask
+
+
+def compute_student_po_attainment(department_obj, academic_year_obj):
+    """
+    Returns (po_ids, student_ids, attainment) where attainment is a students x POs
+    array of percentages to two places, NaN where the student has no score on
+    any CO mapped to the PO.
+    """
+    matrix = load_correlation_matrix(department_obj)
+    student_ids, scores, mask = load_student_co_matrix(department_obj, academic_year_obj, matrix.co_ids)
+    weights = matrix.dense()
+
+    # Hundredths times small integer weights stay whole and exact in float64, so
+    # the products can be divided in integers and rounded half-even like Decimal
+    weighted = (scores @ weights).astype(np.int64)
+    total_weight = (mask @ weights).astype(np.int64)
+    divisor = np.maximum(total_weight, 1)
+    quotient, remainder = np.divmod(weighted, divisor)
+    quotient += (2 * remainder > divisor) | ((2 * remainder == divisor) & (quotient % 2 == 1))
+    attainment = np.where(total_weight > 0, quotient / 100, np.nan)
+    return matrix.po_ids, student_ids, attainment
+
+
+@transaction.atomic
+def write_student_po_attainment(department_obj, academic_year_obj, po_ids, student_ids, attainment, chunk_size=1000):
+    """Replaces the department-year's StudentPOAttainment rows, one per student; returns the rows written."""
+    StudentPOAttainment.objects.filter(department=department_obj, academic_year=academic_year_obj).delete()
+    keys = [str(po_id) for po_id in po_ids]
+    rows = (
+        StudentPOAttainment(
+            student_id=student_id,
+            department=department_obj,
+            academic_year=academic_year_obj,
+            attainment={key: None if np.isnan(value) else float(value) for key, value in zip(keys, vector)},
+        )
+        for student_id, vector in zip(student_ids, attainment)
+    )
+    written = 0
+    while chunk := list(islice(rows, chunk_size)):
+        StudentPOAttainment.objects.bulk_create(chunk)
+        written += len(chunk)
+    return written
@@ -0,0 +1,99 @@
+# academics/attainment/runs.py
+"""
+Records each attainment calculation as an AttainmentRun. A RunRecorder is
+active for the duration of a run; the loaders report the time spent reading
+rows through track_load(), so the load phase is measured where it happens even
+when reading and computing are interleaved in one stream.
+"""
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from decimal import Decimal
+
+from django.db import connection
+from django.utils import timezone
+
+from ..models import AttainmentRun
+
+
+_current_recorder = ContextVar("attainment_run_recorder", default=None)
+
+
+class RunRecorder:
+    """Collects phase timings, row counts and the query count of one run."""
+
+    def __init__(
+        self, kind, academic_year_obj, course_obj=None, department_obj=None, engine="", user=None,
+        source=AttainmentRun.Source.WEB, record=True, success_threshold=None,
+    ):
+        # Runs that write nothing (dry runs) are not recorded either
+        self.record = record
+        self.run = AttainmentRun(
+            kind=kind,
+            academic_year=academic_year_obj,
+            course=course_obj,
+            department=department_obj,
+            engine=engine,
+            success_threshold=None if success_threshold is None else Decimal(str(success_threshold)),
+            source=source,
+            triggered_by=user if user is not None and user.is_authenticated else None,
+        )
+
+    def __enter__(self):
+        self.run.started_at = timezone.now()
+        self._started = time.monotonic()
+        self._token = _current_recorder.set(self)
+        self._query_counter = connection.execute_wrapper(self._count_query)
+        self._query_counter.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._query_counter.__exit__(exc_type, exc, tb)
+        _current_recorder.reset(self._token)
+        self.run.finished_at = timezone.now()
+        self.run.total_seconds = time.monotonic() - self._started
+        if exc_type is None and self.record:
+            self.run.save()
+        return False
+
+    def _count_query(self, execute, sql, params, many, context):
+        self.run.query_count += 1
+        return execute(sql, params, many, context)
+
+    @contextmanager
+    def phase(self, name):
+        """
+        Times a 'load', 'compute' or 'write' phase. Loading already booked by
+        track_load() inside the phase is not counted twice.
+        """
+        load_before = self.run.load_seconds
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            elapsed = time.monotonic() - started - (self.run.load_seconds - load_before)
+            setattr(self.run, f"{name}_seconds", getattr(self.run, f"{name}_seconds") + elapsed)
+
+
+def current_recorder():
+    return _current_recorder.get()
+
+
+def track_load(rows):
+    """Wraps an iterator of loaded rows, booking the time spent fetching them and their count to the active run."""
+    recorder = current_recorder()
+    if recorder is None:
+        yield from rows
+        return
+    started = time.monotonic()
+    rows = iter(rows)  # evaluates a queryset
+    while True:
+        try:
+            row = next(rows)
+        except StopIteration:
+            recorder.run.load_seconds += time.monotonic() - started
+            return
+        recorder.run.load_seconds += time.monotonic() - started
+        recorder.run.rows_read += 1
+        yield row
+        started = time.monotonic()
@@ -0,0 +1,143 @@
+# academics/attainment/scores.py
+"""
+The materialized StudentCOScore table: one row per (student, CO, academic year)
+with the obtained and maximum marks from both submissions and exam marks.
+"""
+from decimal import Decimal
+from itertools import islice
+
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery
+from django.db.models.lookups import GreaterThanOrEqual
+
+from ..models import CourseOutcomeAttainment, StudentCOScore
+from .pipeline import stream_student_co_totals
+from .runs import track_load
+from . import sql
+from .sql import DEFAULT_SUCCESS_THRESHOLD, TWO_PLACES
+from .weighting import co_component_weights
+
+
+def score_percentage(obtained, max_marks):
+    """Percentage stored on a StudentCOScore row; None when there are no max marks."""
+    if not max_marks or max_marks <= 0:
+        return None
+    return (Decimal(obtained) * 100 / Decimal(max_marks)).quantize(TWO_PLACES)
+
+
+def load_scores(academic_year_obj, course_obj=None, department_obj=None):
+    """
+    Recomputes the scores in scope from the raw marks of both sources.
+    Returns {(student_id, co_id): [obtained, max_marks, graded_items]}.
+    """
+    return {
+        (student_id, co_id): [obtained, max_marks, items]
+        for student_id, co_id, obtained, max_marks, items in stream_student_co_totals(
+            academic_year_obj, course_obj, department_obj
+        )
+    }
+
+
+def scope_filter(academic_year_obj, course_obj=None, department_obj=None):
+    """Queryset filter selecting the StudentCOScore rows of a scope."""
+    scope = Q(academic_year=academic_year_obj)
+    if course_obj is not None:
+        scope &= Q(course_outcome__course=course_obj)
+    elif department_obj is not None:
+        scope &= Q(course_outcome__course__department=department_obj)
+    return scope
+
+
+@transaction.atomic
+def write_scores(academic_year_obj, totals, course_obj=None, department_obj=None, chunk_size=1000):
+    """
+    Replaces the StudentCOScore rows of a scope with the given totals, an iterable
+    of (student_id, co_id, obtained, max_marks, graded_items). Rows are inserted in
+    chunks so large years never build every model instance at once.
+    """
+    StudentCOScore.objects.filter(scope_filter(academic_year_obj, course_obj, department_obj)).delete()
+    rows = (
+        StudentCOScore(
+            student_id=student_id,
+            course_outcome_id=co_id,
+            academic_year=academic_year_obj,
+            obtained=obtained,
+            max_marks=max_marks,
+            percentage=score_percentage(obtained, max_marks),
+            graded_items=items,
+        )
+        for student_id, co_id, obtained, max_marks, items in totals
+    )
+    written = 0
+    while chunk := list(islice(rows, chunk_size)):
+        StudentCOScore.objects.bulk_create(chunk)
+        written += len(chunk)
+    return written
+
+
+def refresh_student_co_scores(academic_year_obj, course_obj=None, department_obj=None, chunk_size=1000):
+    """
+    Rebuilds the StudentCOScore rows of a scope from the raw marks, streaming the
+    totals straight into the table; returns the rows written.
+    """
+    totals = stream_student_co_totals(academic_year_obj, course_obj, department_obj, chunk_size)
+    return write_scores(academic_year_obj, totals, course_obj, department_obj, chunk_size)
+
+
+def student_co_scores(student_profile):
+    """
+    A student's own CO percentages across all years, each annotated with the
+    class attainment of the CO in that year, read in one query over the
+    (student, academic year) index.
+    """
+    class_attainment = CourseOutcomeAttainment.objects.filter(
+        course_outcome=OuterRef("course_outcome"), academic_year=OuterRef("academic_year")
+    ).values("attainment_percentage")[:1]
+    return (
+        StudentCOScore.objects.filter(student=student_profile)
+        .annotate(class_attainment=Subquery(class_attainment))
+        .select_related("course_outcome__course", "academic_year")
+        .order_by("-academic_year__start_date", "course_outcome__course__code", "course_outcome__code")
+    )
+
+
+def tally_co_attainment(academic_year_obj, course_obj=None, department_obj=None, success_threshold=DEFAULT_SUCCESS_THRESHOLD):
+    """
+    Attainment engine over the precomputed StudentCOScore rows: one indexed,
+    grouped query with the threshold applied in the database, returning
+    {course_outcome_id: (students_counted, students_above_threshold)}.
+    StudentCOScore pools internal and external marks, so a scope with an
+    assessment ratio to apply is tallied from the mark stream instead.
+    """
+    if co_component_weights(academic_year_obj, course_obj, department_obj):
+        return sql.tally_co_attainment(academic_year_obj, course_obj, department_obj, success_threshold)
+    return pooled_tallies(academic_year_obj, course_obj, department_obj, success_threshold)
+
+
+def pooled_tallies(academic_year_obj, course_obj=None, department_obj=None, success_threshold=DEFAULT_SUCCESS_THRESHOLD):
+    """
+    {course_outcome_id: (students_counted, students_above_threshold)} over the
+    StudentCOScore rows of a scope with internal and external marks pooled,
+    whatever the courses' assessment ratios; the incremental tallies hold these.
+    """
+    threshold = Decimal(str(success_threshold))
+    rows = (
+        StudentCOScore.objects.filter(scope_filter(academic_year_obj, course_obj, department_obj))
+        .values("course_outcome")
+        .annotate(
+            counted=Count("pk"),
+            passed=Count(
+                "pk",
+                filter=Q(max_marks__gt=0) & GreaterThanOrEqual(F("obtained") * 100, F("max_marks") * threshold),
+            ),
+        )
+        .order_by()
+    )
+    return {row["course_outcome"]: (row["counted"], row["passed"]) for row in track_load(rows) if row["counted"]}
+
+
+def compute_co_attainment(academic_year_obj, course_obj=None, department_obj=None, success_threshold=DEFAULT_SUCCESS_THRESHOLD):
+    """The {course_outcome_id: attainment_percentage} of tally_co_attainment."""
+    return sql.attainment_from_tallies(
+        tally_co_attainment(academic_year_obj, course_obj, department_obj, success_threshold)
+    )
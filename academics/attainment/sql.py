@@ -0,0 +1,52 @@
+# academics/attainment/sql.py
+from collections import defaultdict
+from decimal import Decimal
+
+from .pipeline import stream_student_co_components
+from .weighting import co_component_weights, is_passing
+
+
+TWO_PLACES = Decimal("0.01")
+DEFAULT_SUCCESS_THRESHOLD = 60.0
+
+
+def tally_co_attainment(academic_year_obj, course_obj=None, department_obj=None, success_threshold=DEFAULT_SUCCESS_THRESHOLD):
+    """
+    Counts, for every Course Outcome in scope (a course, or a whole department)
+    for an academic year, the students with graded work and the students at or
+    above the threshold, in one pass over the streamed per-student totals of exam
+    marks and submissions (see pipeline.py). Internal and external marks are
+    weighted by the course plan's assessment ratio where one is set. Returns
+    {course_outcome_id: (students_counted, students_above_threshold)}.
+    """
+    students_counted = defaultdict(int)
+    students_above_threshold = defaultdict(int)
+    threshold = Decimal(str(success_threshold))
+    weights = co_component_weights(academic_year_obj, course_obj, department_obj)
+
+    for _, co_id, *components, _ in stream_student_co_components(academic_year_obj, course_obj, department_obj):
+        students_counted[co_id] += 1
+        if is_passing(*components, weights.get(co_id), threshold):
+            students_above_threshold[co_id] += 1
+
+    return {co_id: (counted, students_above_threshold[co_id]) for co_id, counted in students_counted.items()}
+
+
+def attainment_from_tallies(tallies):
+    """Returns {course_outcome_id: attainment_percentage} from {course_outcome_id: (counted, passed)}."""
+    return {
+        co_id: (Decimal(passed * 100) / Decimal(counted)).quantize(TWO_PLACES)
+        for co_id, (counted, passed) in tallies.items()
+        if counted > 0
+    }
+
+
+def compute_co_attainment(academic_year_obj, course_obj=None, department_obj=None, success_threshold=DEFAULT_SUCCESS_THRESHOLD):
+    """
+    Calculates the attainment of every Course Outcome in scope from
+    tally_co_attainment. Returns a dict of {course_outcome_id:
+    attainment_percentage}. COs without any graded work are left out, as before.
+    """
+    return attainment_from_tallies(
+        tally_co_attainment(academic_year_obj, course_obj, department_obj, success_threshold)
+    )
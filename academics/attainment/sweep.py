@@ -0,0 +1,77 @@
+# academics/attainment/sweep.py
+"""
+"What-if" attainment curves: the attainment of every CO in scope at every
+success threshold, from one load of the per-student totals. Each CO's student
+percentages are sorted once; the number of students at or above a threshold is
+then a binary search into the sorted array instead of a recompute.
+"""
+from collections import defaultdict
+from decimal import localcontext
+
+import numpy as np
+
+from ..models import StudentCOScore
+from . import cia, get_engine_name
+from .scores import scope_filter
+from .pipeline import stream_student_co_components
+from .weighting import co_component_weights, student_percentage
+
+
+DEFAULT_THRESHOLDS = tuple(range(0, 101))
+
+
+def load_student_percentages(academic_year_obj, course_obj=None, department_obj=None, engine=None):
+    """
+    Yields (co_id, percentage) per student and CO from the same source the
+    configured engine reads: StudentCOScore for 'scores', the CIA-component
+    totals for 'cia', the mark stream otherwise. Internal and external marks are weighted by the course's
+    assessment ratio where one is set; students with no max marks get -inf.
+    """
+    weights = co_component_weights(academic_year_obj, course_obj, department_obj)
+    engine = get_engine_name(engine)
+    if engine == "scores" and not weights:
+        rows = (
+            StudentCOScore.objects.filter(scope_filter(academic_year_obj, course_obj, department_obj))
+            .values_list("course_outcome_id", "obtained", "max_marks")
+            .order_by()
+        )
+        for co_id, obtained, max_marks in rows:
+            yield co_id, float(obtained * 100 / max_marks) if max_marks and max_marks > 0 else -np.inf
+        return
+    if engine == "cia":
+        with localcontext(prec=cia.EXACT_PRECISION):
+            for _, co_id, *components, _ in cia.stream_student_co_components(
+                academic_year_obj, course_obj, department_obj
+            ):
+                yield co_id, student_percentage(*cia.exact_components(components), weights.get(co_id))
+        return
+    for _, co_id, *components, _ in stream_student_co_components(academic_year_obj, course_obj, department_obj):
+        yield co_id, student_percentage(*components, weights.get(co_id))
+
+
+def attainment_curve(percentages, thresholds):
+    """
+    Attainment (% of students at or above each threshold) for one CO. percentages
+    must be sorted ascending; students with no max marks are -inf, so they are
+    counted but never pass.
+    """
+    below = np.searchsorted(percentages, thresholds, side="left")
+    return (len(percentages) - below) * 100.0 / len(percentages)
+
+
+def sweep_co_attainment(academic_year_obj, course_obj=None, department_obj=None, thresholds=DEFAULT_THRESHOLDS, engine=None):
+    """
+    Returns {co_id: (students_counted, attainment array)}, one attainment value per
+    threshold, for every CO with graded work in scope. Values agree with
+    compute_co_attainment run at each threshold.
+    """
+    percentages_by_co = defaultdict(list)
+    for co_id, percentage in load_student_percentages(academic_year_obj, course_obj, department_obj, engine):
+        percentages_by_co[co_id].append(percentage)
+
+    thresholds = np.asarray(thresholds, dtype=float)
+    curves = {}
+    for co_id, percentages in percentages_by_co.items():
+        percentages = np.sort(np.asarray(percentages, dtype=float))
+        curves[co_id] = (len(percentages), attainment_curve(percentages, thresholds))
+    return curves
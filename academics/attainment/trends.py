@@ -0,0 +1,199 @@
+# academics/attainment/trends.py
+"""
+The attainment trend cube: one AttainmentTrendCell per (department, academic
+year, CO/PO, course). The cells of a scope are rebuilt from its saved attainment
+after every calculation, and only the cells whose values changed are written, so
+multi-year trend pages read a few precomputed rows instead of aggregating the
+attainment tables once per year.
+"""
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from ..models import (
+    AcademicYear,
+    AttainmentRun,
+    AttainmentTrendCell,
+    CourseOutcomeAttainment,
+    ProgramOutcomeAttainment,
+    StudentCOScore,
+    StudentPOAttainment,
+)
+from .persistence import AttainmentDiff
+from .scores import scope_filter
+from .sql import TWO_PLACES
+
+
+DEFAULT_TREND_YEARS = 5
+
+
+def _cell_values(outcomes, sample_size):
+    """(attainment, sample_size, outcomes) of a cell from its {code: percentage} values."""
+    attainment = (sum(outcomes.values()) / len(outcomes)).quantize(TWO_PLACES)
+    return attainment, sample_size, {code: float(value) for code, value in sorted(outcomes.items())}
+
+
+def co_cells(academic_year_obj, course_obj=None, department_obj=None):
+    """
+    Returns {(department_id, course_id): (attainment, sample_size, outcomes)} for the
+    courses in scope, from their saved CO attainment and StudentCOScore rows.
+    """
+    attainments = CourseOutcomeAttainment.objects.filter(
+        academic_year=academic_year_obj,
+        attainment_percentage__isnull=False,
+        course_outcome__course__department__isnull=False,
+    )
+    if course_obj is not None:
+        attainments = attainments.filter(course_outcome__course=course_obj)
+    elif department_obj is not None:
+        attainments = attainments.filter(course_outcome__course__department=department_obj)
+
+    outcomes = defaultdict(dict)
+    for department_id, course_id, code, percentage in attainments.values_list(
+        "course_outcome__course__department", "course_outcome__course", "course_outcome__code", "attainment_percentage"
+    ):
+        outcomes[(department_id, course_id)][code] = percentage
+
+    sample_sizes = dict(
+        StudentCOScore.objects.filter(scope_filter(academic_year_obj, course_obj, department_obj))
+        .values("course_outcome__course")
+        .annotate(students=Count("student", distinct=True))
+        .values_list("course_outcome__course", "students")
+    )
+    return {key: _cell_values(values, sample_sizes.get(key[1], 0)) for key, values in outcomes.items()}
+
+
+def po_cells(academic_year_obj, department_obj=None):
+    """
+    Returns {(department_id, None): (attainment, sample_size, outcomes)} for the
+    departments in scope, from their saved PO attainment and StudentPOAttainment rows.
+    """
+    attainments = ProgramOutcomeAttainment.objects.filter(
+        academic_year=academic_year_obj, attainment_percentage__isnull=False
+    )
+    students = StudentPOAttainment.objects.filter(academic_year=academic_year_obj)
+    if department_obj is not None:
+        attainments = attainments.filter(program_outcome__department=department_obj)
+        students = students.filter(department=department_obj)
+
+    outcomes = defaultdict(dict)
+    for department_id, code, percentage in attainments.values_list(
+        "program_outcome__department", "program_outcome__code", "attainment_percentage"
+    ):
+        outcomes[(department_id, None)][code] = percentage
+
+    sample_sizes = dict(
+        students.values("department").annotate(students=Count("pk")).values_list("department", "students")
+    )
+    return {key: _cell_values(values, sample_sizes.get(key[0], 0)) for key, values in outcomes.items()}
+
+
+@transaction.atomic
+def save_cells(kind, academic_year_obj, cells, stored_cells):
+    """
+    Writes the cells of one scope given the queryset of its stored cells: new
+    cells are inserted, changed ones updated and cells whose attainment is gone
+    deleted; unchanged cells are left alone. Returns an AttainmentDiff keyed by
+    (department_id, course_id).
+    """
+    existing = {(cell.department_id, cell.course_id): cell for cell in stored_cells}
+    diff = AttainmentDiff()
+    new_cells, changed_cells = [], []
+    now = timezone.now()
+    for key, (attainment, sample_size, outcomes) in cells.items():
+        cell = existing.pop(key, None)
+        if cell is None:
+            diff.inserted[key] = attainment
+            new_cells.append(
+                AttainmentTrendCell(
+                    department_id=key[0],
+                    course_id=key[1],
+                    academic_year=academic_year_obj,
+                    kind=kind,
+                    attainment=attainment,
+                    sample_size=sample_size,
+                    outcomes=outcomes,
+                )
+            )
+        elif (cell.attainment, cell.sample_size, cell.outcomes) != (attainment, sample_size, outcomes):
+            diff.updated[key] = (cell.attainment, attainment)
+            cell.attainment, cell.sample_size, cell.outcomes, cell.updated_at = attainment, sample_size, outcomes, now
+            changed_cells.append(cell)
+        else:
+            diff.unchanged += 1
+
+    AttainmentTrendCell.objects.bulk_create(new_cells)
+    AttainmentTrendCell.objects.bulk_update(changed_cells, ["attainment", "sample_size", "outcomes", "updated_at"])
+    if existing:
+        AttainmentTrendCell.objects.filter(pk__in=[cell.pk for cell in existing.values()]).delete()
+    return diff
+
+
+def refresh_co_trends(academic_year_obj, course_obj=None, department_obj=None):
+    """Brings the CO cells of a course, a department or a whole year in line with the saved CO attainment."""
+    stored = AttainmentTrendCell.objects.filter(kind=AttainmentRun.Kind.CO, academic_year=academic_year_obj)
+    if course_obj is not None:
+        stored = stored.filter(course=course_obj)
+    elif department_obj is not None:
+        stored = stored.filter(department=department_obj)
+    return save_cells(
+        AttainmentRun.Kind.CO, academic_year_obj, co_cells(academic_year_obj, course_obj, department_obj), stored
+    )
+
+
+def refresh_po_trends(academic_year_obj, department_obj=None):
+    """Brings the PO cells of a department or a whole year in line with the saved PO attainment."""
+    stored = AttainmentTrendCell.objects.filter(kind=AttainmentRun.Kind.PO, academic_year=academic_year_obj)
+    if department_obj is not None:
+        stored = stored.filter(department=department_obj)
+    return save_cells(AttainmentRun.Kind.PO, academic_year_obj, po_cells(academic_year_obj, department_obj), stored)
+
+
+def department_trends(department_obj, years=DEFAULT_TREND_YEARS):
+    """
+    The department's PO and per-course CO attainment over its latest `years`
+    academic years, read from the cube in one indexed query and shaped for
+    charting: every series has one value per year, None where there is no cell.
+    The latest years are picked in a subquery, so older years' cells are never read.
+    """
+    department_cells = AttainmentTrendCell.objects.filter(department=department_obj)
+    latest_years = (
+        AcademicYear.objects.filter(pk__in=department_cells.values("academic_year"))
+        .order_by("-start_date")
+        .values("pk")[:years]
+    )
+    cells = list(
+        department_cells.filter(academic_year__in=latest_years)
+        .select_related("academic_year", "course")
+        .order_by("academic_year__start_date", "course__code")
+    )
+    academic_years = list({cell.academic_year_id: cell.academic_year for cell in cells}.values())
+    position = {academic_year.pk: i for i, academic_year in enumerate(academic_years)}
+
+    def series():
+        return [None] * len(academic_years)
+
+    po = {"attainment": series(), "sample_size": series(), "outcomes": defaultdict(series)}
+    courses = {}
+    for cell in cells:
+        i = position[cell.academic_year_id]
+        if cell.kind == AttainmentRun.Kind.PO:
+            target = po
+            for code, value in cell.outcomes.items():
+                po["outcomes"][code][i] = value
+        else:
+            target = courses.setdefault(
+                cell.course_id,
+                {"code": cell.course.code, "name": cell.course.name, "attainment": series(), "sample_size": series()},
+            )
+        target["attainment"][i] = float(cell.attainment) if cell.attainment is not None else None
+        target["sample_size"][i] = cell.sample_size
+
+    po["outcomes"] = dict(sorted(po["outcomes"].items()))
+    return {
+        "years": [f"{year.start_date.year}-{year.end_date.year}" for year in academic_years],
+        "po": po,
+        "courses": sorted(courses.values(), key=lambda course: course["code"]),
+    }
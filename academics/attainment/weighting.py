@@ -0,0 +1,139 @@
+# academics/attainment/weighting.py
+"""
+Accreditation settings applied by the batch engines: the internal (CIA) to
+external split from CoursePlan.assessment_ratio, and the attainment level bands
+from settings.ATTAINMENT_LEVEL_BANDS.
+
+A course with a valid ratio scores each student on a CO as the weighted mean of
+their internal and external percentages; when only one component has marks its
+percentage is used alone. Courses without a ratio pool all marks as before.
+"""
+import logging
+
+import numpy as np
+from django.conf import settings
+
+from ..models import CourseOutcome
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LEVEL_BANDS = (50, 60, 70)
+# Ratio parts are percentages or small multiples; the cap keeps the exact integer comparisons in range
+MAX_RATIO_PART = 100
+
+
+def parse_assessment_ratio(ratio):
+    """
+    Parses an "internal:external" ratio such as "60:40" into (60, 40). Returns
+    None for a blank ratio and raises ValueError for a malformed one.
+    """
+    if ratio is None or not ratio.strip():
+        return None
+    parts = ratio.split(":")
+    if len(parts) != 2:
+        raise ValueError(f"Assessment ratio '{ratio}' must look like 60:40.")
+    try:
+        internal, external = (int(part.strip()) for part in parts)
+    except ValueError:
+        raise ValueError(f"Assessment ratio '{ratio}' must be two whole numbers, like 60:40.") from None
+    if internal < 0 or external < 0 or internal + external == 0:
+        raise ValueError(f"Assessment ratio '{ratio}' needs non-negative parts that are not both zero.")
+    if max(internal, external) > MAX_RATIO_PART:
+        raise ValueError(f"Assessment ratio '{ratio}' parts can be at most {MAX_RATIO_PART}.")
+    return internal, external
+
+
+def co_component_weights(academic_year_obj, course_obj=None, department_obj=None, co_ids=None):
+    """
+    Returns {co_id: (internal_weight, external_weight)} for the COs in scope (or
+    among co_ids when given) whose course plan has a valid assessment ratio, from
+    one query. Invalid ratios are logged and the course is left unweighted.
+    """
+    outcomes = CourseOutcome.objects.filter(course__course_plan__assessment_ratio__isnull=False)
+    if co_ids is not None:
+        outcomes = outcomes.filter(pk__in=co_ids)
+    elif course_obj is not None:
+        outcomes = outcomes.filter(course=course_obj)
+    elif department_obj is not None:
+        outcomes = outcomes.filter(course__department=department_obj)
+    else:
+        outcomes = outcomes.filter(course__semester__academic_department__academic_year=academic_year_obj)
+
+    weights = {}
+    for co_id, course_code, ratio in outcomes.values_list("pk", "course__code", "course__course_plan__assessment_ratio"):
+        try:
+            parsed = parse_assessment_ratio(ratio)
+        except ValueError as error:
+            logger.warning("Ignoring the assessment ratio of %s: %s", course_code, error)
+            continue
+        if parsed is not None:
+            weights[co_id] = parsed
+    return weights
+
+
+def is_passing(internal_obtained, internal_max, external_obtained, external_max, weights, threshold):
+    """
+    True when a student's CO percentage reaches the threshold. weights is the
+    course's (internal, external) ratio, or None to pool all marks. The weighted
+    mean is compared exactly, multiplied out instead of divided. Every engine and
+    the incremental running state decide passes here (matrix.passing is its
+    vectorized form).
+    """
+    if weights is None:
+        max_marks = internal_max + external_max
+        return max_marks > 0 and (internal_obtained + external_obtained) * 100 >= threshold * max_marks
+    internal_weight = weights[0] if internal_max > 0 else 0
+    external_weight = weights[1] if external_max > 0 else 0
+    if internal_weight + external_weight == 0:
+        return False
+    internal_max = internal_max or 1
+    external_max = external_max or 1
+    return (
+        100 * (internal_weight * internal_obtained * external_max + external_weight * external_obtained * internal_max)
+        >= threshold * (internal_weight + external_weight) * internal_max * external_max
+    )
+
+
+def student_percentage(internal_obtained, internal_max, external_obtained, external_max, weights):
+    """
+    A student's CO percentage as a float, for charting: the weighted mean of the
+    component percentages, or the pooled percentage without weights. -inf when
+    there are no marks to count, so the student never passes.
+    """
+    if weights is None:
+        max_marks = internal_max + external_max
+        return float((internal_obtained + external_obtained) * 100 / max_marks) if max_marks > 0 else -np.inf
+    components = [
+        (weight, obtained / max_marks)
+        for weight, obtained, max_marks in (
+            (weights[0], internal_obtained, internal_max),
+            (weights[1], external_obtained, external_max),
+        )
+        if max_marks > 0 and weight > 0
+    ]
+    if not components:
+        return -np.inf
+    return float(sum(weight * ratio for weight, ratio in components) * 100 / sum(weight for weight, _ in components))
+
+
+def get_level_bands():
+    """Returns the validated level bands: three ascending percentages for levels 1, 2 and 3."""
+    bands = tuple(getattr(settings, "ATTAINMENT_LEVEL_BANDS", DEFAULT_LEVEL_BANDS))
+    if len(bands) != 3 or list(bands) != sorted(bands) or not all(0 <= band <= 100 for band in bands):
+        raise ValueError(
+            f"ATTAINMENT_LEVEL_BANDS must be three ascending percentages between 0 and 100, got {bands!r}."
+        )
+    return bands
+
+
+def attainment_levels(percentages):
+    """Levels 0-3 for an array of attainment percentages, in one vectorized lookup."""
+    return np.searchsorted(np.asarray(get_level_bands(), dtype=float), np.asarray(percentages, dtype=float), side="right")
+
+
+def attainment_level(percentage):
+    """The level 0-3 of a single attainment percentage, or None when there is none."""
+    if percentage is None:
+        return None
+    return int(attainment_levels([percentage])[0])
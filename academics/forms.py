@@ -23,6 +23,7 @@ from django.forms import modelformset_factory
 from django.contrib.auth.models import User  # <--- ADD THIS LINE
 from django.forms import inlineformset_factory
 from django.contrib.auth.forms import UserCreationForm
+from .attainment.weighting import parse_assessment_ratio
 
 
 class AcademicYearForm(forms.ModelForm):
@@ -601,17 +602,20 @@ class AssessmentForm(forms.ModelForm):
             pass  # Keep it as all COs for now, or consider dynamic JS filtering if needed
 
 
-class StudentMarkForm(forms.ModelForm):
-    id = forms.IntegerField(widget=forms.HiddenInput(), required=False)  # ADD THIS LINE
+class StudentMarkForm(forms.Form):
+    """
+    One row of the mark entry formset. A plain form rather than a ModelForm, so
+    validating a row runs no queries: the student is looked up in the course
+    roster passed in as `roster` ({user_id: User}) and the marks are saved for
+    the whole formset by save_assessment_marks.
+    """
+    id = forms.IntegerField(widget=forms.HiddenInput(), required=False)
 
-    student = forms.ModelChoiceField(
-        queryset=User.objects.all().order_by(
-            "username"
-        ),  # Customize this if you have a Student profile
-        widget=forms.HiddenInput(),  # Hidden input for student
-        required=True,
-    )
+    # The student's User id
+    student = forms.IntegerField(widget=forms.HiddenInput(), required=True)
     marks_obtained = forms.DecimalField(
+        max_digits=StudentMark._meta.get_field("marks_obtained").max_digits,
+        decimal_places=StudentMark._meta.get_field("marks_obtained").decimal_places,
         widget=forms.NumberInput(
             attrs={
                 "class": "mt-1 block w-full px-4 py-2 border border-gray-300 rounded-lg shadow-sm focus:ring-indigo-500 focus:border-indigo-500 sm:text-base",
@@ -619,11 +623,26 @@ class StudentMarkForm(forms.ModelForm):
             }
         ),
         label="Marks Obtained",
+        required=False,
     )
 
-    class Meta:
-        model = StudentMark
-        fields = ["id", "student", "marks_obtained"]
+    def __init__(self, *args, **kwargs):
+        self.roster = kwargs.pop('roster', {})
+        super().__init__(*args, **kwargs)
+
+    @property
+    def student_user(self):
+        """The roster User this row is for, for display."""
+        try:
+            return self.roster.get(int(self['student'].value()))
+        except (TypeError, ValueError):
+            return None
+
+    def clean_student(self):
+        student = self.roster.get(self.cleaned_data['student'])
+        if student is None:
+            raise forms.ValidationError("This student is not enrolled in the course.")
+        return student
 
 
 # Formset factory for managing multiple StudentMark instances for one Assessment
@@ -634,6 +653,26 @@ from django.forms import formset_factory
 StudentMarkFormSet = formset_factory(StudentMarkForm, extra=0)
 
 
+class StudentMarkImportForm(forms.Form):
+    """
+    A mark sheet for one assessment: a CSV or XLSX file whose header row names a
+    student column (username or roll number) and a marks column.
+    """
+    file = forms.FileField(
+        label="Mark sheet (CSV or XLSX)",
+        widget=forms.ClearableFileInput(attrs={
+            'class': 'mt-1 block w-full text-sm text-gray-700 border border-gray-300 rounded-lg shadow-sm',
+            'accept': '.csv,.xlsx',
+        })
+    )
+
+    def clean_file(self):
+        upload = self.cleaned_data['file']
+        if not upload.name.lower().endswith(('.csv', '.xlsx')):
+            raise forms.ValidationError("Upload the marks as a .csv or .xlsx file.")
+        return upload
+
+
 # --- NEW: CoursePlan Management Forms ---
 
 class CoursePlanForm(forms.ModelForm):
@@ -681,6 +720,15 @@ class CoursePlanForm(forms.ModelForm):
                 self.fields[field_name].disabled = True
                 self.fields[field_name].widget.attrs['class'] += ' bg-gray-100 cursor-not-allowed'
 
+    def clean_assessment_ratio(self):
+        ratio = self.cleaned_data.get('assessment_ratio')
+        try:
+            parsed = parse_assessment_ratio(ratio)
+        except ValueError as error:
+            raise forms.ValidationError(str(error))
+        # Store the ratio in its canonical form, e.g. "60:40"
+        return f"{parsed[0]}:{parsed[1]}" if parsed else None
+
 
 class CourseObjectiveForm(forms.ModelForm):
     # --- NEW: Add this __init__ method ---
@@ -759,13 +807,20 @@ class CIAComponentForm(forms.ModelForm):
                 self.fields[field_name].disabled = True
                 self.fields[field_name].widget.attrs['class'] += ' bg-gray-100 cursor-not-allowed'
 
+    def clean_weight(self):
+        weight = self.cleaned_data.get('weight')
+        if weight is not None and weight < 0:
+            raise forms.ValidationError("Weight cannot be negative; leave it blank to count the marks as they are.")
+        return weight
+
     class Meta:
         model = CIAComponent
-        fields = ['order', 'component_name', 'units_covered', 'cos_covered' ,'evaluation_rubric']
+        fields = ['order', 'component_name', 'units_covered', 'weight', 'cos_covered' ,'evaluation_rubric']
         widgets = {
             'order': forms.NumberInput(attrs={'class': 'mt-1 block w-16 px-2 py-1 border border-gray-300 rounded-lg shadow-sm focus:ring-indigo-500 focus:border-indigo-500 sm:text-base'}),
             'component_name': forms.TextInput(attrs={'class': 'mt-1 block w-full px-4 py-2 border border-gray-300 rounded-lg shadow-sm focus:ring-indigo-500 focus:border-indigo-500 sm:text-base'}),
             'units_covered': forms.TextInput(attrs={'class': 'mt-1 block w-full px-4 py-2 border border-gray-300 rounded-lg shadow-sm focus:ring-indigo-500 focus:border-indigo-500 sm:text-base', 'placeholder': 'e.g., UNIT 1 & 2'}),
+            'weight': forms.NumberInput(attrs={'class': 'mt-1 block w-32 px-2 py-1 border border-gray-300 rounded-lg shadow-sm focus:ring-indigo-500 focus:border-indigo-500 sm:text-base', 'min': 0, 'step': '0.5', 'placeholder': 'e.g., 10'}),
             'cos_covered': forms.CheckboxSelectMultiple(attrs={'class': 'mt-1 block'}),
             'evaluation_rubric': forms.Textarea(attrs={'class': 'mt-1 block w-full px-4 py-2 border border-gray-300 rounded-lg shadow-sm focus:ring-indigo-500 focus:border-indigo-500 sm:text-base', 'rows': 6, 'placeholder': 'e.g., Content: Poor (0-1), Fair (2-3), Excellent (4-5)'}),
         }
@@ -777,7 +832,7 @@ CIAComponentFormSet = inlineformset_factory(
     form=CIAComponentForm,
     extra=0,        # One empty form by default
     can_delete=True, # Allow deleting components
-    fields=['order', 'component_name', 'units_covered', 'cos_covered', 'evaluation_rubric']
+    fields=['order', 'component_name', 'units_covered', 'weight', 'cos_covered', 'evaluation_rubric']
 )
 
 
@@ -1035,6 +1090,7 @@ class StudentUpdateByFacultyForm(forms.ModelForm):
     last_name = forms.CharField(max_length=150, required=True)
     email = forms.EmailField(required=True)
     department = forms.ModelChoiceField(queryset=Department.objects.all(), empty_label="Select Department")
+    roll_number = forms.CharField(max_length=30, required=False)
 
     class Meta:
         model = User # The form is based on the User model
@@ -1045,17 +1101,25 @@ class StudentUpdateByFacultyForm(forms.ModelForm):
         # Pre-populate the department field from the student's existing profile
         if self.instance and hasattr(self.instance, 'profile'):
             self.fields['department'].initial = self.instance.profile.department
+            self.fields['roll_number'].initial = self.instance.profile.roll_number
         
         # Apply styling to all fields
         for field_name, field in self.fields.items():
             field.widget.attrs['class'] = 'mt-1 block w-full px-4 py-2 border border-gray-300 rounded-lg shadow-sm'
 
+    def clean_roll_number(self):
+        roll_number = self.cleaned_data.get('roll_number', '').strip() or None
+        if roll_number and UserProfile.objects.filter(roll_number=roll_number).exclude(user=self.instance).exists():
+            raise forms.ValidationError("Another student already has this roll number.")
+        return roll_number
+
     def save(self, commit=True):
         # Save the User model instance
         user = super().save(commit=commit)
         
         # Now, update the related UserProfile model
         user.profile.department = self.cleaned_data['department']
+        user.profile.roll_number = self.cleaned_data['roll_number']
         
         if commit:
             user.profile.save()
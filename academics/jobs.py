@@ -0,0 +1,203 @@
+# academics/jobs.py
+"""
+A small database-backed job queue. Views enqueue a job and return at once;
+`manage.py run_worker` claims queued jobs with SELECT ... FOR UPDATE SKIP LOCKED,
+so several workers can poll the same table without picking the same job.
+
+Tasks are plain functions registered by name:
+
+    @register_task("exports.co_report")
+    def export_co_report(job, academic_year_id):
+        ...
+        return {"file": path}
+
+The payload is passed as keyword arguments and the return value (anything JSON
+serializable) is stored on the job as its result.
+
+A claimed job holds a lease of LEASE_SECONDS that its worker renews while the
+task runs. A RUNNING job whose lease has passed lost its worker (a crash or a
+kill); the next claim puts it back on the queue, or fails it once it has used
+its attempts, and new requests are no longer coalesced onto it.
+"""
+import logging
+import threading
+import traceback
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.db import connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import BackgroundJob
+
+logger = logging.getLogger(__name__)
+
+TASKS = {}
+
+# Retry n waits RETRY_BACKOFF_SECONDS * 2 ** (n - 1), capped at MAX_RETRY_DELAY_SECONDS
+RETRY_BACKOFF_SECONDS = 30
+MAX_RETRY_DELAY_SECONDS = 60 * 60
+
+# Renewed every LEASE_SECONDS / 3 while the job runs
+LEASE_SECONDS = 5 * 60
+
+
+def register_task(name):
+    """Decorator registering a function as the handler for a job task name."""
+    def decorator(func):
+        TASKS[name] = func
+        return func
+    return decorator
+
+
+def lost_jobs(now=None):
+    """Filter matching RUNNING jobs whose lease has passed; jobs claimed before leases existed have none."""
+    now = now or timezone.now()
+    return Q(status=BackgroundJob.Status.RUNNING) & (Q(lease_expires_at__lt=now) | Q(lease_expires_at__isnull=True))
+
+
+def enqueue(task, payload=None, user=None, max_attempts=3, coalesce=False):
+    """
+    Queues a job for a registered task and returns it. With coalesce=True, a
+    queued or running job with the same task and payload is returned instead,
+    unless that job has lost its worker.
+    """
+    if task not in TASKS:
+        raise ValueError(f"Unknown job task '{task}'.")
+    if coalesce:
+        pending = (
+            BackgroundJob.objects.filter(
+                task=task,
+                payload=payload or {},
+                status__in=[BackgroundJob.Status.QUEUED, BackgroundJob.Status.RUNNING],
+            )
+            .exclude(lost_jobs())
+            .order_by("pk")
+            .first()
+        )
+        if pending is not None:
+            return pending
+    return BackgroundJob.objects.create(
+        task=task,
+        payload=payload or {},
+        created_by=user if user is not None and user.is_authenticated else None,
+        max_attempts=max_attempts,
+    )
+
+
+def retry_delay(attempts):
+    return timedelta(seconds=min(RETRY_BACKOFF_SECONDS * 2 ** max(attempts - 1, 0), MAX_RETRY_DELAY_SECONDS))
+
+
+def reclaim_lost_jobs():
+    """
+    Queues the RUNNING jobs that lost their worker again, keeping their place in
+    the queue, or marks them FAILED when they have used their attempts. Returns
+    the number of jobs reclaimed.
+    """
+    now = timezone.now()
+    lost = BackgroundJob.objects.filter(lost_jobs(now))
+    error = "The worker running this attempt stopped before it finished."
+    requeued = lost.filter(attempts__lt=F("max_attempts")).update(
+        status=BackgroundJob.Status.QUEUED, finished_at=None, lease_expires_at=None, error=error
+    )
+    failed = lost.update(status=BackgroundJob.Status.FAILED, finished_at=now, lease_expires_at=None, error=error)
+    if requeued or failed:
+        logger.warning("Reclaimed %s job(s) from lost workers: %s re-queued, %s failed", requeued + failed, requeued, failed)
+    return requeued + failed
+
+
+def claim_next_job(worker_name=""):
+    """
+    Atomically claims the oldest runnable job and marks it RUNNING under a fresh
+    lease, after reclaiming the jobs of lost workers. Returns the job, or None
+    when nothing is due. Locked rows are skipped rather than waited on.
+    """
+    reclaim_lost_jobs()
+    with transaction.atomic():
+        job = (
+            BackgroundJob.objects.select_for_update(skip_locked=True)
+            .filter(status=BackgroundJob.Status.QUEUED, run_after__lte=timezone.now())
+            .order_by("run_after", "pk")
+            .first()
+        )
+        if job is None:
+            return None
+        job.status = BackgroundJob.Status.RUNNING
+        job.attempts += 1
+        job.started_at = timezone.now()
+        job.lease_expires_at = job.started_at + timedelta(seconds=LEASE_SECONDS)
+        job.worker = worker_name
+        job.save(update_fields=["status", "attempts", "started_at", "lease_expires_at", "worker"])
+    return job
+
+
+@contextmanager
+def renewing_lease(job):
+    """Renews a running job's lease from a background thread until the block exits."""
+    stopped = threading.Event()
+
+    def renew():
+        try:
+            while not stopped.wait(LEASE_SECONDS / 3):
+                BackgroundJob.objects.filter(pk=job.pk, status=BackgroundJob.Status.RUNNING).update(
+                    lease_expires_at=timezone.now() + timedelta(seconds=LEASE_SECONDS)
+                )
+        finally:
+            connection.close()
+
+    renewer = threading.Thread(target=renew, name=f"job-{job.pk}-lease", daemon=True)
+    renewer.start()
+    try:
+        yield
+    finally:
+        stopped.set()
+        renewer.join()
+
+
+def run_job(job):
+    """
+    Runs a claimed job. On failure the job is queued again with exponential
+    backoff until it has used max_attempts, then marked FAILED.
+    """
+    try:
+        func = TASKS[job.task]
+    except KeyError:
+        func = None
+
+    try:
+        if func is None:
+            raise LookupError(f"No task registered as '{job.task}'.")
+        with renewing_lease(job):
+            result = func(job, **job.payload)
+    except Exception:
+        job.error = traceback.format_exc()
+        job.lease_expires_at = None
+        if func is not None and job.attempts < job.max_attempts:
+            job.status = BackgroundJob.Status.QUEUED
+            job.finished_at = None
+            job.run_after = timezone.now() + retry_delay(job.attempts)
+            logger.warning("Job %s (%s) failed on attempt %s; retrying at %s", job.pk, job.task, job.attempts, job.run_after)
+        else:
+            job.status = BackgroundJob.Status.FAILED
+            job.finished_at = timezone.now()
+            logger.error("Job %s (%s) failed after %s attempt(s)", job.pk, job.task, job.attempts)
+        job.save(update_fields=["status", "error", "finished_at", "run_after", "lease_expires_at"])
+        return job
+
+    job.status = BackgroundJob.Status.SUCCEEDED
+    job.result = result
+    job.error = ""
+    job.finished_at = timezone.now()
+    job.lease_expires_at = None
+    job.save(update_fields=["status", "result", "error", "finished_at", "lease_expires_at"])
+    return job
+
+
+def run_next_job(worker_name=""):
+    """Claims and runs one job; returns it, or None when the queue is empty."""
+    job = claim_next_job(worker_name)
+    if job is not None:
+        run_job(job)
+    return job
@@ -0,0 +1,43 @@
+# academics/management/commands/rebuild_attainment_trends.py
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from academics.attainment import refresh_co_trends, refresh_po_trends
+from academics.models import AcademicYear
+
+
+class Command(BaseCommand):
+    help = (
+        "Brings the attainment trend cube in line with the saved CO and PO attainment. "
+        "Calculations keep it current; use this to backfill past years."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--year",
+            type=int,
+            help="Start year of the academic year, e.g. 2024. Defaults to the current academic year.",
+        )
+        parser.add_argument("--all-years", action="store_true", help="Rebuild every academic year.")
+
+    def handle(self, *args, **options):
+        if options["all_years"]:
+            academic_years = AcademicYear.objects.order_by("start_date")
+        elif options["year"]:
+            academic_years = AcademicYear.objects.filter(start_date__year=options["year"])
+        else:
+            academic_years = AcademicYear.objects.filter(is_current=True)
+        if not academic_years.exists():
+            raise CommandError("No matching academic year; pass --year or --all-years.")
+
+        for academic_year in academic_years:
+            started = time.monotonic()
+            co_diff = refresh_co_trends(academic_year)
+            po_diff = refresh_po_trends(academic_year)
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"{academic_year}: CO cells {co_diff}; PO cells {po_diff} "
+                    f"in {time.monotonic() - started:.2f}s"
+                )
+            )
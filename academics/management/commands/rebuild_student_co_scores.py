@@ -0,0 +1,49 @@
+# academics/management/commands/rebuild_student_co_scores.py
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from academics.attainment import incremental
+from academics.attainment.scores import load_scores
+from academics.models import AcademicYear
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuilds the materialized StudentCOScore table (and the CO tallies derived "
+        "from it) from submissions and exam marks, inserting in chunks."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--year",
+            type=int,
+            help="Start year of the academic year, e.g. 2024. Defaults to the current academic year.",
+        )
+        parser.add_argument("--all-years", action="store_true", help="Rebuild every academic year.")
+        parser.add_argument("--chunk-size", type=int, default=2000, help="Rows per bulk insert (default: 2000).")
+
+    def handle(self, *args, **options):
+        if options["chunk_size"] < 1:
+            raise CommandError("--chunk-size must be at least 1.")
+
+        if options["all_years"]:
+            academic_years = AcademicYear.objects.order_by("start_date")
+        elif options["year"]:
+            academic_years = AcademicYear.objects.filter(start_date__year=options["year"])
+        else:
+            academic_years = AcademicYear.objects.filter(is_current=True)
+        if not academic_years.exists():
+            raise CommandError("No matching academic year; pass --year or --all-years.")
+
+        for academic_year in academic_years:
+            started = time.monotonic()
+            scores = load_scores(academic_year)
+            tallies = incremental.tallies_from_scores(scores, incremental.tally_thresholds(academic_year))
+            incremental.replace_state(academic_year, scores, tallies, chunk_size=options["chunk_size"])
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"{academic_year}: {len(scores)} student CO score(s) and {len(tallies)} CO tally(ies) "
+                    f"rebuilt in {time.monotonic() - started:.2f}s"
+                )
+            )
@@ -0,0 +1,171 @@
+# academics/management/commands/recalculate_attainment.py
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+# The models and the attainment package are imported inside the functions below:
+# a pool process started with spawn or forkserver imports this module to find
+# the shard functions before _init_worker has set Django up.
+
+
+def _init_worker():
+    """Runs once in each pool process so every worker opens its own DB connection."""
+    import django
+
+    django.setup()
+    connections.close_all()
+
+
+def _run_co_shard(course_id, academic_year_id, engine, dry_run, force):
+    """Recalculates CO attainment for one course; returns a summary row for the report."""
+    from academics.attainment import recalculate_course
+    from academics.models import AcademicYear, AttainmentRun, Course
+
+    started = time.monotonic()
+    course = Course.objects.get(pk=course_id)
+    academic_year = AcademicYear.objects.get(pk=academic_year_id)
+    diff = recalculate_course(
+        course, academic_year, engine=engine, force=force, commit=not dry_run, source=AttainmentRun.Source.COMMAND
+    )
+    return {
+        "shard": f"CO {course.code}",
+        "rows": 0 if diff is None else diff.changed + diff.unchanged,
+        "changed": 0 if diff is None else diff.changed,
+        "skipped": diff is None,
+        "seconds": time.monotonic() - started,
+    }
+
+
+def _run_po_shard(department_id, academic_year_id, dry_run):
+    """Recalculates PO attainment for one department; returns a summary row for the report."""
+    from academics.attainment import recalculate_department_po
+    from academics.models import AcademicYear, AttainmentRun, Department
+
+    started = time.monotonic()
+    department = Department.objects.get(pk=department_id)
+    academic_year = AcademicYear.objects.get(pk=academic_year_id)
+    diff = recalculate_department_po(
+        department, academic_year, commit=not dry_run, source=AttainmentRun.Source.COMMAND
+    )
+    return {
+        "shard": f"PO {department.name}",
+        "rows": diff.changed + diff.unchanged,
+        "changed": diff.changed,
+        "skipped": False,
+        "seconds": time.monotonic() - started,
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalculates CO attainment (sharded by course) and then PO attainment "
+        "(sharded by department) for an academic year, optionally in parallel."
+    )
+
+    def add_arguments(self, parser):
+        from academics.attainment import ENGINES
+
+        parser.add_argument(
+            "--year",
+            type=int,
+            help="Start year of the academic year, e.g. 2024. Defaults to the current academic year.",
+        )
+        parser.add_argument("--department", type=int, help="Only recalculate this department (id).")
+        parser.add_argument("--course", type=int, help="Only recalculate this course (id) and its department's POs.")
+        parser.add_argument("--all", action="store_true", help="Recalculate every department and course.")
+        parser.add_argument("--workers", type=int, default=1, help="Number of worker processes (default: 1).")
+        parser.add_argument("--engine", choices=ENGINES, help="Override settings.ATTAINMENT_ENGINE for CO attainment.")
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="Recalculate courses whose marks and mappings are unchanged since their last run.",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Calculate and report changes without saving. PO figures use the CO attainment already stored.",
+        )
+
+    def handle(self, *args, **options):
+        from academics.models import Course, Department
+
+        if not (options["all"] or options["department"] or options["course"]):
+            raise CommandError("Choose a scope: --course, --department or --all.")
+        if options["workers"] < 1:
+            raise CommandError("--workers must be at least 1.")
+
+        academic_year = self._get_academic_year(options["year"])
+        courses = Course.objects.filter(semester__academic_department__academic_year=academic_year)
+        if options["course"]:
+            courses = courses.filter(pk=options["course"])
+            if not courses.exists():
+                raise CommandError(f"Course {options['course']} has no offering in {academic_year}.")
+        elif options["department"]:
+            courses = courses.filter(department_id=options["department"])
+
+        course_ids = list(courses.order_by("code").values_list("pk", flat=True))
+        if options["department"] and not options["course"]:
+            department_ids = [options["department"]]
+        else:
+            # Only departments offering courses this year have CO attainment to roll up
+            department_ids = list(
+                Department.objects.filter(courses__in=courses).distinct().order_by("name").values_list("pk", flat=True)
+            )
+
+        dry_run = options["dry_run"]
+        co_jobs = [
+            (_run_co_shard, (pk, academic_year.pk, options["engine"], dry_run, options["force"])) for pk in course_ids
+        ]
+        po_jobs = [(_run_po_shard, (pk, academic_year.pk, dry_run)) for pk in department_ids]
+
+        self.stdout.write(
+            f"{academic_year}: {len(co_jobs)} course shard(s), {len(po_jobs)} department shard(s), "
+            f"{options['workers']} worker(s){' [dry run]' if dry_run else ''}"
+        )
+        started = time.monotonic()
+        # PO attainment is built from CO attainment, so the CO phase must finish first
+        summary = self._run(co_jobs, options["workers"]) + self._run(po_jobs, options["workers"])
+        self._write_summary(summary, time.monotonic() - started)
+
+    def _get_academic_year(self, start_year):
+        from academics.models import AcademicYear
+
+        try:
+            if start_year:
+                return AcademicYear.objects.get(start_date__year=start_year)
+            return AcademicYear.objects.get(is_current=True)
+        except AcademicYear.DoesNotExist:
+            raise CommandError(
+                f"No academic year starting in {start_year}." if start_year else "No current academic year is set; pass --year."
+            )
+        except AcademicYear.MultipleObjectsReturned:
+            raise CommandError("More than one academic year matches; check the academic year setup.")
+
+    def _run(self, jobs, workers):
+        if workers == 1 or len(jobs) <= 1:
+            return [func(*args) for func, args in jobs]
+
+        # Connections must not be shared with forked workers
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+            futures = [pool.submit(func, *args) for func, args in jobs]
+            return [future.result() for future in futures]
+
+    def _write_summary(self, summary, elapsed):
+        width = max([len(row["shard"]) for row in summary] + [5])
+        self.stdout.write(f"{'Shard':<{width}}  {'Rows':>6}  {'Changed':>7}  {'Seconds':>8}")
+        self.stdout.write("-" * (width + 29))
+        for row in summary:
+            # Courses whose inputs match their last run are not recomputed
+            rows, changed = ("-", "skipped") if row["skipped"] else (row["rows"], row["changed"])
+            self.stdout.write(f"{row['shard']:<{width}}  {rows:>6}  {changed:>7}  {row['seconds']:>8.2f}")
+        self.stdout.write("-" * (width + 29))
+        skipped = sum(1 for row in summary if row["skipped"])
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{len(summary) - skipped} shard(s) recomputed, {skipped} skipped, "
+                f"{sum(row['changed'] for row in summary)} row(s) changed in {elapsed:.2f}s"
+            )
+        )
@@ -0,0 +1,112 @@
+# academics/management/commands/recompute_dirty.py
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from academics.attainment import ENGINES, recalculate_course, recalculate_department_po
+from academics.attainment.dirty import claim, release, remark, unclaim
+from academics.models import AcademicYear, AttainmentRun, Department, DirtyAttainmentScope
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalculates CO and then PO attainment for only the scopes marked dirty by grade, CO link and "
+        "CO-PO mapping changes since the last run. Safe to run from cron every few minutes: the oldest "
+        "scopes go first and concurrent runs take disjoint scopes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--limit",
+            type=int,
+            help="Take at most this many of the oldest dirty scopes per run, to bound each run's length.",
+        )
+        parser.add_argument("--engine", choices=ENGINES, help="Override settings.ATTAINMENT_ENGINE for CO attainment.")
+        parser.add_argument("--dry-run", action="store_true", help="List the dirty scopes without recalculating them.")
+
+    def handle(self, *args, **options):
+        if options["limit"] is not None and options["limit"] < 1:
+            raise CommandError("--limit must be at least 1.")
+
+        if options["dry_run"]:
+            scopes = DirtyAttainmentScope.objects.select_related("course", "department", "academic_year")
+            for scope in scopes[: options["limit"]] if options["limit"] else scopes:
+                self.stdout.write(str(scope))
+            self.stdout.write(f"{scopes.count()} dirty scope(s).")
+            return
+
+        scopes = claim(options["limit"])
+        if not scopes:
+            self.stdout.write("Nothing to recompute.")
+            return
+
+        started = time.monotonic()
+        oldest = min(scope.marked_at for scope in scopes)
+        academic_years = AcademicYear.objects.in_bulk({scope.academic_year_id for scope in scopes})
+        failed = []
+        po_failed = {}
+
+        # PO attainment is built from CO attainment, so every dirty course goes first
+        recomputed = skipped = 0
+        po_scopes = {}
+        for scope in scopes:
+            if scope.department_id is not None:
+                po_scopes.setdefault((scope.department_id, scope.academic_year_id), scope.marked_at)
+            if scope.course_id is None:
+                continue
+            try:
+                diff = recalculate_course(
+                    scope.course,
+                    academic_years[scope.academic_year_id],
+                    engine=options["engine"],
+                    source=AttainmentRun.Source.COMMAND,
+                )
+            except Exception as error:
+                self.stderr.write(f"CO {scope.course.code} in {academic_years[scope.academic_year_id]}: {error}")
+                failed.append(scope)
+                continue
+            if diff is None:
+                skipped += 1
+            else:
+                recomputed += 1
+
+        departments = Department.objects.in_bulk({department_id for department_id, _ in po_scopes})
+        for (department_id, academic_year_id), marked_at in po_scopes.items():
+            try:
+                recalculate_department_po(
+                    departments[department_id], academic_years[academic_year_id], source=AttainmentRun.Source.COMMAND
+                )
+            except Exception as error:
+                self.stderr.write(f"PO {departments[department_id].name} in {academic_years[academic_year_id]}: {error}")
+                po_failed[(department_id, academic_year_id)] = marked_at
+
+        # Claimed rows are deleted only now that their scopes are recalculated. Failed ones go back on the
+        # ledger with their original mark time for the next run, including the PO scopes of recomputed courses.
+        failed += [
+            scope
+            for scope in scopes
+            if scope.course_id is None and (scope.department_id, scope.academic_year_id) in po_failed
+        ]
+        release([scope for scope in scopes if scope not in failed])
+        unclaim(failed)
+        remark(
+            [
+                DirtyAttainmentScope(department_id=department_id, academic_year_id=academic_year_id, marked_at=marked_at)
+                for (department_id, academic_year_id), marked_at in po_failed.items()
+            ]
+        )
+        self.stdout.write(
+            f"{recomputed} course(s) recomputed, {skipped} unchanged, {len(po_scopes)} department(s) rolled up "
+            f"in {time.monotonic() - started:.2f}s; the oldest change waited "
+            f"{(timezone.now() - oldest).total_seconds() / 60:.1f} min."
+        )
+        remaining = DirtyAttainmentScope.objects.count()
+        if remaining:
+            self.stdout.write(f"{remaining} dirty scope(s) left for the next run.")
+        if failed or po_failed:
+            raise CommandError(
+                f"{len(failed)} claimed scope(s) and {len(po_failed)} department rollup(s) failed and were marked "
+                "dirty again."
+            )
+        self.stdout.write(self.style.SUCCESS("Done."))
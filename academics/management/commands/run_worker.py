@@ -0,0 +1,48 @@
+# academics/management/commands/run_worker.py
+import os
+import signal
+import socket
+import time
+
+from django.core.management.base import BaseCommand
+
+from academics.jobs import run_next_job
+
+
+class Command(BaseCommand):
+    help = (
+        "Runs queued background jobs (attainment calculations, exports, imports). "
+        "Several workers can run side by side; each job is claimed by exactly one."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="Run the jobs that are due now, then exit.")
+        parser.add_argument(
+            "--poll-interval", type=float, default=2.0, help="Seconds to sleep when the queue is empty (default: 2)."
+        )
+        parser.add_argument("--name", help="Worker name recorded on claimed jobs (default: host:pid).")
+
+    def handle(self, *args, **options):
+        worker_name = options["name"] or f"{socket.gethostname()}:{os.getpid()}"
+        self._stopping = False
+        signal.signal(signal.SIGTERM, self._stop)
+        signal.signal(signal.SIGINT, self._stop)
+
+        self.stdout.write(f"Worker {worker_name} started.")
+        processed = 0
+        while not self._stopping:
+            job = run_next_job(worker_name)
+            if job is None:
+                if options["once"]:
+                    break
+                time.sleep(options["poll_interval"])
+                continue
+            processed += 1
+            style = self.style.SUCCESS if job.status == job.Status.SUCCEEDED else self.style.WARNING
+            self.stdout.write(style(f"{job} after {job.attempts} attempt(s)"))
+
+        self.stdout.write(f"Worker {worker_name} stopped after {processed} job(s).")
+
+    def _stop(self, signum, frame):
+        # Finish the current job, then leave the loop
+        self._stopping = True
@@ -0,0 +1,54 @@
+# academics/management/commands/verify_incremental_attainment.py
+from django.core.management.base import BaseCommand, CommandError
+
+from academics.attainment import incremental
+from academics.models import AcademicYear
+
+
+class Command(BaseCommand):
+    help = (
+        "Checks the incrementally maintained CO attainment state (student CO scores and "
+        "CO tallies) against a full recompute and reports any drift."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--year",
+            type=int,
+            help="Start year of the academic year, e.g. 2024. Defaults to the current academic year.",
+        )
+        parser.add_argument("--fix", action="store_true", help="Replace drifted state with the recomputed values.")
+        parser.add_argument("--show", type=int, default=10, help="Number of drifted rows to list (default: 10).")
+
+    def handle(self, *args, **options):
+        try:
+            if options["year"]:
+                academic_year = AcademicYear.objects.get(start_date__year=options["year"])
+            else:
+                academic_year = AcademicYear.objects.get(is_current=True)
+        except AcademicYear.DoesNotExist:
+            raise CommandError("Academic year not found; pass --year.")
+
+        scores, tallies, score_drift, tally_drift = incremental.find_drift(academic_year)
+        self.stdout.write(
+            f"{academic_year}: {len(scores)} student CO score(s), {len(tallies)} CO tally(ies) recomputed."
+        )
+
+        if not (score_drift or tally_drift):
+            self.stdout.write(self.style.SUCCESS("No drift: the incremental state matches a full recompute."))
+            return
+
+        self.stdout.write(
+            self.style.WARNING(f"Drift: {len(score_drift)} student CO score(s), {len(tally_drift)} CO tally(ies).")
+        )
+        for (student_id, co_id), stored, expected in score_drift[: options["show"]]:
+            self.stdout.write(f"  score student={student_id} co={co_id}: stored {stored}, expected {expected}")
+        for co_id, stored, expected in tally_drift[: options["show"]]:
+            self.stdout.write(f"  tally co={co_id}: stored {stored}, expected {expected}")
+
+        if options["fix"]:
+            incremental.replace_state(academic_year, scores, tallies)
+            diff = incremental.save_tally_attainment(academic_year, tallies)
+            self.stdout.write(
+                self.style.SUCCESS(f"Incremental state replaced with the recomputed values; CO attainment: {diff}.")
+            )
@@ -0,0 +1,407 @@
+# academics/marks.py
+"""
+Saving an assessment's marks in bulk. The submitted marks are diffed against
+the stored ones, read in one query, and only new or changed rows are written
+with a single INSERT ... ON CONFLICT (assessment_id, student_id) DO UPDATE.
+
+Saves of the same assessment are serialized on its row, so each diff is taken
+against the marks the previous save left; saves of different assessments never
+wait for each other. The transaction holds nothing else: the incremental
+attainment state, which the bulk write bypasses along with the StudentMark
+signals, is brought up to date from the diff once the marks are committed, in
+one short transaction of its own.
+
+Grid clients send marks as a compact JSON array of [student_id, marks] rows
+(student_id is the User id). Each row's shape is checked as it is parsed; roster
+membership, duplicates and the mark range are then checked for all rows at once
+with NumPy.
+
+Mark sheets (CSV, or XLSX where openpyxl is installed) are read row by row and
+validated in chunks of IMPORT_CHUNK_SIZE rows against the roster, which is
+loaded once into a dict keyed by username and roll number; the file is never
+held in memory whole, and the valid marks are saved with the same single upsert.
+
+Autosaving clients send only the cells edited since their last save, each with
+the version of the stored mark it was edited from; StudentMark.version moves on
+with every write, so a cell edited from a mark someone else has since changed
+is rejected as a conflict instead of overwriting it.
+"""
+import csv
+import io
+import zipfile
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+
+from .attainment import dirty, incremental
+from .models import Assessment, StudentMark
+
+
+class MarksDiff:
+    """The outcome of saving an assessment's marks: keys are User ids."""
+
+    def __init__(self):
+        self.inserted = {}  # user id -> new marks
+        self.updated = {}  # user id -> (old marks, new marks)
+        self.unchanged = 0
+        self.conflicts = {}  # user id -> (stored marks or None, stored version), not written
+        self.versions = {}  # user id -> version of the stored mark after the save
+
+    @property
+    def changed(self):
+        return len(self.inserted) + len(self.updated)
+
+    def changes(self):
+        """Yields (user_id, old, new) for every inserted (old is None) or updated mark."""
+        for key, new in self.inserted.items():
+            yield key, None, new
+        for key, (old, new) in self.updated.items():
+            yield key, old, new
+
+    def __str__(self):
+        summary = f"{len(self.inserted)} inserted, {len(self.updated)} updated, {self.unchanged} unchanged"
+        return f"{summary}, {len(self.conflicts)} conflicting" if self.conflicts else summary
+
+
+DEFAULT_AUTOSAVE_MAX_CELLS = 200
+
+
+def _row_error(index, student_id, message):
+    return {"row": index, "student": student_id, "error": message}
+
+
+def _parse_mark(value, field):
+    """The Decimal for a submitted mark, or raises ValueError with the reason."""
+    if isinstance(value, bool) or not isinstance(value, (int, float, str)):
+        raise ValueError("Marks must be a number.")
+    try:
+        marks = Decimal(str(value).strip())
+    except InvalidOperation:
+        raise ValueError("Marks must be a number.") from None
+    if not marks.is_finite():
+        raise ValueError("Marks must be a number.")
+    if marks.as_tuple().exponent < -field.decimal_places:
+        raise ValueError(f"Marks can have at most {field.decimal_places} decimal places.")
+    if abs(marks) >= 10 ** (field.max_digits - field.decimal_places):
+        raise ValueError("Marks are too large.")
+    return marks
+
+
+def validate_mark_rows(rows, roster_ids, max_marks):
+    """
+    Validates a grid payload [[student_id, marks], ...] for an assessment whose
+    roster is the User ids `roster_ids`. A null mark leaves the student's stored
+    mark as it is. Returns (marks, errors): {user_id: Decimal} for the rows with a
+    mark, and one {"row", "student", "error"} per invalid row, by row index.
+    """
+    if not isinstance(rows, list):
+        raise ValueError("Send a JSON array of [student_id, marks] rows.")
+
+    field = StudentMark._meta.get_field("marks_obtained")
+    errors = []
+    parsed = []  # (row index, student id, marks or None)
+    for index, row in enumerate(rows):
+        if not isinstance(row, list) or len(row) != 2:
+            errors.append(_row_error(index, None, "Each row must be [student_id, marks]."))
+            continue
+        student_id, value = row
+        if isinstance(student_id, bool) or not isinstance(student_id, int) or not 0 < student_id < 2 ** 63:
+            errors.append(_row_error(index, student_id, "Student id must be a positive whole number."))
+            continue
+        try:
+            parsed.append((index, student_id, None if value is None else _parse_mark(value, field)))
+        except ValueError as error:
+            errors.append(_row_error(index, student_id, str(error)))
+
+    marks = {}
+    if parsed:
+        indexes, student_ids, values = zip(*parsed)
+        student_ids = np.fromiter(student_ids, dtype=np.int64, count=len(parsed))
+        unknown = ~np.isin(student_ids, np.fromiter(roster_ids, dtype=np.int64, count=len(roster_ids)))
+        # A student's second and later rows are duplicates; a stable sort keeps the first in place
+        order = np.argsort(student_ids, kind="stable")
+        duplicate = np.empty(len(parsed), dtype=bool)
+        duplicate[order] = np.concatenate([[False], student_ids[order][1:] == student_ids[order][:-1]])
+        numbers = np.fromiter((0.0 if value is None else float(value) for value in values), dtype=float, count=len(parsed))
+        out_of_range = (numbers < 0) | (numbers > float(max_marks))
+
+        invalid = unknown | duplicate | out_of_range
+        for position in np.flatnonzero(invalid):
+            if unknown[position]:
+                message = "This student is not enrolled in the course."
+            elif duplicate[position]:
+                message = "This student appears more than once."
+            else:
+                message = f"Marks must be between 0 and {max_marks}."
+            errors.append(_row_error(indexes[position], int(student_ids[position]), message))
+        marks = {
+            int(student_ids[position]): values[position]
+            for position in np.flatnonzero(~invalid)
+            if values[position] is not None
+        }
+
+    errors.sort(key=lambda error: error["row"])
+    return marks, errors
+
+
+def autosave_cell_limit():
+    """The most cells one autosave request may carry (settings.MARKS_AUTOSAVE_MAX_CELLS)."""
+    return getattr(settings, "MARKS_AUTOSAVE_MAX_CELLS", DEFAULT_AUTOSAVE_MAX_CELLS)
+
+
+def validate_autosave_cells(cells, enrolled, max_marks):
+    """
+    Validates an autosave payload [[student_id, marks, version], ...], where
+    version is that of the stored mark the client edited (0 for none).
+    `enrolled(student_ids)` returns the given User ids that are on the course
+    roster. Returns (marks, versions, errors) like validate_mark_rows, with
+    versions {user_id: version} for the valid cells.
+    """
+    if not isinstance(cells, list):
+        raise ValueError("Send a JSON array of [student_id, marks, version] cells.")
+    limit = autosave_cell_limit()
+    if len(cells) > limit:
+        raise ValueError(f"Send at most {limit} cells per request.")
+
+    errors = []
+    rows = []
+    positions = []  # index in cells of each row sent to validate_mark_rows
+    versions = {}
+    for index, cell in enumerate(cells):
+        if not isinstance(cell, list) or len(cell) != 3:
+            errors.append(_row_error(index, None, "Each cell must be [student_id, marks, version]."))
+            continue
+        student_id, value, version = cell
+        if isinstance(version, bool) or not isinstance(version, int) or not 0 <= version < 2 ** 31:
+            errors.append(_row_error(index, student_id, "Version must be a whole number, 0 for a new mark."))
+        elif value is None:
+            errors.append(_row_error(index, student_id, "Marks are required."))
+        else:
+            rows.append([student_id, value])
+            positions.append(index)
+            if isinstance(student_id, int):
+                # A repeated student keeps its first cell, as in validate_mark_rows
+                versions.setdefault(student_id, version)
+
+    candidates = [row[0] for row in rows if isinstance(row[0], int) and not isinstance(row[0], bool)]
+    marks, row_errors = validate_mark_rows(rows, enrolled(candidates) if candidates else set(), max_marks)
+    errors.extend({**error, "row": positions[error["row"]]} for error in row_errors)
+    errors.sort(key=lambda error: error["row"])
+    return marks, {user_id: versions[user_id] for user_id in marks}, errors
+
+
+def save_assessment_marks(assessment, marks, versions=None):
+    """
+    Saves {user_id: marks_obtained} for an assessment, writing only new and
+    changed marks, and returns a MarksDiff. Students left out of `marks` keep
+    their stored mark.
+
+    With `versions` ({user_id: version}), a changed mark is written only if the
+    student's stored mark is still at that version (0 for no stored mark); the
+    others are left as they are and reported in diff.conflicts. A mark equal to
+    the stored one is unchanged rather than a conflict, so a retried save succeeds.
+    """
+    diff = MarksDiff()
+    if not marks:
+        return diff
+
+    with transaction.atomic():
+        # Taken first, so concurrent saves of this assessment diff against each other's results
+        list(Assessment.objects.select_for_update().filter(pk=assessment.pk).values_list("pk"))
+        existing = {
+            user_id: (marks_obtained, version)
+            for user_id, marks_obtained, version in StudentMark.objects.filter(
+                assessment=assessment, student_id__in=list(marks)
+            ).values_list("student_id", "marks_obtained", "version")
+        }
+        rows = []
+        for user_id, value in marks.items():
+            value = Decimal(value)
+            old, version = existing.get(user_id, (None, 0))
+            if old == value:
+                diff.unchanged += 1
+                diff.versions[user_id] = version
+                continue
+            if versions is not None and versions.get(user_id) != version:
+                diff.conflicts[user_id] = (old, version)
+                continue
+            if old is None:
+                diff.inserted[user_id] = value
+            else:
+                diff.updated[user_id] = (old, value)
+            diff.versions[user_id] = version + 1
+            rows.append(StudentMark(assessment=assessment, student_id=user_id, marks_obtained=value, version=version + 1))
+
+        if rows:
+            StudentMark.objects.bulk_create(
+                rows,
+                update_conflicts=True,
+                unique_fields=["assessment", "student"],
+                update_fields=["marks_obtained", "version"],
+            )
+            dirty.mark_assessment(assessment.pk)
+            changes = list(diff.changes())
+            # A failure here leaves the running state to the dirty-scope recompute
+            transaction.on_commit(
+                lambda: incremental.apply_student_mark_changes(assessment.pk, changes), robust=True
+            )
+    return diff
+
+
+# --- Mark sheet import ---
+
+IMPORT_CHUNK_SIZE = 1000
+# Header names, compared case-insensitively with '_' read as a space and '.' dropped
+STUDENT_COLUMNS = ("username", "roll number", "roll no", "student")
+MARKS_COLUMNS = ("marks", "marks obtained")
+REPORT_HEADER = ("line", "student", "marks", "error")
+
+
+class MarkSheetImport:
+    """The outcome of importing a mark sheet: diff is None when nothing was saved."""
+
+    def __init__(self):
+        self.rows = 0
+        self.errors = 0
+        self.diff = None
+
+    def __str__(self):
+        if self.diff is None:
+            return f"{self.errors} of {self.rows} rows are invalid"
+        return f"{self.rows} rows read: {self.diff}"
+
+
+def _cell(value):
+    """A cell as stripped text; XLSX numbers that are whole lose their '.0'."""
+    if value is None:
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip()
+
+
+def _column_name(value):
+    return " ".join(_cell(value).casefold().replace("_", " ").replace(".", "").split())
+
+
+def _csv_rows(upload):
+    text = io.TextIOWrapper(upload, encoding="utf-8-sig", newline="")
+    try:
+        yield from csv.reader(text)
+    except UnicodeDecodeError:
+        raise ValueError("The CSV file is not UTF-8 text.") from None
+    except csv.Error as error:
+        raise ValueError(f"The CSV file could not be read: {error}.") from None
+    finally:
+        # Leaves the upload open for Django to close
+        text.detach()
+
+
+def _xlsx_rows(upload):
+    try:
+        from openpyxl import load_workbook
+        from openpyxl.utils.exceptions import InvalidFileException
+    except ImportError:
+        raise ValueError("Reading .xlsx files needs openpyxl, which is not installed; upload the marks as CSV.") from None
+
+    try:
+        # read_only streams the sheet's rows instead of building the whole workbook
+        workbook = load_workbook(upload, read_only=True, data_only=True)
+    except (InvalidFileException, zipfile.BadZipFile, KeyError, OSError):
+        raise ValueError("The file is not a readable .xlsx workbook.") from None
+    try:
+        yield from workbook.active.iter_rows(values_only=True)
+    finally:
+        workbook.close()
+
+
+def read_mark_sheet(upload):
+    """Yields the rows of an uploaded .csv or .xlsx file as sequences of cell values."""
+    if upload.name.lower().endswith(".xlsx"):
+        return _xlsx_rows(upload)
+    return _csv_rows(upload)
+
+
+def _sheet_marks(lines, student_column, marks_column):
+    """Yields (line, student, marks or None) for the non-blank rows after the header."""
+    width = max(student_column, marks_column) + 1
+    for line, cells in lines:
+        cells = [_cell(value) for value in cells]
+        if any(cells):
+            cells += [""] * (width - len(cells))
+            yield line, cells[student_column], cells[marks_column] or None
+
+
+def import_mark_sheet(assessment, upload, roster, report):
+    """
+    Imports an uploaded mark sheet for an assessment. `roster` yields
+    (user_id, username, roll_number) for the students enrolled in the course;
+    each row's student is matched by username, else by roll number, ignoring
+    case. A blank mark leaves the student's stored mark as it is.
+
+    Every row is validated; the marks are saved only when all rows are valid.
+    Each invalid row is written to the text file `report` as a CSV row of
+    REPORT_HEADER. Returns a MarkSheetImport, and raises ValueError when the
+    file cannot be read or its header row lacks a student or marks column.
+    """
+    students = {}
+    for user_id, username, roll_number in roster:
+        if roll_number:
+            students.setdefault(roll_number.strip().casefold(), user_id)
+        # A username wins over another student's equal roll number
+        students[username.casefold()] = user_id
+    roster_ids = set(students.values())
+
+    lines = enumerate(read_mark_sheet(upload), start=1)
+    for _, header in lines:
+        if any(_cell(value) for value in header):
+            break
+    else:
+        raise ValueError("The file has no rows.")
+    names = [_column_name(value) for value in header]
+    student_column = next((index for index, name in enumerate(names) if name in STUDENT_COLUMNS), None)
+    marks_column = next((index for index, name in enumerate(names) if name in MARKS_COLUMNS), None)
+    if student_column is None or marks_column is None:
+        raise ValueError(
+            f"The header row needs a student column ({', '.join(STUDENT_COLUMNS)}) "
+            f"and a marks column ({', '.join(MARKS_COLUMNS)})."
+        )
+
+    writer = csv.writer(report)
+    writer.writerow(REPORT_HEADER)
+    result = MarkSheetImport()
+    marks = {}
+    seen = set()
+    sheet = _sheet_marks(lines, student_column, marks_column)
+    while chunk := list(islice(sheet, IMPORT_CHUNK_SIZE)):
+        result.rows += len(chunk)
+        errors = []
+        rows = []
+        matched = []  # (line, student, marks) per row sent to validate_mark_rows
+        for line, student, value in chunk:
+            user_id = students.get(student.casefold())
+            if not student:
+                errors.append((line, student, value, "The student is missing."))
+            elif user_id is None:
+                errors.append((line, student, value, "No student in the course has this username or roll number."))
+            elif user_id in seen:
+                errors.append((line, student, value, "This student appears more than once."))
+            else:
+                rows.append([user_id, value])
+                matched.append((line, student, value))
+
+        chunk_marks, row_errors = validate_mark_rows(rows, roster_ids, assessment.max_marks)
+        errors.extend((*matched[error["row"]], error["error"]) for error in row_errors)
+        seen.update(user_id for user_id, _ in rows)
+        if errors:
+            result.errors += len(errors)
+            writer.writerows(sorted(errors, key=lambda error: error[0]))
+        elif not result.errors:
+            marks.update(chunk_marks)
+
+    if not result.errors:
+        result.diff = save_assessment_marks(assessment, marks)
+    return result
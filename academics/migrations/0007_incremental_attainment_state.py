@@ -0,0 +1,48 @@
+# Generated by Django 5.2.3 on 2026-10-18 08:47
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('academics', '0006_alter_department_branch'),
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CourseOutcomeAttainmentTally',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('students_counted', models.PositiveIntegerField(default=0)),
+                ('students_above_threshold', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('academic_year', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='co_attainment_tallies', to='academics.academicyear')),
+                ('course_outcome', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='attainment_tallies', to='academics.courseoutcome')),
+            ],
+            options={
+                'verbose_name': 'Course Outcome Attainment Tally',
+                'verbose_name_plural': 'Course Outcome Attainment Tallies',
+                'unique_together': {('course_outcome', 'academic_year')},
+            },
+        ),
+        migrations.CreateModel(
+            name='StudentCOScore',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('obtained', models.DecimalField(decimal_places=2, default=0, max_digits=9)),
+                ('max_marks', models.DecimalField(decimal_places=2, default=0, max_digits=9)),
+                ('graded_items', models.PositiveIntegerField(default=0, help_text='Number of graded marks counted in the totals')),
+                ('academic_year', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='student_co_scores', to='academics.academicyear')),
+                ('course_outcome', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='student_scores', to='academics.courseoutcome')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='co_scores', to='users.userprofile')),
+            ],
+            options={
+                'verbose_name': 'Student CO Score',
+                'verbose_name_plural': 'Student CO Scores',
+                'unique_together': {('student', 'course_outcome', 'academic_year')},
+            },
+        ),
+    ]
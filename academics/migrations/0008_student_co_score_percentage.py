@@ -0,0 +1,34 @@
+# Generated by Django 5.2.3 on 2026-10-18 08:50
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def fill_percentage(apps, schema_editor):
+    StudentCOScore = apps.get_model('academics', 'StudentCOScore')
+    StudentCOScore.objects.filter(max_marks__gt=0).update(percentage=F('obtained') * 100 / F('max_marks'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('academics', '0007_incremental_attainment_state'),
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='studentcoscore',
+            name='percentage',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=6, null=True),
+        ),
+        migrations.RunPython(fill_percentage, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='studentcoscore',
+            index=models.Index(fields=['course_outcome', 'academic_year'], name='student_co_score_co_year_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='studentcoscore',
+            index=models.Index(fields=['student', 'academic_year'], name='student_co_score_student_idx'),
+        ),
+    ]
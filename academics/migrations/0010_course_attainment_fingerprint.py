@@ -0,0 +1,29 @@
+# Generated by Django 5.2.3 on 2026-10-18 09:07
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('academics', '0009_background_job'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CourseAttainmentFingerprint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fingerprint', models.CharField(max_length=64)),
+                ('computed_at', models.DateTimeField(auto_now=True)),
+                ('academic_year', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='course_attainment_fingerprints', to='academics.academicyear')),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='attainment_fingerprints', to='academics.course')),
+            ],
+            options={
+                'verbose_name': 'Course Attainment Fingerprint',
+                'verbose_name_plural': 'Course Attainment Fingerprints',
+                'unique_together': {('course', 'academic_year')},
+            },
+        ),
+    ]
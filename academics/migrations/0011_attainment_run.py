@@ -0,0 +1,45 @@
+# Generated by Django 5.2.3 on 2026-10-18 09:10
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('academics', '0010_course_attainment_fingerprint'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AttainmentRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('CO', 'Course Outcomes'), ('PO', 'Program Outcomes')], max_length=2)),
+                ('engine', models.CharField(blank=True, max_length=20)),
+                ('source', models.CharField(choices=[('WEB', 'Web'), ('COMMAND', 'Management command')], default='WEB', max_length=10)),
+                ('skipped', models.BooleanField(default=False, help_text='Inputs were unchanged since the last run, so nothing was recomputed')),
+                ('started_at', models.DateTimeField()),
+                ('finished_at', models.DateTimeField()),
+                ('load_seconds', models.FloatField(default=0)),
+                ('compute_seconds', models.FloatField(default=0)),
+                ('write_seconds', models.FloatField(default=0)),
+                ('total_seconds', models.FloatField(default=0)),
+                ('rows_read', models.PositiveIntegerField(default=0)),
+                ('rows_written', models.PositiveIntegerField(default=0)),
+                ('query_count', models.PositiveIntegerField(default=0)),
+                ('academic_year', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='attainment_runs', to='academics.academicyear')),
+                ('course', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='attainment_runs', to='academics.course')),
+                ('department', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='attainment_runs', to='academics.department')),
+                ('triggered_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='attainment_runs', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Attainment Run',
+                'verbose_name_plural': 'Attainment Runs',
+                'ordering': ['-started_at'],
+                'indexes': [models.Index(fields=['kind', 'started_at'], name='attainment_run_kind_idx')],
+            },
+        ),
+    ]
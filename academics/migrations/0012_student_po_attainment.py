@@ -0,0 +1,32 @@
+# Generated by Django 5.2.3 on 2026-10-18 09:15
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('academics', '0011_attainment_run'),
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StudentPOAttainment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('attainment', models.JSONField(default=dict, help_text='Percentage per program outcome id')),
+                ('computed_at', models.DateTimeField(auto_now=True)),
+                ('academic_year', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='student_po_attainments', to='academics.academicyear')),
+                ('department', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='student_po_attainments', to='academics.department')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='po_attainments', to='users.userprofile')),
+            ],
+            options={
+                'verbose_name': 'Student PO Attainment',
+                'verbose_name_plural': 'Student PO Attainments',
+                'indexes': [models.Index(fields=['department', 'academic_year'], name='student_po_dept_year_idx')],
+                'unique_together': {('student', 'department', 'academic_year')},
+            },
+        ),
+    ]
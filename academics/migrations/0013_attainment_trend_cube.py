@@ -0,0 +1,34 @@
+# Generated by Django 5.2.3 on 2026-10-18 09:18
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('academics', '0012_student_po_attainment'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AttainmentTrendCell',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('CO', 'Course Outcomes'), ('PO', 'Program Outcomes')], max_length=2)),
+                ('attainment', models.DecimalField(blank=True, decimal_places=2, max_digits=5, null=True)),
+                ('sample_size', models.PositiveIntegerField(default=0, help_text='Students with graded work behind the attainment')),
+                ('outcomes', models.JSONField(blank=True, default=dict, help_text='Attainment per CO or PO code')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('academic_year', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='attainment_trend_cells', to='academics.academicyear')),
+                ('course', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='attainment_trend_cells', to='academics.course')),
+                ('department', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='attainment_trend_cells', to='academics.department')),
+            ],
+            options={
+                'verbose_name': 'Attainment Trend Cell',
+                'verbose_name_plural': 'Attainment Trend Cells',
+                'indexes': [models.Index(fields=['department', 'kind', 'academic_year'], name='attainment_trend_dept_idx')],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('course__isnull', False)), fields=('department', 'academic_year', 'kind', 'course'), name='attainment_trend_course_cell_unique'), models.UniqueConstraint(condition=models.Q(('course__isnull', True)), fields=('department', 'academic_year', 'kind'), name='attainment_trend_department_cell_unique')],
+            },
+        ),
+    ]
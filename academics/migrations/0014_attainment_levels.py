@@ -0,0 +1,42 @@
+# Generated by Django 5.2.3 on 2026-10-18 09:21
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Case, Value, When
+
+
+def fill_levels(apps, schema_editor):
+    bands = getattr(settings, 'ATTAINMENT_LEVEL_BANDS', (50, 60, 70))
+    level = Case(
+        *[When(attainment_percentage__gte=bound, then=Value(3 - i)) for i, bound in enumerate(reversed(bands))],
+        default=Value(0),
+    )
+    for model_name in ('CourseOutcomeAttainment', 'ProgramOutcomeAttainment'):
+        model = apps.get_model('academics', model_name)
+        model.objects.filter(attainment_percentage__isnull=False).update(attainment_level=level)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('academics', '0013_attainment_trend_cube'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='assessmenttype',
+            name='is_external',
+            field=models.BooleanField(default=False, help_text="Marks count towards the external share of the course plan's assessment ratio (e.g., end-semester exams)."),
+        ),
+        migrations.AddField(
+            model_name='courseoutcomeattainment',
+            name='attainment_level',
+            field=models.PositiveSmallIntegerField(blank=True, help_text='Attainment level 0-3, banded by settings.ATTAINMENT_LEVEL_BANDS', null=True),
+        ),
+        migrations.AddField(
+            model_name='programoutcomeattainment',
+            name='attainment_level',
+            field=models.PositiveSmallIntegerField(blank=True, help_text='Attainment level 0-3, banded by settings.ATTAINMENT_LEVEL_BANDS', null=True),
+        ),
+        migrations.RunPython(fill_levels, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.3 on 2026-10-18 09:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('academics', '0014_attainment_levels'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='courseoutcomeattainment',
+            name='ci_lower',
+            field=models.DecimalField(blank=True, decimal_places=2, help_text='Lower bound of the 95% bootstrap confidence interval of the attainment percentage', max_digits=5, null=True),
+        ),
+        migrations.AddField(
+            model_name='courseoutcomeattainment',
+            name='ci_upper',
+            field=models.DecimalField(blank=True, decimal_places=2, help_text='Upper bound of the 95% bootstrap confidence interval of the attainment percentage', max_digits=5, null=True),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.3 on 2026-10-18 09:30
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('academics', '0015_co_attainment_intervals'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DirtyAttainmentScope',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('marked_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('academic_year', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='dirty_attainment_scopes', to='academics.academicyear')),
+                ('course', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='dirty_attainment_scopes', to='academics.course')),
+                ('department', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='dirty_attainment_scopes', to='academics.department')),
+            ],
+            options={
+                'verbose_name': 'Dirty Attainment Scope',
+                'verbose_name_plural': 'Dirty Attainment Scopes',
+                'ordering': ['marked_at'],
+                'indexes': [models.Index(fields=['marked_at'], name='dirty_attainment_marked_idx')],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('course__isnull', False)), fields=('course', 'academic_year'), name='dirty_attainment_course_unique'), models.UniqueConstraint(condition=models.Q(('course__isnull', True)), fields=('department', 'academic_year'), name='dirty_attainment_department_unique')],
+            },
+        ),
+    ]
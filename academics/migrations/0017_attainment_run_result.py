@@ -0,0 +1,18 @@
+# Generated by Django 5.2.3 on 2026-10-18 09:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('academics', '0016_dirty_attainment_scopes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='attainmentrun',
+            name='result',
+            field=models.JSONField(blank=True, help_text='The saved changes (AttainmentDiff.as_dict()), returned to callers that joined this run', null=True),
+        ),
+    ]
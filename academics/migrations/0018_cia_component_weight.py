@@ -0,0 +1,18 @@
+# Generated by Django 5.2.3 on 2026-10-18 09:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('academics', '0017_attainment_run_result'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ciacomponent',
+            name='weight',
+            field=models.DecimalField(blank=True, decimal_places=2, help_text='Marks this component counts for in CIA-component attainment, e.g. 10 for a 10-mark test. The marks of its assignments are scaled to this; leave blank to count them as they are.', max_digits=6, null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.3 on 2026-10-18 10:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('academics', '0018_cia_component_weight'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='studentmark',
+            name='version',
+            field=models.PositiveIntegerField(default=1, editable=False),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.3 on 2026-10-18 10:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('academics', '0019_studentmark_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dirtyattainmentscope',
+            name='claimed_at',
+            field=models.DateTimeField(blank=True, help_text='When a recompute_dirty run took this scope; cleared if it is marked again meanwhile.', null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.3 on 2026-10-18 10:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('academics', '0020_dirtyattainmentscope_claimed_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='attainmentrun',
+            name='success_threshold',
+            field=models.DecimalField(blank=True, decimal_places=2, help_text='Pass mark of a CO run, in percent', max_digits=5, null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.3 on 2026-10-18 10:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('academics', '0021_attainmentrun_success_threshold'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='backgroundjob',
+            name='lease_expires_at',
+            field=models.DateTimeField(blank=True, help_text='The worker running the job renews this; a RUNNING job past it lost its worker and is reclaimed', null=True),
+        ),
+    ]
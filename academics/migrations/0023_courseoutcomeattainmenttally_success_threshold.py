@@ -0,0 +1,18 @@
+# Generated by Django 5.2.3 on 2026-10-18 10:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('academics', '0022_backgroundjob_lease_expires_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='courseoutcomeattainmenttally',
+            name='success_threshold',
+            field=models.DecimalField(decimal_places=2, default=60, help_text='Pass mark of the last batch run, in percent', max_digits=5),
+        ),
+    ]
@@ -1,5 +1,6 @@
 # academics/models.py
 from django.db import models
+from django.utils import timezone
 # from users.models import UserProfile  # Import UserProfile from the users app
 from django.contrib.auth.models import User  # <--- ADD THIS LINE
 
@@ -273,6 +274,10 @@ class AssessmentType(models.Model):
         unique=True,
         help_text="e.g., Midterm Exam, Assignment, Project, Quiz",
     )
+    is_external = models.BooleanField(
+        default=False,
+        help_text="Marks count towards the external share of the course plan's assessment ratio (e.g., end-semester exams).",
+    )
 
     def __str__(self):
         return self.name
@@ -345,6 +350,8 @@ class StudentMark(models.Model):
     marks_obtained = models.DecimalField(
         max_digits=5, decimal_places=2, help_text="Marks obtained by the student"
     )
+    # Moves on with every write of the mark, so autosaving clients can detect stale edits
+    version = models.PositiveIntegerField(default=1, editable=False)
 
     def __str__(self):
         return f"{self.student.username} - {self.assessment.name}: {self.marks_obtained}/{self.assessment.max_marks}"
@@ -369,6 +376,17 @@ class CourseOutcomeAttainment(models.Model):
     attainment_percentage = models.DecimalField(
         max_digits=5, decimal_places=2, null=True, blank=True
     )
+    attainment_level = models.PositiveSmallIntegerField(
+        null=True, blank=True, help_text="Attainment level 0-3, banded by settings.ATTAINMENT_LEVEL_BANDS"
+    )
+    ci_lower = models.DecimalField(
+        max_digits=5, decimal_places=2, null=True, blank=True,
+        help_text="Lower bound of the 95% bootstrap confidence interval of the attainment percentage",
+    )
+    ci_upper = models.DecimalField(
+        max_digits=5, decimal_places=2, null=True, blank=True,
+        help_text="Upper bound of the 95% bootstrap confidence interval of the attainment percentage",
+    )
     # Could add calculated_date, calculated_by (User) if needed for audit
 
     def __str__(self):
@@ -395,6 +413,9 @@ class ProgramOutcomeAttainment(models.Model):
     attainment_percentage = models.DecimalField(
         max_digits=5, decimal_places=2, null=True, blank=True
     )
+    attainment_level = models.PositiveSmallIntegerField(
+        null=True, blank=True, help_text="Attainment level 0-3, banded by settings.ATTAINMENT_LEVEL_BANDS"
+    )
     # Could add calculated_date, calculated_by (User)
 
     def __str__(self):
@@ -547,6 +568,16 @@ class CIAComponent(models.Model):
         related_name='cia_assessed_by'
     )
     order = models.PositiveIntegerField(default=0, help_text="Order of the CIA component.")
+    weight = models.DecimalField(
+        max_digits=6,
+        decimal_places=2,
+        blank=True,
+        null=True,
+        help_text=(
+            "Marks this component counts for in CIA-component attainment, e.g. 10 for a 10-mark test. "
+            "The marks of its assignments are scaled to this; leave blank to count them as they are."
+        ),
+    )
     # --- ADD THIS NEW FIELD ---
     evaluation_rubric = models.TextField(
         blank=True,
@@ -670,6 +701,274 @@ class Submission(models.Model):
         ordering = ['-submitted_at']
 
 
+# --- Incremental Attainment State ---
+
+class StudentCOScore(models.Model):
+    """
+    Running totals of one student's graded work against one Course Outcome in an
+    academic year, kept up to date from Submission and StudentMark writes.
+    """
+    student = models.ForeignKey('users.UserProfile', on_delete=models.CASCADE, related_name='co_scores')
+    course_outcome = models.ForeignKey(CourseOutcome, on_delete=models.CASCADE, related_name='student_scores')
+    academic_year = models.ForeignKey(AcademicYear, on_delete=models.CASCADE, related_name='student_co_scores')
+    obtained = models.DecimalField(max_digits=9, decimal_places=2, default=0)
+    max_marks = models.DecimalField(max_digits=9, decimal_places=2, default=0)
+    percentage = models.DecimalField(max_digits=6, decimal_places=2, null=True, blank=True)
+    graded_items = models.PositiveIntegerField(default=0, help_text="Number of graded marks counted in the totals")
+
+    def __str__(self):
+        return f"{self.student.user.username} - {self.course_outcome.code}: {self.obtained}/{self.max_marks}"
+
+    class Meta:
+        verbose_name = "Student CO Score"
+        verbose_name_plural = "Student CO Scores"
+        unique_together = ('student', 'course_outcome', 'academic_year')
+        indexes = [
+            models.Index(fields=['course_outcome', 'academic_year'], name='student_co_score_co_year_idx'),
+            models.Index(fields=['student', 'academic_year'], name='student_co_score_student_idx'),
+        ]
+
+
+class StudentPOAttainment(models.Model):
+    """
+    One student's PO attainment for a department-year, stored as a single vector
+    {program_outcome_id: percentage} over the department's POs. A PO the student
+    has no weighted CO score for is null.
+    """
+    student = models.ForeignKey('users.UserProfile', on_delete=models.CASCADE, related_name='po_attainments')
+    department = models.ForeignKey(Department, on_delete=models.CASCADE, related_name='student_po_attainments')
+    academic_year = models.ForeignKey(AcademicYear, on_delete=models.CASCADE, related_name='student_po_attainments')
+    attainment = models.JSONField(default=dict, help_text="Percentage per program outcome id")
+    computed_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.student.user.username} PO attainment for {self.academic_year}"
+
+    class Meta:
+        verbose_name = "Student PO Attainment"
+        verbose_name_plural = "Student PO Attainments"
+        unique_together = ('student', 'department', 'academic_year')
+        indexes = [
+            models.Index(fields=['department', 'academic_year'], name='student_po_dept_year_idx'),
+        ]
+
+
+class CourseOutcomeAttainmentTally(models.Model):
+    """
+    Running class-level counts behind a CourseOutcomeAttainment, adjusted by the
+    change in each affected student's pass/fail state.
+    """
+    course_outcome = models.ForeignKey(CourseOutcome, on_delete=models.CASCADE, related_name='attainment_tallies')
+    academic_year = models.ForeignKey(AcademicYear, on_delete=models.CASCADE, related_name='co_attainment_tallies')
+    students_counted = models.PositiveIntegerField(default=0)
+    students_above_threshold = models.PositiveIntegerField(default=0)
+    success_threshold = models.DecimalField(
+        max_digits=5, decimal_places=2, default=60, help_text="Pass mark of the last batch run, in percent"
+    )
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"CO {self.course_outcome.code} tally for {self.academic_year}: {self.students_above_threshold}/{self.students_counted}"
+
+    class Meta:
+        verbose_name = "Course Outcome Attainment Tally"
+        verbose_name_plural = "Course Outcome Attainment Tallies"
+        unique_together = ('course_outcome', 'academic_year')
+
+
+
+class CourseAttainmentFingerprint(models.Model):
+    """
+    A hash of everything a course's CO attainment for a year was computed from,
+    so a later run with identical inputs can be skipped.
+    """
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='attainment_fingerprints')
+    academic_year = models.ForeignKey(AcademicYear, on_delete=models.CASCADE, related_name='course_attainment_fingerprints')
+    fingerprint = models.CharField(max_length=64)
+    computed_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.course.code} inputs for {self.academic_year}: {self.fingerprint[:12]}"
+
+    class Meta:
+        verbose_name = "Course Attainment Fingerprint"
+        verbose_name_plural = "Course Attainment Fingerprints"
+        unique_together = ('course', 'academic_year')
+
+
+# --- Attainment Run History ---
+
+class AttainmentRun(models.Model):
+    """
+    One CO or PO attainment calculation: its scope, who or what triggered it,
+    and how long each phase took, for spotting slowdowns as data grows.
+    """
+    class Kind(models.TextChoices):
+        CO = 'CO', 'Course Outcomes'
+        PO = 'PO', 'Program Outcomes'
+
+    class Source(models.TextChoices):
+        WEB = 'WEB', 'Web'
+        COMMAND = 'COMMAND', 'Management command'
+
+    kind = models.CharField(max_length=2, choices=Kind.choices)
+    course = models.ForeignKey(Course, on_delete=models.SET_NULL, null=True, blank=True, related_name='attainment_runs')
+    department = models.ForeignKey(Department, on_delete=models.SET_NULL, null=True, blank=True, related_name='attainment_runs')
+    academic_year = models.ForeignKey(AcademicYear, on_delete=models.CASCADE, related_name='attainment_runs')
+    engine = models.CharField(max_length=20, blank=True)
+    success_threshold = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True, help_text="Pass mark of a CO run, in percent")
+    source = models.CharField(max_length=10, choices=Source.choices, default=Source.WEB)
+    triggered_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='attainment_runs')
+    skipped = models.BooleanField(default=False, help_text="Inputs were unchanged since the last run, so nothing was recomputed")
+    started_at = models.DateTimeField()
+    finished_at = models.DateTimeField()
+    load_seconds = models.FloatField(default=0)
+    compute_seconds = models.FloatField(default=0)
+    write_seconds = models.FloatField(default=0)
+    total_seconds = models.FloatField(default=0)
+    rows_read = models.PositiveIntegerField(default=0)
+    rows_written = models.PositiveIntegerField(default=0)
+    query_count = models.PositiveIntegerField(default=0)
+    result = models.JSONField(
+        null=True, blank=True,
+        help_text="The saved changes (AttainmentDiff.as_dict()), returned to callers that joined this run",
+    )
+
+    def __str__(self):
+        scope = self.course.code if self.course else (self.department.name if self.department else "all")
+        return f"{self.kind} attainment for {scope} in {self.academic_year} ({self.total_seconds:.2f}s)"
+
+    class Meta:
+        verbose_name = "Attainment Run"
+        verbose_name_plural = "Attainment Runs"
+        ordering = ['-started_at']
+        indexes = [
+            models.Index(fields=['kind', 'started_at'], name='attainment_run_kind_idx'),
+        ]
+
+# --- Attainment Trend Cube ---
+
+class AttainmentTrendCell(models.Model):
+    """
+    Precomputed attainment for one cell of the (department, academic year, CO/PO,
+    course) cube: the mean attainment of a course's COs, or of a department's POs
+    (course empty), with the number of students behind it and the per-outcome
+    values. Refreshed from the saved attainment whenever it changes.
+    """
+    department = models.ForeignKey(Department, on_delete=models.CASCADE, related_name='attainment_trend_cells')
+    academic_year = models.ForeignKey(AcademicYear, on_delete=models.CASCADE, related_name='attainment_trend_cells')
+    kind = models.CharField(max_length=2, choices=AttainmentRun.Kind.choices)
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, null=True, blank=True, related_name='attainment_trend_cells')
+    attainment = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True)
+    sample_size = models.PositiveIntegerField(default=0, help_text="Students with graded work behind the attainment")
+    outcomes = models.JSONField(default=dict, blank=True, help_text="Attainment per CO or PO code")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        scope = self.course.code if self.course else self.department.name
+        return f"{self.kind} trend cell for {scope} in {self.academic_year}: {self.attainment}%"
+
+    class Meta:
+        verbose_name = "Attainment Trend Cell"
+        verbose_name_plural = "Attainment Trend Cells"
+        constraints = [
+            models.UniqueConstraint(
+                fields=['department', 'academic_year', 'kind', 'course'],
+                condition=models.Q(course__isnull=False),
+                name='attainment_trend_course_cell_unique',
+            ),
+            models.UniqueConstraint(
+                fields=['department', 'academic_year', 'kind'],
+                condition=models.Q(course__isnull=True),
+                name='attainment_trend_department_cell_unique',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['department', 'kind', 'academic_year'], name='attainment_trend_dept_idx'),
+        ]
+
+
+# --- Dirty Attainment Ledger ---
+
+class DirtyAttainmentScope(models.Model):
+    """
+    A scope whose saved attainment may be out of date: a course's CO (and so its
+    department's PO) attainment for a year, or only a department's PO attainment
+    (course empty). Marked by the grade and mapping signals; drained by
+    `manage.py recompute_dirty`, which deletes a row only once its scope has been
+    recalculated. One row per scope: marking an already dirty
+    scope keeps its original marked_at, so the oldest row bounds the staleness.
+    """
+    department = models.ForeignKey(Department, on_delete=models.CASCADE, null=True, blank=True, related_name='dirty_attainment_scopes')
+    academic_year = models.ForeignKey(AcademicYear, on_delete=models.CASCADE, related_name='dirty_attainment_scopes')
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, null=True, blank=True, related_name='dirty_attainment_scopes')
+    marked_at = models.DateTimeField(default=timezone.now)
+    claimed_at = models.DateTimeField(null=True, blank=True, help_text="When a recompute_dirty run took this scope; cleared if it is marked again meanwhile.")
+
+    def __str__(self):
+        scope = f"CO {self.course.code}" if self.course else f"PO {self.department.name}"
+        return f"{scope} in {self.academic_year} dirty since {self.marked_at:%Y-%m-%d %H:%M}"
+
+    class Meta:
+        verbose_name = "Dirty Attainment Scope"
+        verbose_name_plural = "Dirty Attainment Scopes"
+        ordering = ['marked_at']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['course', 'academic_year'],
+                condition=models.Q(course__isnull=False),
+                name='dirty_attainment_course_unique',
+            ),
+            models.UniqueConstraint(
+                fields=['department', 'academic_year'],
+                condition=models.Q(course__isnull=True),
+                name='dirty_attainment_department_unique',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['marked_at'], name='dirty_attainment_marked_idx'),
+        ]
+
 
+# --- Background Jobs ---
 
+class BackgroundJob(models.Model):
+    """
+    A unit of work (attainment calculation, export, import) queued from a request
+    and executed by `manage.py run_worker` outside the request cycle.
+    """
+    class Status(models.TextChoices):
+        QUEUED = 'QUEUED', 'Queued'
+        RUNNING = 'RUNNING', 'Running'
+        SUCCEEDED = 'SUCCEEDED', 'Succeeded'
+        FAILED = 'FAILED', 'Failed'
+
+    task = models.CharField(max_length=100, help_text="Registered task name, e.g. attainment.co_by_course")
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=20, choices=Status.choices, default=Status.QUEUED)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=3)
+    run_after = models.DateTimeField(default=timezone.now, help_text="The job is not claimed before this time (retry backoff)")
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    worker = models.CharField(max_length=100, blank=True)
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='background_jobs')
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    lease_expires_at = models.DateTimeField(null=True, blank=True, help_text="The worker running the job renews this; a RUNNING job past it lost its worker and is reclaimed")
+    finished_at = models.DateTimeField(null=True, blank=True)
 
+    def __str__(self):
+        return f"Job #{self.pk} {self.task} ({self.get_status_display()})"
+
+    @property
+    def is_finished(self):
+        return self.status in (self.Status.SUCCEEDED, self.Status.FAILED)
+
+    class Meta:
+        verbose_name = "Background Job"
+        verbose_name_plural = "Background Jobs"
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'run_after'], name='background_job_claim_idx'),
+        ]
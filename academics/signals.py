@@ -0,0 +1,133 @@
+# academics/signals.py
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .attainment import dirty, incremental
+from .models import Assessment, Assignment, CIAComponent, COPOMapping, StudentMark, Submission
+
+
+# --- Incremental CO attainment on grade writes ---
+# pre_save remembers what the row contributed before the write so post_save can
+# apply only the difference.
+
+@receiver(pre_save, sender=Submission)
+def remember_submission_contribution(sender, instance, raw=False, **kwargs):
+    if raw or not instance.pk:
+        instance._previous_contribution = None
+        return
+    previous = Submission.objects.filter(pk=instance.pk).values("assignment_id", "student_id", "marks_obtained").first()
+    instance._previous_contribution = (
+        incremental.submission_contribution(previous["assignment_id"], previous["student_id"], previous["marks_obtained"])
+        if previous else None
+    )
+
+
+@receiver(post_save, sender=Submission)
+def update_attainment_for_submission(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, "_previous_contribution", None)
+    current = incremental.submission_contribution(instance.assignment_id, instance.student_id, instance.marks_obtained)
+    incremental.apply_change(previous, current)
+    if previous != current:
+        dirty.mark_assignment(instance.assignment_id)
+
+
+@receiver(post_delete, sender=Submission)
+def remove_submission_from_attainment(sender, instance, **kwargs):
+    incremental.apply_contribution(
+        incremental.submission_contribution(instance.assignment_id, instance.student_id, instance.marks_obtained), -1
+    )
+    if instance.marks_obtained is not None:
+        dirty.mark_assignment(instance.assignment_id)
+
+
+@receiver(pre_save, sender=StudentMark)
+def remember_student_mark_contribution(sender, instance, raw=False, **kwargs):
+    if raw or not instance.pk:
+        instance._previous_contribution = None
+        return
+    previous = (
+        StudentMark.objects.filter(pk=instance.pk)
+        .values("assessment_id", "student_id", "marks_obtained", "version")
+        .first()
+    )
+    instance._previous_contribution = (
+        incremental.student_mark_contribution(previous["assessment_id"], previous["student_id"], previous["marks_obtained"])
+        if previous else None
+    )
+    if previous:
+        # From the stored row, so a save from a stale copy still moves the version on
+        instance.version = previous["version"] + 1
+
+
+@receiver(post_save, sender=StudentMark)
+def update_attainment_for_student_mark(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, "_previous_contribution", None)
+    current = incremental.student_mark_contribution(instance.assessment_id, instance.student_id, instance.marks_obtained)
+    incremental.apply_change(previous, current)
+    if previous != current:
+        dirty.mark_assessment(instance.assessment_id)
+
+
+@receiver(post_delete, sender=StudentMark)
+def remove_student_mark_from_attainment(sender, instance, **kwargs):
+    incremental.apply_contribution(
+        incremental.student_mark_contribution(instance.assessment_id, instance.student_id, instance.marks_obtained), -1
+    )
+    if instance.marks_obtained is not None:
+        dirty.mark_assessment(instance.assessment_id)
+
+
+# --- Dirty-scope ledger on CO link and CO-PO mapping writes ---
+# Grade writes mark the ledger above; recompute_dirty drains it.
+
+def _mark_outcome_links(source, reverse_accessor, instance, action, reverse, pk_set):
+    if action not in ("post_add", "post_remove", "pre_clear"):
+        return
+    if action == "pre_clear":
+        # The links are gone by post_clear, so read them first
+        related = getattr(instance, reverse_accessor) if reverse else instance.assesses_cos
+        pk_set = set(related.values_list("pk", flat=True))
+    if not pk_set:
+        return
+    if reverse:
+        dirty.mark_outcome_links(source, pk_set, [instance.pk])
+    else:
+        dirty.mark_outcome_links(source, [instance.pk], pk_set)
+
+
+@receiver(m2m_changed, sender=Assessment.assesses_cos.through)
+def mark_assessment_links_dirty(sender, instance, action, reverse, pk_set, **kwargs):
+    _mark_outcome_links("assessment", "assessed_by_assessments", instance, action, reverse, pk_set)
+
+
+@receiver(m2m_changed, sender=Assignment.assesses_cos.through)
+def mark_assignment_links_dirty(sender, instance, action, reverse, pk_set, **kwargs):
+    _mark_outcome_links("assignment", "assessed_by_assignments", instance, action, reverse, pk_set)
+
+
+@receiver(post_save, sender=COPOMapping)
+@receiver(post_delete, sender=COPOMapping)
+def mark_mapping_dirty(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    dirty.mark_mapping(instance.course_outcome_id)
+
+
+@receiver(post_save, sender=CIAComponent)
+@receiver(post_delete, sender=CIAComponent)
+def mark_cia_component_dirty(sender, instance, raw=False, **kwargs):
+    # Component weights and COs feed the 'cia' engine
+    if raw:
+        return
+    dirty.mark_course(instance.course_plan.course_id)
+
+
+@receiver(m2m_changed, sender=CIAComponent.cos_covered.through)
+def mark_cia_component_links_dirty(sender, instance, action, reverse, **kwargs):
+    if action not in ("post_add", "post_remove", "pre_clear"):
+        return
+    dirty.mark_course(instance.course_id if reverse else instance.course_plan.course_id)
@@ -0,0 +1,41 @@
+# academics/tasks.py
+"""Background job handlers for the academics app (see academics/jobs.py)."""
+from .jobs import register_task
+from .models import AcademicYear, Course, CourseOutcome, Department, ProgramOutcome
+
+
+@register_task("attainment.co_by_course")
+def co_attainment_for_course(job, course_id, academic_year_id, force=False):
+    from .views import calculate_co_attainment_for_course
+
+    course_obj = Course.objects.get(pk=course_id)
+    academic_year_obj = AcademicYear.objects.get(pk=academic_year_id)
+    diff = calculate_co_attainment_for_course(course_obj, academic_year_obj, force=force, user=job.created_by)
+    if diff is None:
+        return {
+            "message": f"CO Attainment for {course_obj.code} in {academic_year_obj} is up to date: "
+                       f"no marks or mappings changed since the last calculation (0 recomputed, 1 skipped).",
+            "recomputed": 0,
+            "skipped": 1,
+        }
+    labels = dict(CourseOutcome.objects.filter(pk__in=[key for key, _, _ in diff.changes()]).values_list("pk", "code"))
+    return {
+        "message": f"CO Attainment calculated for {course_obj.code} in {academic_year_obj}: {diff} (1 recomputed, 0 skipped).",
+        "recomputed": 1,
+        "skipped": 0,
+        "diff": diff.as_dict(labels),
+    }
+
+
+@register_task("attainment.po_by_department")
+def po_attainment_for_department(job, department_id, academic_year_id):
+    from .views import calculate_po_attainment_for_department
+
+    department_obj = Department.objects.get(pk=department_id)
+    academic_year_obj = AcademicYear.objects.get(pk=academic_year_id)
+    diff = calculate_po_attainment_for_department(department_obj, academic_year_obj, user=job.created_by)
+    labels = dict(ProgramOutcome.objects.filter(pk__in=[key for key, _, _ in diff.changes()]).values_list("pk", "code"))
+    return {
+        "message": f"PO Attainment calculated for {department_obj.name} in {academic_year_obj}: {diff}.",
+        "diff": diff.as_dict(labels),
+    }
@@ -1,3 +1,1244 @@
-from django.test import TestCase
+import csv
+import datetime
+import tempfile
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.management import CommandError, call_command
+from django.db import connection, transaction
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+import numpy as np
+
+from users.models import UserProfile
+from . import attainment, jobs, marks
+from .attainment import dirty, incremental, locks, matrix
+from .attainment.bootstrap import bootstrap_interval, bootstrap_intervals
+from .attainment.weighting import (
+    MAX_RATIO_PART,
+    attainment_level,
+    attainment_levels,
+    is_passing,
+    parse_assessment_ratio,
+)
+from .attainment import AttainmentDiff, compute_co_attainment, recalculate_course, stream_student_co_totals
+from .marks import save_assessment_marks
+from .models import (
+    AcademicDepartment,
+    AcademicYear,
+    Assessment,
+    AssessmentType,
+    Assignment,
+    AttainmentRun,
+    AttainmentTrendCell,
+    BackgroundJob,
+    CIAComponent,
+    COPOMapping,
+    Course,
+    CourseOutcome,
+    CourseOutcomeAttainment,
+    CoursePlan,
+    Department,
+    DirtyAttainmentScope,
+    ProgramOutcome,
+    ProgramOutcomeAttainment,
+    Semester,
+    StudentCOScore,
+    StudentMark,
+    StudentPOAttainment,
+    Submission,
+)
+
+
+class MarkStreamTests(TestCase):
+    """The streamed score pipeline merges exam marks and submissions in constant memory."""
+
+    STUDENTS = 20
+
+    @classmethod
+    def setUpTestData(cls):
+        department = Department.objects.create(name="Computer Science")
+        cls.academic_year = AcademicYear.objects.create(
+            start_date=datetime.date(2024, 6, 1), end_date=datetime.date(2025, 5, 31)
+        )
+        academic_department = AcademicDepartment.objects.create(department=department, academic_year=cls.academic_year)
+        semester = Semester.objects.create(name="1st Semester", academic_department=academic_department)
+        cls.course = Course.objects.create(name="Data Structures", code="CS201", department=department, semester=semester)
+        cls.course_outcomes = [
+            CourseOutcome.objects.create(course=cls.course, code=f"CO{i}", description="Outcome") for i in range(2)
+        ]
+        faculty_user = User.objects.create(username="faculty")
+        cls.faculty = UserProfile.objects.create(user=faculty_user, role="FACULTY", department=department)
+        cls.students = [
+            UserProfile.objects.create(user=User.objects.create(username=f"student{i}"), department=department)
+            for i in range(cls.STUDENTS)
+        ]
+
+    def add_graded_work(self, count, marks=Decimal("6")):
+        """Adds `count` assessments and assignments on both COs, graded for every student."""
+        start = Assessment.objects.filter(course=self.course).count()
+        for i in range(start, start + count):
+            assessment = Assessment.objects.create(
+                name=f"Test {i}", course=self.course, academic_year=self.academic_year, max_marks=10, date=datetime.date(2025, 1, 1)
+            )
+            assessment.assesses_cos.add(*self.course_outcomes)
+            StudentMark.objects.bulk_create(
+                StudentMark(assessment=assessment, student=student.user, marks_obtained=marks) for student in self.students
+            )
+            assignment = Assignment.objects.create(
+                course=self.course, created_by=self.faculty, title=f"Assignment {i}", due_date=timezone.now(), max_marks=10
+            )
+            assignment.assesses_cos.add(*self.course_outcomes)
+            Submission.objects.bulk_create(
+                Submission(assignment=assignment, student=student, marks_obtained=marks) for student in self.students
+            )
+
+    def graded_course(self, code, outcomes):
+        """A course with `outcomes` COs, one assessment and one assignment on all of them, graded for every student."""
+        course = Course.objects.create(
+            name=code, code=code, department=self.course.department, semester=self.course.semester
+        )
+        course_outcomes = [
+            CourseOutcome.objects.create(course=course, code=f"CO{i}", description="Outcome") for i in range(outcomes)
+        ]
+        assessment = Assessment.objects.create(
+            name="Test", course=course, academic_year=self.academic_year, max_marks=10, date=datetime.date(2025, 1, 1)
+        )
+        assessment.assesses_cos.add(*course_outcomes)
+        StudentMark.objects.bulk_create(
+            StudentMark(assessment=assessment, student=student.user, marks_obtained=i % 10)
+            for i, student in enumerate(self.students)
+        )
+        assignment = Assignment.objects.create(
+            course=course, created_by=self.faculty, title="Assignment", due_date=timezone.now(), max_marks=10
+        )
+        assignment.assesses_cos.add(*course_outcomes)
+        Submission.objects.bulk_create(
+            Submission(assignment=assignment, student=student, marks_obtained=(i * 3) % 10)
+            for i, student in enumerate(self.students)
+        )
+        return course
+
+    def assert_queries_independent_of_outcomes(self, engine):
+        small, large = self.graded_course("CS301", 2), self.graded_course("CS302", 10)
+        compute_co_attainment(self.academic_year, course_obj=small, engine=engine)  # warm up caches
+
+        with CaptureQueriesContext(connection) as queries:
+            results = compute_co_attainment(self.academic_year, course_obj=small, engine=engine)
+        self.assertEqual(len(results), 2)
+        with self.assertNumQueries(len(queries)):
+            results = compute_co_attainment(self.academic_year, course_obj=large, engine=engine)
+        self.assertEqual(len(results), 10)
+
+    def test_sql_engine_queries_do_not_grow_with_the_number_of_cos(self):
+        self.assert_queries_independent_of_outcomes("sql")
+
+    def test_matrix_engine_queries_do_not_grow_with_the_number_of_cos(self):
+        self.assert_queries_independent_of_outcomes("matrix")
+
+    def peak_memory(self):
+        """Peak bytes allocated while consuming the stream, and the number of rows it yielded."""
+        tracemalloc.start()
+        try:
+            rows = sum(1 for _ in stream_student_co_totals(self.academic_year, course_obj=self.course, chunk_size=10))
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        return peak, rows
+
+    def test_exam_marks_count_towards_attainment(self):
+        assessment = Assessment.objects.create(
+            name="Midterm", course=self.course, academic_year=self.academic_year, max_marks=50, date=datetime.date(2025, 1, 1)
+        )
+        assessment.assesses_cos.add(self.course_outcomes[0])
+        StudentMark.objects.bulk_create(
+            StudentMark(assessment=assessment, student=student.user, marks_obtained=40 if i % 4 else 10)
+            for i, student in enumerate(self.students)
+        )
+
+        for engine in ("sql", "matrix"):
+            results = compute_co_attainment(self.academic_year, course_obj=self.course, engine=engine)
+            self.assertEqual(results, {self.course_outcomes[0].pk: Decimal("75.00")}, engine)
+
+    def test_matrix_engine_matches_sql_in_student_chunks(self):
+        self.add_graded_work(2)
+        final = Assessment.objects.create(
+            name="Semester exam", course=self.course, academic_year=self.academic_year, max_marks=100,
+            date=datetime.date(2025, 5, 1), assessment_type=AssessmentType.objects.create(name="SEE", is_external=True),
+        )
+        final.assesses_cos.add(self.course_outcomes[1])
+        StudentMark.objects.bulk_create(
+            StudentMark(assessment=final, student=student.user, marks_obtained=15 * (i % 7)) for i, student in enumerate(self.students)
+        )
+        CoursePlan.objects.create(course=self.course, title="Course Plan", assessment_ratio="30:70")
+
+        for threshold in (40, 60, 62.5):
+            expected = attainment.sql.tally_co_attainment(self.academic_year, course_obj=self.course, success_threshold=threshold)
+            for chunk_size in (1, 7, 500):
+                self.assertEqual(
+                    matrix.tally_co_attainment(
+                        self.academic_year, course_obj=self.course, success_threshold=threshold, student_chunk_size=chunk_size
+                    ),
+                    expected,
+                    (threshold, chunk_size),
+                )
+
+    def test_totals_combine_both_sources(self):
+        self.add_graded_work(3)
+        totals = list(stream_student_co_totals(self.academic_year, course_obj=self.course))
+
+        self.assertEqual(len(totals), self.STUDENTS * len(self.course_outcomes))
+        for _, _, obtained, max_marks, items in totals:
+            self.assertEqual((obtained, max_marks, items), (Decimal("36"), Decimal("60"), 6))
+
+    def test_memory_stays_flat_as_marks_grow(self):
+        self.add_graded_work(5)
+        self.peak_memory()  # warm up query compilation and caches
+        small_peak, small_rows = self.peak_memory()
+
+        self.add_graded_work(95)
+        large_peak, large_rows = self.peak_memory()
+
+        # 20x the marks, the same (student, CO) rows and about the same memory
+        self.assertEqual(StudentMark.objects.count(), 100 * self.STUDENTS)
+        self.assertEqual(small_rows, large_rows)
+        self.assertLess(large_peak, small_peak * 1.5 + 16 * 1024)
+
+
+class AttainmentWeightingTests(TestCase):
+    """Ratio parsing, the exact pass test and level banding shared by every engine."""
+
+    def test_ratio_parts_are_capped(self):
+        self.assertEqual(parse_assessment_ratio(" 20 : 80 "), (20, 80))
+        self.assertIsNone(parse_assessment_ratio(""))
+        for ratio in ("60", "a:b", "0:0", "-1:5", f"{MAX_RATIO_PART + 1}:1"):
+            with self.assertRaises(ValueError, msg=ratio):
+                parse_assessment_ratio(ratio)
+
+    def test_vectorized_pass_test_matches_the_exact_one_past_int64(self):
+        # Totals in hundredths large enough that the weighted products pass 2**63
+        internal_obtained, internal_max = 10 ** 8 * 6, 10 ** 8 * 10
+        external_obtained, external_max = 10 ** 8 * 6 - 1, 10 ** 8 * 10
+        passed = matrix.passing(
+            *(np.array([value], dtype=np.int64) for value in (internal_obtained, internal_max, external_obtained, external_max)),
+            np.array([MAX_RATIO_PART]), np.array([MAX_RATIO_PART]), 6000,
+        )
+        expected = is_passing(
+            internal_obtained, internal_max, external_obtained, external_max, (MAX_RATIO_PART, MAX_RATIO_PART), 60
+        )
+        self.assertFalse(expected)
+        self.assertEqual(bool(passed[0]), expected)
+
+    def test_levels_follow_the_configured_bands(self):
+        self.assertEqual(list(attainment_levels([0, 49.99, 50, 60, 69.99, 70, 100])), [0, 0, 1, 2, 2, 3, 3])
+        with override_settings(ATTAINMENT_LEVEL_BANDS=(40, 55, 80)):
+            self.assertEqual([attainment_level(value) for value in (39, 40, 79.99, 80)], [0, 1, 2, 3])
+        with override_settings(ATTAINMENT_LEVEL_BANDS=(70, 60, 50)), self.assertRaises(ValueError):
+            attainment_level(65)
+        self.assertIsNone(attainment_level(None))
+
+
+class CourseAttainmentTests(TestCase):
+    """Batch CO attainment of one course and the per-student scores saved alongside it."""
+
+    @classmethod
+    def setUpTestData(cls):
+        department = Department.objects.create(name="Computer Science")
+        cls.academic_year = AcademicYear.objects.create(
+            start_date=datetime.date(2024, 6, 1), end_date=datetime.date(2025, 5, 31)
+        )
+        academic_department = AcademicDepartment.objects.create(department=department, academic_year=cls.academic_year)
+        semester = Semester.objects.create(name="1st Semester", academic_department=academic_department)
+        cls.course = Course.objects.create(name="Data Structures", code="CS201", department=department, semester=semester)
+        cls.course_outcomes = [
+            CourseOutcome.objects.create(course=cls.course, code=f"CO{i}", description="Outcome") for i in range(2)
+        ]
+        faculty = UserProfile.objects.create(user=User.objects.create(username="faculty"), role="FACULTY", department=department)
+        cls.students = [
+            UserProfile.objects.create(user=User.objects.create(username=f"student{i}"), department=department)
+            for i in range(6)
+        ]
+        cls.assignments = []
+        for i, (max_marks, outcomes) in enumerate([(10, cls.course_outcomes[:1]), (20, cls.course_outcomes)]):
+            assignment = Assignment.objects.create(
+                course=cls.course, created_by=faculty, title=f"Assignment {i}", due_date=timezone.now(), max_marks=max_marks
+            )
+            assignment.assesses_cos.add(*outcomes)
+            Submission.objects.bulk_create(
+                Submission(assignment=assignment, student=student, marks_obtained=(j + i) * max_marks // 7)
+                for j, student in enumerate(cls.students)
+            )
+            cls.assignments.append(assignment)
+        cls.exam = Assessment.objects.create(
+            name="Midterm", course=cls.course, academic_year=cls.academic_year, max_marks=50, date=datetime.date(2025, 1, 1)
+        )
+        cls.exam.assesses_cos.add(cls.course_outcomes[1])
+        StudentMark.objects.bulk_create(
+            StudentMark(assessment=cls.exam, student=student.user, marks_obtained=8 * j) for j, student in enumerate(cls.students)
+        )
+
+    def test_recalculation_materializes_student_scores(self):
+        recalculate_course(self.course, self.academic_year, force=True)
+
+        stored = set(
+            StudentCOScore.objects.filter(academic_year=self.academic_year).values_list(
+                "student", "course_outcome", "obtained", "max_marks", "graded_items"
+            )
+        )
+        self.assertEqual(stored, set(stream_student_co_totals(self.academic_year, course_obj=self.course)))
+        self.assertEqual(len(stored), 12)
+
+        class_attainment = dict(
+            CourseOutcomeAttainment.objects.values_list("course_outcome", "attainment_percentage")
+        )
+        with self.assertNumQueries(1):
+            scores = list(attainment.student_co_scores(self.students[3]))
+        self.assertEqual(
+            {score.course_outcome_id: score.class_attainment for score in scores}, class_attainment
+        )
+        for score in scores:
+            self.assertEqual(score.percentage, (score.obtained * 100 / score.max_marks).quantize(Decimal("0.01")))
+
+    def test_unchanged_inputs_skip_the_run(self):
+        self.assertIsNotNone(recalculate_course(self.course, self.academic_year))
+        self.assertIsNone(recalculate_course(self.course, self.academic_year))
+        self.assertEqual(
+            list(AttainmentRun.objects.filter(course=self.course).order_by("started_at").values_list("skipped", flat=True)),
+            [False, True],
+        )
+
+        # A forced run, another threshold or a changed mark all recalculate
+        self.assertIsNotNone(recalculate_course(self.course, self.academic_year, force=True))
+        self.assertIsNotNone(recalculate_course(self.course, self.academic_year, success_threshold=70))
+        self.assertIsNone(recalculate_course(self.course, self.academic_year, success_threshold=70))
+        Submission.objects.filter(assignment=self.assignments[0], student=self.students[0]).update(marks_obtained=9)
+        self.assertIsNotNone(recalculate_course(self.course, self.academic_year, success_threshold=70))
+
+    def test_run_records_phases_rows_and_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            diff = recalculate_course(self.course, self.academic_year, force=True)
+
+        run = AttainmentRun.objects.get(course=self.course)
+        self.assertEqual((run.kind, run.engine, run.skipped), (AttainmentRun.Kind.CO, attainment.get_engine_name(), False))
+        for seconds in (run.load_seconds, run.compute_seconds, run.write_seconds):
+            self.assertGreater(seconds, 0)
+        self.assertGreaterEqual(run.total_seconds, run.load_seconds + run.compute_seconds + run.write_seconds)
+        self.assertGreater(run.rows_read, 0)
+        self.assertEqual(run.rows_written, diff.changed)
+        self.assertEqual(run.rows_written, 2)
+        self.assertEqual(run.result, diff.as_dict())
+
+        # Every query of the run is counted except the insert of the run record itself
+        self.assertTrue(queries[-1]["sql"].startswith(f"INSERT INTO {connection.ops.quote_name(AttainmentRun._meta.db_table)}"))
+        self.assertEqual(run.query_count, len(queries) - 1)
+
+    def assert_sweep_matches_batch_runs(self, thresholds):
+        curves = attainment.sweep_co_attainment(self.academic_year, course_obj=self.course, thresholds=thresholds)
+        tallies = attainment.compute_co_tallies(self.academic_year, course_obj=self.course)
+        self.assertEqual({co_id: counted for co_id, (counted, _) in curves.items()}, {
+            co_id: counted for co_id, (counted, _) in tallies.items()
+        })
+        for i, threshold in enumerate(thresholds):
+            results = compute_co_attainment(self.academic_year, course_obj=self.course, success_threshold=threshold)
+            swept = {co_id: Decimal(curve[i]).quantize(Decimal("0.01")) for co_id, (_, curve) in curves.items()}
+            self.assertEqual(swept, results, msg=f"threshold {threshold}")
+
+    def test_threshold_sweep_matches_batch_runs(self):
+        # Thresholds on and either side of the students' exam percentages, 16% apart
+        thresholds = [0, 15.99, 16, 40, 48, 48.01, 60, 64, 80, 100]
+        self.assert_sweep_matches_batch_runs(thresholds)
+
+        # With a 30:70 ratio the second CO weighs the external exam against the internal assignment
+        final = Assessment.objects.create(
+            name="Final", course=self.course, academic_year=self.academic_year, max_marks=100,
+            date=datetime.date(2025, 5, 1), assessment_type=AssessmentType.objects.create(name="SEE", is_external=True),
+        )
+        final.assesses_cos.add(self.course_outcomes[1])
+        StudentMark.objects.bulk_create(
+            StudentMark(assessment=final, student=student.user, marks_obtained=15 * j + 10) for j, student in enumerate(self.students)
+        )
+        # At 38% and 53% the weighted percentages pass where the pooled marks would not
+        CoursePlan.objects.create(course=self.course, title="Course Plan", assessment_ratio="30:70")
+        self.assert_sweep_matches_batch_runs(thresholds + [38, 53])
+        curves = attainment.sweep_co_attainment(self.academic_year, course_obj=self.course, thresholds=[38, 53])
+        self.assertEqual([round(value, 2) for value in curves[self.course_outcomes[1].pk][1]], [66.67, 50.0])
+
+    def test_cia_engine_counts_submissions_through_their_components(self):
+        first, second = (outcome.pk for outcome in self.course_outcomes)
+        sql_tallies = attainment.compute_co_tallies(self.academic_year, course_obj=self.course, engine="sql")
+        self.assertEqual(attainment.compute_co_tallies(self.academic_year, course_obj=self.course, engine="cia"), sql_tallies)
+        self.assertEqual(sql_tallies[first], (6, 2))
+
+        # The first assignment now counts for 30 marks through its component, tripling its marks
+        plan = CoursePlan.objects.create(course=self.course, title="Course Plan")
+        component = CIAComponent.objects.create(course_plan=plan, component_name="CIA-I", weight=30)
+        component.cos_covered.add(self.course_outcomes[0])
+        Assignment.objects.filter(pk=self.assignments[0].pk).update(cia_component=component)
+
+        cia_tallies = attainment.compute_co_tallies(self.academic_year, course_obj=self.course, engine="cia")
+        self.assertEqual(cia_tallies, {first: (6, 1), second: sql_tallies[second]})
+        self.assertEqual(attainment.compute_co_tallies(self.academic_year, course_obj=self.course, engine="sql"), sql_tallies)
+
+
+class RecalculateAttainmentCommandTests(TestCase):
+    """manage.py recalculate_attainment: scope validation, dry runs and the summary table."""
+
+    @classmethod
+    def setUpTestData(cls):
+        department = Department.objects.create(name="Computer Science")
+        cls.academic_year = AcademicYear.objects.create(
+            start_date=datetime.date(2024, 6, 1), end_date=datetime.date(2025, 5, 31)
+        )
+        academic_department = AcademicDepartment.objects.create(department=department, academic_year=cls.academic_year)
+        semester = Semester.objects.create(name="1st Semester", academic_department=academic_department)
+        cls.course = Course.objects.create(name="Data Structures", code="CS201", department=department, semester=semester)
+        course_outcome = CourseOutcome.objects.create(course=cls.course, code="CO1", description="Outcome")
+        program_outcome = ProgramOutcome.objects.create(department=department, code="PO1", description="Outcome")
+        COPOMapping.objects.create(course_outcome=course_outcome, program_outcome=program_outcome, correlation_level=3)
+        faculty = UserProfile.objects.create(user=User.objects.create(username="faculty"), role="FACULTY", department=department)
+        assignment = Assignment.objects.create(
+            course=cls.course, created_by=faculty, title="Assignment", due_date=timezone.now(), max_marks=10
+        )
+        assignment.assesses_cos.add(course_outcome)
+        Submission.objects.bulk_create(
+            Submission(
+                assignment=assignment,
+                student=UserProfile.objects.create(user=User.objects.create(username=f"student{i}"), department=department),
+                marks_obtained=3 * i,
+            )
+            for i in range(4)
+        )
+
+    def recalculate(self, *args):
+        out = StringIO()
+        call_command("recalculate_attainment", "--year", "2024", *args, stdout=out)
+        return out.getvalue()
+
+    def test_scope_is_validated(self):
+        for args, message in [
+            ((), "Choose a scope"),
+            (("--course", str(self.course.pk + 1)), "has no offering"),
+            (("--all", "--workers", "0"), "at least 1"),
+            (("--all", "--year", "2023"), "No academic year starting in 2023"),
+        ]:
+            with self.subTest(args=args), self.assertRaisesMessage(CommandError, message):
+                self.recalculate(*args)
+        with self.assertRaisesMessage(CommandError, "No current academic year"):
+            call_command("recalculate_attainment", "--all", stdout=StringIO())
+
+        output = self.recalculate("--department", str(self.course.department_id))
+        self.assertIn("1 course shard(s), 1 department shard(s)", output)
+
+    def test_dry_run_saves_nothing(self):
+        output = self.recalculate("--course", str(self.course.pk), "--dry-run")
+        self.assertIn("[dry run]", output)
+        self.assertIn("2 row(s) changed", output)
+        self.assertFalse(CourseOutcomeAttainment.objects.exists())
+        self.assertFalse(ProgramOutcomeAttainment.objects.exists())
+
+    def test_summary_lists_every_shard(self):
+        lines = self.recalculate("--all").splitlines()
+        self.assertEqual(lines[1].split(), ["Shard", "Rows", "Changed", "Seconds"])
+        self.assertEqual(lines[3].split()[:4], ["CO", "CS201", "1", "1"])
+        self.assertEqual(lines[4].split()[:5], ["PO", "Computer", "Science", "1", "1"])
+        self.assertTrue(lines[-1].startswith("2 shard(s) recomputed, 0 skipped, 2 row(s) changed"))
+        self.assertEqual(CourseOutcomeAttainment.objects.get().attainment_percentage, Decimal("50.00"))
+
+        # Unchanged inputs skip the course on the next run
+        lines = self.recalculate("--all").splitlines()
+        self.assertEqual(lines[3].split()[2:4], ["-", "skipped"])
+        self.assertTrue(lines[-1].startswith("1 shard(s) recomputed, 1 skipped, 0 row(s) changed"))
+
+
+class POAttainmentTests(TestCase):
+    """PO attainment as the correlation-weighted average of CO attainment."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.department = Department.objects.create(name="Computer Science")
+        cls.academic_year = AcademicYear.objects.create(
+            start_date=datetime.date(2024, 6, 1), end_date=datetime.date(2025, 5, 31)
+        )
+        academic_department = AcademicDepartment.objects.create(department=cls.department, academic_year=cls.academic_year)
+        semester = Semester.objects.create(name="1st Semester", academic_department=academic_department)
+        course = Course.objects.create(name="Data Structures", code="CS201", department=cls.department, semester=semester)
+        cls.course_outcomes = [
+            CourseOutcome.objects.create(course=course, code=f"CO{i}", description="Outcome") for i in range(1, 4)
+        ]
+        cls.program_outcomes = [
+            ProgramOutcome.objects.create(department=cls.department, code=f"PO{i}", description="Outcome") for i in range(1, 5)
+        ]
+        co1, co2, co3 = cls.course_outcomes
+        po1, po2, po3, _ = cls.program_outcomes
+        # PO4 has no mappings; PO3 only maps CO3, which has no attainment this year
+        COPOMapping.objects.bulk_create(
+            COPOMapping(course_outcome=co, program_outcome=po, correlation_level=level)
+            for co, po, level in [(co1, po1, 3), (co2, po1, 1), (co1, po2, 0), (co2, po2, 2), (co3, po2, 3), (co3, po3, 2)]
+        )
+        CourseOutcomeAttainment.objects.bulk_create(
+            CourseOutcomeAttainment(course_outcome=co, academic_year=cls.academic_year, attainment_percentage=percentage)
+            for co, percentage in [(co1, Decimal("80.00")), (co2, Decimal("50.00"))]
+        )
+        cls.students = [
+            UserProfile.objects.create(
+                user=User.objects.create(username=f"student{i}", first_name="Student", last_name=str(i)),
+                role="STUDENT",
+                department=cls.department,
+            )
+            for i in range(1, 4)
+        ]
+        # PO1 weighs CO1 and CO2 3:1, so the first two students land exactly halfway
+        # between hundredths: 33.335 rounds up to 33.34 and 33.325 down to 33.32
+        StudentCOScore.objects.bulk_create(
+            StudentCOScore(student=student, course_outcome=co, academic_year=cls.academic_year, percentage=percentage)
+            for student, co, percentage in [
+                (cls.students[0], co1, Decimal("33.33")),
+                (cls.students[0], co2, Decimal("33.35")),
+                (cls.students[1], co1, Decimal("33.33")),
+                (cls.students[1], co2, Decimal("33.31")),
+                (cls.students[2], co3, Decimal("90.00")),
+            ]
+        )
+
+    def test_weighted_average_over_the_mapped_co_attainment(self):
+        po1, po2, po3, po4 = (po.pk for po in self.program_outcomes)
+        results = attainment.compute_po_attainment(self.department, self.academic_year)
+
+        # (80 x 3 + 50 x 1) / 4; CO1 at level 0 and CO3 without attainment carry no weight in PO2
+        self.assertEqual(results, {po1: Decimal("72.50"), po2: Decimal("50.00"), po3: None, po4: None})
+
+        co1, co2, co3 = (co.pk for co in self.course_outcomes)
+        results = attainment.compute_po_attainment(
+            self.department, self.academic_year, {co1: Decimal("33.33"), co2: Decimal("0.01"), co3: Decimal("100")}
+        )
+        self.assertEqual(results, {po1: Decimal("25.00"), po2: Decimal("60.00"), po3: Decimal("100.00"), po4: None})
+
+    def test_po_rows_are_written_in_one_statement(self):
+        results = attainment.compute_po_attainment(self.department, self.academic_year)
+        with CaptureQueriesContext(connection) as queries:
+            diff = attainment.save_po_attainment(results, self.academic_year)
+        writes = [query["sql"] for query in queries if not query["sql"].lstrip().upper().startswith("SELECT")]
+        self.assertEqual(len(writes), 1)
+        self.assertEqual(diff.changed, 4)
+
+        stored = {
+            po_id: (percentage, level)
+            for po_id, percentage, level in ProgramOutcomeAttainment.objects.values_list(
+                "program_outcome", "attainment_percentage", "attainment_level"
+            )
+        }
+        self.assertEqual(stored[self.program_outcomes[0].pk], (Decimal("72.50"), 3))
+        self.assertEqual(stored[self.program_outcomes[2].pk], (None, None))
+
+    def write_student_vectors(self):
+        po_ids, student_ids, results = attainment.compute_student_po_attainment(self.department, self.academic_year)
+        attainment.write_student_po_attainment(self.department, self.academic_year, po_ids, student_ids, results)
+        return po_ids, dict(zip(student_ids, results.tolist()))
+
+    def test_student_po_vectors_round_half_even(self):
+        po_ids, results = self.write_student_vectors()
+        self.assertEqual(po_ids, [po.pk for po in self.program_outcomes])
+
+        first, second, third = (student.pk for student in self.students)
+        self.assertEqual(results[first][:2], [33.34, 33.35])
+        self.assertEqual(results[second][:2], [33.32, 33.31])
+        self.assertEqual(results[third][1:3], [90.0, 90.0])
+        self.assertTrue(np.isnan(results[third][0]) and np.isnan(results[first][3]))
+
+        po1, po2, po3, po4 = (str(pk) for pk in po_ids)
+        vector = StudentPOAttainment.objects.get(student_id=first, department=self.department).attainment
+        self.assertEqual(vector, {po1: 33.34, po2: 33.35, po3: None, po4: None})
+
+    def test_student_sees_their_own_po_attainment(self):
+        attainment.save_po_attainment(attainment.compute_po_attainment(self.department, self.academic_year), self.academic_year)
+        self.write_student_vectors()
+
+        self.client.force_login(self.students[0].user)
+        response = self.client.get(reverse("student_personal_attainment_view"))
+        self.assertEqual(response.status_code, 200)
+        own = {po_att.program_outcome.code: po_att.student_percentage for po_att in response.context["po_attainments"]}
+        self.assertEqual(own, {"PO1": 33.34, "PO2": 33.35, "PO3": None, "PO4": None})
+        self.assertContains(response, "33.34%")
+
+    def test_student_po_csv_has_one_row_per_student(self):
+        self.write_student_vectors()
+        admin_user = User.objects.create(username="admin")
+        UserProfile.objects.create(user=admin_user, role="ADMIN", department=self.department)
+
+        self.client.force_login(admin_user)
+        response = self.client.get(
+            reverse("export_student_po_attainment_csv"),
+            {"academic_year": self.academic_year.pk, "department": self.department.pk},
+        )
+        self.assertEqual(response.status_code, 200)
+        rows = list(csv.reader(StringIO(response.content.decode())))
+        self.assertEqual(rows, [
+            ["Academic Year", "Department", "Username", "Student Name", "PO1", "PO2", "PO3", "PO4"],
+            ["2024-2025", "Computer Science", "student1", "Student 1", "33.34%", "33.35%", "N/A", "N/A"],
+            ["2024-2025", "Computer Science", "student2", "Student 2", "33.32%", "33.31%", "N/A", "N/A"],
+            ["2024-2025", "Computer Science", "student3", "Student 3", "N/A", "90.00%", "90.00%", "N/A"],
+        ])
+
+
+class AttainmentTrendTests(TestCase):
+    """The trend cube: cells refreshed from saved attainment and read back per department."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.department = Department.objects.create(name="Computer Science")
+        other_department = Department.objects.create(name="Physics")
+        cls.hod = User.objects.create(username="hod")
+        UserProfile.objects.create(user=cls.hod, role="HOD", department=cls.department)
+        cls.other_hod = User.objects.create(username="other_hod")
+        UserProfile.objects.create(user=cls.other_hod, role="HOD", department=other_department)
+
+        cls.academic_years = [
+            AcademicYear.objects.create(start_date=datetime.date(year, 6, 1), end_date=datetime.date(year + 1, 5, 31))
+            for year in (2022, 2023, 2024)
+        ]
+        cls.course = Course.objects.create(name="Data Structures", code="CS201", department=cls.department)
+        course_outcomes = [
+            CourseOutcome.objects.create(course=cls.course, code=f"CO{i}", description="Outcome") for i in (1, 2)
+        ]
+        program_outcome = ProgramOutcome.objects.create(department=cls.department, code="PO1", description="Outcome")
+        for offset, academic_year in enumerate(cls.academic_years):
+            CourseOutcomeAttainment.objects.bulk_create(
+                CourseOutcomeAttainment(
+                    course_outcome=co, academic_year=academic_year, attainment_percentage=Decimal(60 + 10 * offset + 5 * i)
+                )
+                for i, co in enumerate(course_outcomes)
+            )
+            ProgramOutcomeAttainment.objects.create(
+                program_outcome=program_outcome, academic_year=academic_year, attainment_percentage=Decimal(50 + offset)
+            )
+
+    def setUp(self):
+        for academic_year in self.academic_years:
+            attainment.refresh_co_trends(academic_year, course_obj=self.course)
+            attainment.refresh_po_trends(academic_year, department_obj=self.department)
+
+    def test_latest_years_are_read_in_one_query(self):
+        with self.assertNumQueries(1):
+            trends = attainment.department_trends(self.department, years=2)
+
+        self.assertEqual(trends["years"], ["2023-2024", "2024-2025"])
+        self.assertEqual(trends["po"], {"attainment": [51.0, 52.0], "sample_size": [0, 0], "outcomes": {"PO1": [51.0, 52.0]}})
+        self.assertEqual(
+            trends["courses"],
+            [{"code": "CS201", "name": "Data Structures", "attainment": [72.5, 82.5], "sample_size": [0, 0]}],
+        )
+
+    def test_unchanged_cells_are_not_written(self):
+        with CaptureQueriesContext(connection) as queries:
+            diff = attainment.refresh_co_trends(self.academic_years[0], course_obj=self.course)
+        self.assertEqual((diff.changed, diff.unchanged), (0, 1))
+        self.assertFalse([query for query in queries if query["sql"].lstrip().upper().startswith(("INSERT", "UPDATE", "DELETE"))])
+
+        CourseOutcomeAttainment.objects.filter(academic_year=self.academic_years[0], course_outcome__code="CO2").update(
+            attainment_percentage=Decimal("75.00")
+        )
+        diff = attainment.refresh_co_trends(self.academic_years[0], course_obj=self.course)
+        self.assertEqual(diff.updated, {(self.department.pk, self.course.pk): (Decimal("62.50"), Decimal("67.50"))})
+
+    def test_trend_page_and_api(self):
+        self.client.force_login(self.hod)
+        response = self.client.get(reverse("attainment_trends_view"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.context["departments"]), [self.department])
+
+        response = self.client.get(reverse("attainment_trends_api"), {"department": self.department.pk, "years": 2})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), attainment.department_trends(self.department, years=2))
+        self.assertEqual(self.client.get(reverse("attainment_trends_api")).status_code, 400)
+        response = self.client.get(reverse("attainment_trends_api"), {"department": self.department.pk, "years": "all"})
+        self.assertEqual(response.status_code, 400)
+
+        self.client.force_login(self.other_hod)
+        response = self.client.get(reverse("attainment_trends_api"), {"department": self.department.pk})
+        self.assertEqual(response.status_code, 404)
+
+
+class BootstrapIntervalTests(TestCase):
+    """Confidence intervals are reproducible and bracket the attainment they come from."""
+
+    def test_intervals_bracket_the_attainment(self):
+        tallies = {1: (40, 25), 2: (40, 25), 3: (12, 12), 4: (9, 0)}
+        intervals = bootstrap_intervals(tallies)
+
+        self.assertEqual(intervals, bootstrap_intervals(tallies))
+        self.assertEqual(intervals[3], (Decimal("100.00"), Decimal("100.00")))
+        self.assertEqual(intervals[4], (Decimal("0.00"), Decimal("0.00")))
+        lower, upper = intervals[1]
+        self.assertTrue(lower < Decimal("62.50") < upper)
+        self.assertLess(upper - lower, 40)
+        # Seeded by the CO id, so computing one CO alone gives the same interval
+        self.assertEqual(bootstrap_interval(1, 40, 25), intervals[1])
+        self.assertEqual(bootstrap_interval(1, 0, 0), (None, None))
+
+    def test_resamples_setting_is_validated(self):
+        with override_settings(ATTAINMENT_BOOTSTRAP_RESAMPLES=0), self.assertRaises(ValueError):
+            bootstrap_intervals({1: (10, 5)})
+
+
+class IncrementalAttainmentTests(TestCase):
+    """Grade writes move the running tallies without overriding what the batch engines decide."""
+
+    @classmethod
+    def setUpTestData(cls):
+        department = Department.objects.create(name="Computer Science")
+        cls.academic_year = AcademicYear.objects.create(
+            start_date=datetime.date(2024, 6, 1), end_date=datetime.date(2025, 5, 31)
+        )
+        academic_department = AcademicDepartment.objects.create(department=department, academic_year=cls.academic_year)
+        semester = Semester.objects.create(name="1st Semester", academic_department=academic_department)
+        cls.course = Course.objects.create(name="Data Structures", code="CS201", department=department, semester=semester)
+        cls.course_outcome = CourseOutcome.objects.create(course=cls.course, code="CO1", description="Outcome")
+        cls.internal = Assessment.objects.create(
+            name="CIA 1", course=cls.course, academic_year=cls.academic_year, max_marks=100, date=datetime.date(2025, 1, 1)
+        )
+        cls.external = Assessment.objects.create(
+            name="Semester exam", course=cls.course, academic_year=cls.academic_year, max_marks=10,
+            date=datetime.date(2025, 5, 1), assessment_type=AssessmentType.objects.create(name="SEE", is_external=True),
+        )
+        for assessment in (cls.internal, cls.external):
+            assessment.assesses_cos.add(cls.course_outcome)
+        cls.students = [
+            UserProfile.objects.create(user=User.objects.create(username=f"student{i}"), department=department)
+            for i in range(4)
+        ]
+        # Bulk writes skip the signals, leaving the running state behind the marks
+        StudentMark.objects.bulk_create(
+            StudentMark(assessment=cls.internal, student=student.user, marks_obtained=20) for student in cls.students
+        )
+        StudentMark.objects.bulk_create(
+            StudentMark(assessment=cls.external, student=student.user, marks_obtained=8) for student in cls.students
+        )
+
+    def stored_attainment(self):
+        return CourseOutcomeAttainment.objects.get(course_outcome=self.course_outcome).attainment_percentage
+
+    def edit_mark(self, assessment, student, marks_obtained):
+        mark = StudentMark.objects.get(assessment=assessment, student=student.user)
+        mark.marks_obtained = marks_obtained
+        with self.captureOnCommitCallbacks(execute=True):
+            mark.save()
+
+    def test_weighted_course_survives_a_mark_save(self):
+        # 20% internal and 80% external weighs to 68% against a pooled 25%
+        CoursePlan.objects.create(course=self.course, title="Course Plan", assessment_ratio="20:80")
+        recalculate_course(self.course, self.academic_year, force=True)
+        self.assertEqual(self.stored_attainment(), Decimal("100.00"))
+
+        # Passes on the pooled marks too, so the student's tally state flips
+        self.edit_mark(self.internal, self.students[0], 100)
+
+        self.assertEqual(self.stored_attainment(), Decimal("100.00"))
+        self.assertTrue(DirtyAttainmentScope.objects.filter(course=self.course, academic_year=self.academic_year).exists())
+        self.assertEqual(incremental.find_drift(self.academic_year)[3], [])
+
+    def test_delta_after_a_mark_edit_matches_a_full_recompute(self):
+        recalculate_course(self.course, self.academic_year, force=True)
+        self.assertEqual(self.stored_attainment(), Decimal("0.00"))
+        # The batch run replaced the tallies the bulk writes left behind
+        self.assertEqual(incremental.find_drift(self.academic_year)[2:], ([], []))
+
+        for student in self.students[:3]:
+            self.edit_mark(self.internal, student, 90)
+        self.edit_mark(self.internal, self.students[0], 40)
+
+        expected = compute_co_attainment(self.academic_year, course_obj=self.course)
+        self.assertEqual(expected, {self.course_outcome.pk: Decimal("50.00")})
+        self.assertEqual(self.stored_attainment(), expected[self.course_outcome.pk])
+        self.assertEqual(incremental.find_drift(self.academic_year)[2:], ([], []))
+        cell = AttainmentTrendCell.objects.get(kind=AttainmentRun.Kind.CO, course=self.course)
+        self.assertEqual((cell.attainment, cell.sample_size), (Decimal("50.00"), 4))
+
+    def test_mark_edits_keep_the_threshold_of_the_batch_run(self):
+        recalculate_course(self.course, self.academic_year, success_threshold=70, force=True)
+
+        # 68/110 passes at the default 60% but not at 70%; 88/110 passes at both
+        self.edit_mark(self.internal, self.students[0], 60)
+        self.edit_mark(self.internal, self.students[1], 80)
+
+        expected = compute_co_attainment(self.academic_year, course_obj=self.course, success_threshold=70)
+        self.assertEqual(expected, {self.course_outcome.pk: Decimal("25.00")})
+        self.assertEqual(self.stored_attainment(), expected[self.course_outcome.pk])
+        self.assertEqual(incremental.tally_thresholds(self.academic_year), {self.course_outcome.pk: Decimal("70.00")})
+        self.assertEqual(incremental.find_drift(self.academic_year)[2:], ([], []))
+
+
+class DirtyScopeLedgerTests(TestCase):
+    """The dirty ledger keeps every marked scope until it has been recalculated."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.department = Department.objects.create(name="Computer Science")
+        cls.academic_year = AcademicYear.objects.create(
+            start_date=datetime.date(2024, 6, 1), end_date=datetime.date(2025, 5, 31)
+        )
+        academic_department = AcademicDepartment.objects.create(department=cls.department, academic_year=cls.academic_year)
+        semester = Semester.objects.create(name="1st Semester", academic_department=academic_department)
+        cls.course = Course.objects.create(name="Data Structures", code="CS201", department=cls.department, semester=semester)
+        cls.assessment = Assessment.objects.create(
+            name="Midterm", course=cls.course, academic_year=cls.academic_year, max_marks=10, date=datetime.date(2025, 1, 1)
+        )
+        cls.assessment.assesses_cos.add(CourseOutcome.objects.create(course=cls.course, code="CO1", description="Outcome"))
+
+    def mark(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            dirty.mark_assessment(self.assessment.pk)
+
+    def test_marks_after_a_rollback_still_reach_the_ledger(self):
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            dirty.mark_assessment(self.assessment.pk)
+            raise RuntimeError("grade save failed")
+        self.assertFalse(DirtyAttainmentScope.objects.exists())
+
+        self.mark()
+        self.assertTrue(DirtyAttainmentScope.objects.filter(course=self.course, academic_year=self.academic_year).exists())
+
+    def test_claimed_scopes_stay_until_released(self):
+        self.mark()
+        scopes = dirty.claim()
+        self.assertEqual([scope.course for scope in scopes], [self.course])
+        self.assertEqual(dirty.claim(), [])
+
+        # A crashed run never releases its claim; it is taken again once the lease runs out
+        with mock.patch.object(dirty.timezone, "now", return_value=timezone.now() + dirty.CLAIM_LEASE * 2):
+            scopes = dirty.claim()
+        self.assertEqual(len(scopes), 1)
+
+        dirty.release(scopes)
+        self.assertFalse(DirtyAttainmentScope.objects.exists())
+
+    def test_marks_during_a_recalculation_survive_its_release(self):
+        self.mark()
+        scopes = dirty.claim()
+        self.mark()
+
+        dirty.release(scopes)
+        self.assertEqual(DirtyAttainmentScope.objects.filter(claimed_at__isnull=True).count(), 1)
+        self.assertEqual(len(dirty.claim()), 1)
+
+
+class AttainmentRunCoalescingTests(TransactionTestCase):
+    """Concurrent calculations of the same scope share one run instead of racing on its writes."""
+
+    TRIGGERS = 20
+
+    def setUp(self):
+        department = Department.objects.create(name="Computer Science")
+        self.academic_year = AcademicYear.objects.create(
+            start_date=datetime.date(2024, 6, 1), end_date=datetime.date(2025, 5, 31)
+        )
+        academic_department = AcademicDepartment.objects.create(department=department, academic_year=self.academic_year)
+        semester = Semester.objects.create(name="1st Semester", academic_department=academic_department)
+        self.course = Course.objects.create(name="Data Structures", code="CS201", department=department, semester=semester)
+        self.course_outcome = CourseOutcome.objects.create(course=self.course, code="CO1", description="Outcome")
+        assessment = Assessment.objects.create(
+            name="Midterm", course=self.course, academic_year=self.academic_year, max_marks=10, date=datetime.date(2025, 1, 1)
+        )
+        assessment.assesses_cos.add(self.course_outcome)
+        for i in range(8):
+            student = UserProfile.objects.create(user=User.objects.create(username=f"student{i}"), department=department)
+            StudentMark.objects.create(assessment=assessment, student=student.user, marks_obtained=8 if i % 2 else 2)
+
+    def test_concurrent_triggers_run_one_calculation(self):
+        computations = []
+        compute_co_tallies = attainment.compute_co_tallies
+
+        def slow_compute(*args, **kwargs):
+            computations.append(threading.get_ident())
+            time.sleep(0.5)  # keep the run in flight while the other triggers arrive
+            return compute_co_tallies(*args, **kwargs)
+
+        barrier = threading.Barrier(self.TRIGGERS)
+
+        def trigger(_):
+            barrier.wait()
+            try:
+                return recalculate_course(self.course, self.academic_year, force=True)
+            finally:
+                connection.close()
+
+        with mock.patch("academics.attainment.compute_co_tallies", side_effect=slow_compute):
+            with ThreadPoolExecutor(max_workers=self.TRIGGERS) as pool:
+                results = list(pool.map(trigger, range(self.TRIGGERS)))
+
+        self.assertEqual(len(computations), 1)
+        self.assertEqual(AttainmentRun.objects.filter(course=self.course, skipped=False).count(), 1)
+        self.assertTrue(all(result is results[0] for result in results))
+        self.assertEqual(
+            CourseOutcomeAttainment.objects.get(course_outcome=self.course_outcome).attainment_percentage, Decimal("50.00")
+        )
+
+        # Once the run has finished, the next trigger calculates again
+        with mock.patch("academics.attainment.compute_co_tallies", side_effect=slow_compute):
+            recalculate_course(self.course, self.academic_year, force=True)
+        self.assertEqual(len(computations), 2)
+
+
+class AdvisoryLockTests(TestCase):
+    """On PostgreSQL, a caller that waited on another process's advisory lock joins only a matching run."""
+
+    @classmethod
+    def setUpTestData(cls):
+        department = Department.objects.create(name="Computer Science")
+        cls.academic_year = AcademicYear.objects.create(
+            start_date=datetime.date(2024, 6, 1), end_date=datetime.date(2025, 5, 31)
+        )
+        academic_department = AcademicDepartment.objects.create(department=department, academic_year=cls.academic_year)
+        semester = Semester.objects.create(name="1st Semester", academic_department=academic_department)
+        cls.course = Course.objects.create(name="Data Structures", code="CS201", department=department, semester=semester)
+
+    def run_behind_another_process(self, holder_run, **variant):
+        """run_coalesced while another process holds the lock and saves holder_run before releasing it."""
+        statements = []
+
+        class Cursor:
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *exc_info):
+                return False
+
+            def execute(self, sql, params):
+                statements.append(sql.split("(")[0])
+                if "pg_advisory_lock" in sql:
+                    holder_run.save()
+
+            def fetchone(self):
+                return (False,)
+
+        func = mock.Mock(return_value="recalculated")
+        fake_connection = mock.Mock(vendor="postgresql", cursor=Cursor)
+        with mock.patch.object(locks, "connection", fake_connection):
+            result = locks.run_coalesced(
+                AttainmentRun.Kind.CO, self.academic_year, func, course_obj=self.course, **variant
+            )
+        self.assertEqual(
+            statements, ["SELECT pg_try_advisory_lock", "SELECT pg_advisory_lock", "SELECT pg_advisory_unlock"]
+        )
+        return result, func.call_count
+
+    def holder_run(self, **fields):
+        now = timezone.now()
+        return AttainmentRun(
+            kind=AttainmentRun.Kind.CO, course=self.course, academic_year=self.academic_year, started_at=now,
+            finished_at=now + datetime.timedelta(seconds=1), **fields,
+        )
+
+    def test_joins_the_result_of_a_matching_run(self):
+        diff = AttainmentDiff()
+        diff.inserted[7] = Decimal("62.50")
+        run = self.holder_run(engine="sql", success_threshold=Decimal("60"), result=diff.as_dict())
+
+        result, calls = self.run_behind_another_process(run, engine="sql", success_threshold=60.0)
+        self.assertEqual(calls, 0)
+        self.assertEqual(result.inserted, {7: Decimal("62.50")})
+
+    def test_recalculates_after_a_run_of_another_variant(self):
+        variant = {"engine": "sql", "success_threshold": 60.0, "force": True}
+        for run in (
+            self.holder_run(engine="matrix", success_threshold=Decimal("60"), result=AttainmentDiff().as_dict()),
+            self.holder_run(engine="sql", success_threshold=Decimal("70"), result=AttainmentDiff().as_dict()),
+            self.holder_run(engine="sql", success_threshold=Decimal("60"), skipped=True),
+        ):
+            result, calls = self.run_behind_another_process(run, **variant)
+            self.assertEqual((result, calls), ("recalculated", 1), run)
+
+
+class JobQueueTests(TestCase):
+    """Workers retry failing jobs with backoff and reclaim the jobs of lost workers."""
+
+    def setUp(self):
+        self.task = mock.Mock(side_effect=RuntimeError("export failed"))
+        patcher = mock.patch.dict(jobs.TASKS, {"tests.export": self.task})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def make_due(self, job):
+        BackgroundJob.objects.filter(pk=job.pk).update(run_after=timezone.now())
+
+    def test_failing_job_is_retried_then_marked_failed(self):
+        job = jobs.enqueue("tests.export", {"year": 1}, max_attempts=2)
+
+        with self.assertLogs("academics.jobs", "WARNING"):
+            job = jobs.run_next_job("worker-1")
+        self.assertEqual((job.status, job.attempts), (BackgroundJob.Status.QUEUED, 1))
+        self.assertGreater(job.run_after, timezone.now())
+        self.assertIsNone(BackgroundJob.objects.get(pk=job.pk).finished_at)
+        self.assertIsNone(jobs.run_next_job("worker-1"))
+
+        self.make_due(job)
+        with self.assertLogs("academics.jobs", "ERROR"):
+            job = jobs.run_next_job("worker-1")
+        self.assertEqual((job.status, job.attempts), (BackgroundJob.Status.FAILED, 2))
+        self.assertIn("export failed", job.error)
+        self.assertIsNotNone(job.finished_at)
+        self.assertEqual(self.task.call_count, 2)
+
+    def test_lost_workers_jobs_are_reclaimed(self):
+        job = jobs.enqueue("tests.export", {"year": 1}, max_attempts=2, coalesce=True)
+        self.assertEqual(jobs.claim_next_job("worker-1"), job)
+        self.assertEqual(jobs.enqueue("tests.export", {"year": 1}, coalesce=True), job)
+
+        # The worker died: its lease runs out and nothing renews it
+        BackgroundJob.objects.filter(pk=job.pk).update(lease_expires_at=timezone.now() - datetime.timedelta(seconds=1))
+        self.assertNotEqual(jobs.enqueue("tests.export", {"year": 2}, coalesce=True), job)
+        self.assertNotEqual(jobs.enqueue("tests.export", {"year": 1}, coalesce=True), job)
+
+        with self.assertLogs("academics.jobs", "WARNING"):
+            reclaimed = jobs.claim_next_job("worker-2")
+        self.assertEqual((reclaimed, reclaimed.attempts, reclaimed.worker), (job, 2, "worker-2"))
+        self.assertGreater(reclaimed.lease_expires_at, timezone.now())
+
+        # Out of attempts, a second loss fails the job
+        BackgroundJob.objects.filter(pk=job.pk).update(lease_expires_at=timezone.now() - datetime.timedelta(seconds=1))
+        with self.assertLogs("academics.jobs", "WARNING"):
+            self.assertEqual(jobs.reclaim_lost_jobs(), 1)
+        job.refresh_from_db()
+        self.assertEqual(job.status, BackgroundJob.Status.FAILED)
+        self.assertIsNotNone(job.finished_at)
+
+
+class JobVisibilityTests(TestCase):
+    """A coalesced attainment job is visible to everyone who may calculate its scope."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.department = Department.objects.create(name="Computer Science")
+        other_department = Department.objects.create(name="Mechanical")
+        academic_year = AcademicYear.objects.create(start_date=datetime.date(2024, 6, 1), end_date=datetime.date(2025, 5, 31))
+        academic_department = AcademicDepartment.objects.create(department=cls.department, academic_year=academic_year)
+        semester = Semester.objects.create(name="1st Semester", academic_department=academic_department)
+        course = Course.objects.create(name="Data Structures", code="CS201", department=cls.department, semester=semester)
+        admin_user = User.objects.create(username="admin")
+        UserProfile.objects.create(user=admin_user, role="ADMIN", department=cls.department)
+        cls.hod = User.objects.create(username="hod")
+        UserProfile.objects.create(user=cls.hod, role="HOD", department=cls.department)
+        cls.other_hod = User.objects.create(username="other_hod")
+        UserProfile.objects.create(user=cls.other_hod, role="HOD", department=other_department)
+        cls.job = jobs.enqueue(
+            "attainment.co_by_course",
+            {"course_id": course.pk, "academic_year_id": academic_year.pk, "force": False},
+            user=admin_user,
+            coalesce=True,
+        )
+
+    def test_hod_sees_a_job_of_their_department_queued_by_an_admin(self):
+        self.client.force_login(self.hod)
+        self.assertEqual(self.client.get(reverse("job_status_api", args=[self.job.pk])).status_code, 200)
+
+        self.client.force_login(self.other_hod)
+        self.assertEqual(self.client.get(reverse("job_status_api", args=[self.job.pk])).status_code, 404)
+
+
+class StudentMarkEntryTests(TestCase):
+    """Mark entry lists the course roster and loads it in a fixed number of queries."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.department = Department.objects.create(name="Computer Science")
+        academic_year = AcademicYear.objects.create(start_date=datetime.date(2024, 6, 1), end_date=datetime.date(2025, 5, 31))
+        academic_department = AcademicDepartment.objects.create(department=cls.department, academic_year=academic_year)
+        semester = Semester.objects.create(name="1st Semester", academic_department=academic_department)
+        cls.course = Course.objects.create(name="Data Structures", code="CS201", department=cls.department, semester=semester)
+        cls.assessment = Assessment.objects.create(
+            name="Midterm", course=cls.course, academic_year=academic_year, max_marks=10, date=datetime.date(2025, 1, 1)
+        )
+        cls.hod = User.objects.create(username="hod")
+        UserProfile.objects.create(user=cls.hod, role="HOD", department=cls.department)
+        cls.enrolled = cls.add_students("enrolled", 5, enroll=True)
+        cls.add_students("other", 5)
+        StudentMark.objects.create(assessment=cls.assessment, student=cls.enrolled[0].user, marks_obtained=4)
+
+    @classmethod
+    def add_students(cls, prefix, count, enroll=False):
+        start = UserProfile.objects.filter(user__username__startswith=prefix).count()
+        students = [
+            UserProfile.objects.create(user=User.objects.create(username=f"{prefix}{i}"), role="STUDENT", department=cls.department)
+            for i in range(start, start + count)
+        ]
+        if enroll:
+            cls.course.students.add(*students)
+        return students
+
+    def get_entry_page(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("student_mark_entry", args=[self.assessment.pk]))
+        self.assertEqual(response.status_code, 200)
+        return response, len(queries)
+
+    def test_lists_only_the_roster_in_a_fixed_number_of_queries(self):
+        self.client.force_login(self.hod)
+        response, queries = self.get_entry_page()
+        forms = response.context["formset"].forms
+        self.assertEqual([form.student_user for form in forms], [student.user for student in self.enrolled])
+        self.assertEqual(forms[0].initial["marks_obtained"], Decimal("4"))
+
+        self.add_students("enrolled", 20, enroll=True)
+        self.add_students("other", 50)
+        response, more_queries = self.get_entry_page()
+        self.assertEqual(len(response.context["formset"].forms), 25)
+        self.assertEqual(more_queries, queries)
+
+    def test_rejects_students_outside_the_roster(self):
+        self.client.force_login(self.hod)
+        outsider = User.objects.get(username="other0")
+        response = self.client.post(
+            reverse("student_mark_entry", args=[self.assessment.pk]),
+            {
+                "marks-TOTAL_FORMS": "2",
+                "marks-INITIAL_FORMS": "2",
+                "marks-0-student": self.enrolled[0].user.pk,
+                "marks-0-marks_obtained": "9",
+                "marks-1-student": outsider.pk,
+                "marks-1-marks_obtained": "7",
+            },
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context["formset"].forms[1].errors)
+        self.assertFalse(StudentMark.objects.filter(student=outsider).exists())
+        self.assertEqual(StudentMark.objects.get(student=self.enrolled[0].user).marks_obtained, Decimal("4"))
+
+    def test_saves_the_roster_in_a_fixed_number_of_queries(self):
+        self.client.force_login(self.hod)
+
+        def post_marks(marks):
+            """Posts the same marks for the whole roster; returns the queries the request took."""
+            students = list(self.course.students.values_list("user", flat=True).order_by("user"))
+            data = {"marks-TOTAL_FORMS": str(len(students)), "marks-INITIAL_FORMS": str(len(students))}
+            for i, student_id in enumerate(students):
+                data[f"marks-{i}-student"] = student_id
+                data[f"marks-{i}-marks_obtained"] = str(marks)
+            connection.queries_log.clear()
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.post(reverse("student_mark_entry", args=[self.assessment.pk]), data)
+            self.assertEqual(response.status_code, 302)
+            return len(queries)
+
+        post_marks(5)
+        queries = post_marks(6)
+        self.add_students("enrolled", 40, enroll=True)
+        post_marks(7)
+        self.assertEqual(post_marks(8), queries)
+        self.assertEqual(StudentMark.objects.filter(assessment=self.assessment, marks_obtained=8).count(), 45)
+
+    def test_saves_only_changed_marks_in_one_upsert(self):
+        first, second, third = (student.user.pk for student in self.enrolled[:3])
+        with CaptureQueriesContext(connection) as queries:
+            diff = save_assessment_marks(self.assessment, {first: Decimal("4.00"), second: 6, third: 7})
+        self.assertEqual((len(diff.inserted), len(diff.updated), diff.unchanged), (2, 0, 1))
+        upserts = [query for query in queries.captured_queries if query["sql"].startswith('INSERT INTO "academics_studentmark"')]
+        self.assertEqual(len(upserts), 1)
+
+        diff = save_assessment_marks(self.assessment, {first: 4, second: 8, third: 7})
+        self.assertEqual(diff.updated, {second: (Decimal("6"), Decimal("8"))})
+        self.assertEqual(diff.unchanged, 2)
+        self.assertEqual(StudentMark.objects.get(assessment=self.assessment, student_id=second).marks_obtained, 8)
+
+    def test_grid_api_validates_every_row_before_saving(self):
+        self.client.force_login(self.hod)
+        url = reverse("student_marks_api", args=[self.assessment.pk])
+        first, second = (student.user.pk for student in self.enrolled[:2])
+        outsider = User.objects.get(username="other0").pk
+
+        response = self.client.post(
+            url,
+            [[first, 9], [outsider, 5], [second, 11], [second, 3], [first + second + outsider, "x"], "bad"],
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            [(error["row"], error["error"]) for error in response.json()["errors"]],
+            [
+                (1, "This student is not enrolled in the course."),
+                (2, "Marks must be between 0 and 10."),
+                (3, "This student appears more than once."),
+                (4, "Marks must be a number."),
+                (5, "Each row must be [student_id, marks]."),
+            ],
+        )
+        self.assertEqual(StudentMark.objects.get(student_id=first).marks_obtained, Decimal("4"))
+
+        response = self.client.post(url, [[first, 9.5], [second, "7"], [self.enrolled[2].user.pk, None]], content_type="application/json")
+        self.assertEqual(response.json(), {"inserted": 1, "updated": 1, "unchanged": 0})
+        self.assertEqual(StudentMark.objects.get(student_id=first).marks_obtained, Decimal("9.5"))
+
+    def test_mark_sheet_import_matches_usernames_and_roll_numbers(self):
+        self.client.force_login(self.hod)
+        url = reverse("student_marks_import", args=[self.assessment.pk])
+        first, second, third = self.enrolled[:3]
+        second.roll_number = "21CS002"
+        second.save()
+
+        def upload(*rows):
+            sheet = "Roll No.,Name,Marks\r\n" + "".join(f"{student},x,{value}\r\n" for student, value in rows)
+            return self.client.post(url, {"file": SimpleUploadedFile("marks.csv", sheet.encode("utf-8-sig"))})
+
+        # Two-row chunks, so a duplicate is caught in a later chunk than its first row
+        with tempfile.TemporaryDirectory() as media_root, override_settings(MEDIA_ROOT=media_root), \
+                mock.patch.object(marks, "IMPORT_CHUNK_SIZE", 2):
+            upload(("ENROLLED0", 9), ("other0", 5), ("21cs002", 11), ("enrolled0", 3), ("", 1))
+            self.assertEqual(StudentMark.objects.get(student=first.user).marks_obtained, Decimal("4"))
+            report = self.client.get(reverse("student_marks_import_report", args=[self.assessment.pk]))
+            self.assertEqual(
+                b"".join(report.streaming_content).decode().splitlines(),
+                [
+                    "line,student,marks,error",
+                    "3,other0,5,No student in the course has this username or roll number.",
+                    "4,21cs002,11,Marks must be between 0 and 10.",
+                    "5,enrolled0,3,This student appears more than once.",
+                    "6,,1,The student is missing.",
+                ],
+            )
+
+            upload(("enrolled0", 9), ("21CS002", 7), (third.user.username, ""))
+        self.assertEqual(StudentMark.objects.get(student=first.user).marks_obtained, Decimal("9"))
+        self.assertEqual(StudentMark.objects.get(student=second.user).marks_obtained, Decimal("7"))
+        self.assertFalse(StudentMark.objects.filter(student=third.user).exists())
+        self.assertEqual(self.client.get(reverse("student_marks_import_report", args=[self.assessment.pk])).status_code, 404)
+
+    def test_autosave_rejects_edits_of_a_stale_version(self):
+        self.client.force_login(self.hod)
+        first, second = (student.user.pk for student in self.enrolled[:2])
+
+        def autosave(student, marks, version):
+            return self.client.patch(
+                reverse("student_mark_autosave", args=[self.assessment.pk, student]),
+                {"marks": marks, "version": version},
+                content_type="application/json",
+            )
+
+        response = autosave(first, 6, 1)
+        self.assertEqual(response.json(), {"student": first, "marks": "6.00", "version": 2})
+        response = autosave(first, 7, 1)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual((response.json()["marks"], response.json()["version"]), ("6.00", 2))
+        # Resending a mark that was already saved is not a conflict
+        self.assertEqual(autosave(first, 6, 1).status_code, 200)
+
+        response = self.client.patch(
+            reverse("student_marks_api", args=[self.assessment.pk]),
+            [[first, 8, 2], [second, 5, 0], [second, 3, 0]],
+            content_type="application/json",
+        )
+        self.assertEqual(response.json()["saved"], [[first, "8.00", 3], [second, "5.00", 1]])
+        self.assertEqual([error["row"] for error in response.json()["errors"]], [2])
+        self.assertEqual(StudentMark.objects.get(student_id=first).version, 3)
+
+        # Payload-level errors come back as JSON too
+        with override_settings(MARKS_AUTOSAVE_MAX_CELLS=0):
+            response = autosave(second, 6, 1)
+        self.assertEqual((response.status_code, response.json()), (400, {"error": "Send at most 0 cells per request."}))
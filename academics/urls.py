@@ -67,10 +67,24 @@ urlpatterns = [
 
     # Student Mark Entry URL (NEW)
     path('assessments/<int:assessment_pk>/marks/', views.student_mark_entry, name='student_mark_entry'),
+    path('api/assessments/<int:assessment_pk>/marks/', views.student_marks_api, name='student_marks_api'),
+    path('api/assessments/<int:assessment_pk>/marks/<int:student_pk>/', views.student_mark_autosave, name='student_mark_autosave'),
+    path('assessments/<int:assessment_pk>/marks/import/', views.student_marks_import, name='student_marks_import'),
+    path('assessments/<int:assessment_pk>/marks/import/errors/', views.student_marks_import_report, name='student_marks_import_report'),
 
     # Attainment Calculation URL (NEW)
     path('calculate-attainment/', views.calculate_attainment_view, name='calculate_attainment_view'),
 
+    # Threshold Sweep URLs
+    path('attainment-thresholds/', views.attainment_threshold_sweep_view, name='attainment_threshold_sweep_view'),
+    path('api/attainment-thresholds/', views.attainment_threshold_sweep_api, name='attainment_threshold_sweep_api'),
+    path('attainment-trends/', views.attainment_trends_view, name='attainment_trends_view'),
+    path('api/attainment-trends/', views.attainment_trends_api, name='attainment_trends_api'),
+
+    # Background Job Status URLs
+    path('jobs/<int:job_id>/', views.job_status, name='job_status'),
+    path('api/jobs/<int:job_id>/', views.job_status_api, name='job_status_api'),
+
     # Attainment Display URLs (NEW)
     path('co-attainment-report/', views.co_attainment_report_list, name='co_attainment_report_list'),
     path('po-attainment-report/', views.po_attainment_report_list, name='po_attainment_report_list'),
@@ -80,6 +94,7 @@ urlpatterns = [
     path('my-attainment/', views.student_personal_attainment_view, name='student_personal_attainment_view'), # NEW
 
     path('export/co-attainment-csv/', views.export_co_attainment_csv, name='export_co_attainment_csv'), # NEW
+    path('export/student-po-attainment-csv/', views.export_student_po_attainment_csv, name='export_student_po_attainment_csv'),
 
     path('faculty/create-student/', views.create_student_by_faculty, name='faculty_create_student'),
 
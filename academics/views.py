@@ -6,6 +6,10 @@ from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib import messages  # For displaying feedback messages
 from django.views.generic import View  # For class-based views if preferred
 from django.http import JsonResponse # <-- Add this import at the top
+from django.http import FileResponse, Http404
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.views.decorators.http import require_http_methods
 from .forms import (
     AcademicYearForm,
     DepartmentForm,
@@ -18,7 +22,8 @@ from .forms import (
     StudentMarkFormSet,
     AcademicDepartmentForm,
     SemesterForm, CoursePlanForm, CourseObjectiveFormSet, WeeklyLessonPlanFormSet, CIAComponentFormSet, StudentCreationForm, RubricForm, RubricCriterionFormSet, AssignmentForm, RubricScore,
-    SubmissionForm, GradingForm, RubricScoreForm, StudentUpdateByFacultyForm, EnrollStudentForm, BulkEnrollmentForm, CourseOutcomeFormSet
+    SubmissionForm, GradingForm, RubricScoreForm, StudentUpdateByFacultyForm, EnrollStudentForm, BulkEnrollmentForm, CourseOutcomeFormSet,
+    StudentMarkImportForm
 )  # Form
 
 # Import models and forms
@@ -36,15 +41,32 @@ from .models import (
     CourseOutcomeAttainment,
     ProgramOutcomeAttainment,
     AcademicDepartment,
-    Semester, CoursePlan, CourseObjective, WeeklyLessonPlan, CIAComponent, Rubric, RubricCriterion, Assignment, Submission
+    Semester, CoursePlan, CourseObjective, WeeklyLessonPlan, CIAComponent, Rubric, RubricCriterion, Assignment, Submission,
+    BackgroundJob,
+    StudentPOAttainment,
 )
 from django.db.models import Sum, F, ExpressionWrapper, DecimalField
 from django.db import transaction  # For atomic operations
 from django.contrib.auth.models import User  # <--- ADD THIS LINE
 from users.models import UserProfile, UserRole  # Import UserProfile from the users app
 import csv  # Import the csv module for CSV export
+import json
+import tempfile
+import uuid
+from decimal import Decimal
 from django.http import HttpResponse  # Import HttpResponse for serving files
 from django.db.models import Q
+from .attainment import (
+    department_trends,
+    recalculate_course,
+    recalculate_department_co,
+    recalculate_department_po,
+    student_co_scores,
+    sweep_co_attainment,
+)
+from .attainment.trends import DEFAULT_TREND_YEARS
+from .jobs import enqueue
+from .marks import import_mark_sheet, save_assessment_marks, validate_autosave_cells, validate_mark_rows
 
 
 
@@ -1376,221 +1398,318 @@ def assessment_delete(request, pk):
 
 # --- Student Mark Entry View ---
 
+def _can_enter_marks(user, assessment):
+    """Admins and HODs enter marks for any assessment; faculty only for the courses they teach."""
+    if is_faculty(user) and not is_admin_or_hod(user):
+        return user.profile.taught_courses.filter(pk=assessment.course_id).exists()
+    return True
+
+
+def _roster(assessment):
+    """The Users enrolled in the assessment's course."""
+    return User.objects.filter(profile__enrolled_courses=assessment.course_id)
+
+
 
 @login_required
 @user_passes_test(is_admin_or_hod_or_faculty, login_url="/accounts/login/")
 def student_mark_entry(request, assessment_pk):
-    assessment = get_object_or_404(Assessment, pk=assessment_pk)
-
-    # Permission check (existing code)
-    if is_faculty(request.user) and not is_admin_or_hod(request.user):
-        if assessment.course not in request.user.profile.taught_courses.all():
-            messages.error(
-                request,
-                "You do not have permission to enter marks for this assessment.",
-            )
-            return redirect("assessment_list")
-
-    # Get all students (users with the 'STUDENT' role) for marks entry for now.
-    enrolled_students = User.objects.filter(profile__role="STUDENT").order_by(
-        "username"
-    )
+    assessment = get_object_or_404(Assessment.objects.select_related("course", "assessment_type"), pk=assessment_pk)
 
-    # Initialize the formset (for both GET and POST)
-    form_data = []
-    for student in enrolled_students:
-        existing_mark = StudentMark.objects.filter(
-            assessment=assessment, student=student
-        ).first()
-        form_data.append(
-            {
-                "id": existing_mark.id if existing_mark else None,
-                "student": student.id,
-                "marks_obtained": existing_mark.marks_obtained if existing_mark else "",
-            }
+    if not _can_enter_marks(request.user, assessment):
+        messages.error(
+            request,
+            "You do not have permission to enter marks for this assessment.",
         )
+        return redirect("assessment_list")
 
-    MarkFormSet = StudentMarkFormSet(initial=form_data, prefix="marks")
+    # The course roster and the assessment's existing marks, one query each
+    # however many students the institution has
+    roster = {user.pk: user for user in _roster(assessment).order_by("username")}
 
     if request.method == "POST":
-        formset = StudentMarkFormSet(
-            request.POST, prefix="marks"
-        )  # Re-initialize with POST data
+        formset = StudentMarkFormSet(request.POST, prefix="marks", form_kwargs={"roster": roster})
         if formset.is_valid():
-            # Save the formset (existing custom loop)
-            for form in formset:
-                marks_obtained = form.cleaned_data.get("marks_obtained")
-                student = form.cleaned_data.get("student")
-
-                if student and marks_obtained is not None:
-                    mark_instance = StudentMark.objects.filter(
-                        assessment=assessment, student=student
-                    ).first()
-
-                    if mark_instance:
-                        mark_instance.marks_obtained = marks_obtained
-                        mark_instance.save()
-                    else:
-                        StudentMark.objects.create(
-                            assessment=assessment,
-                            student=student,
-                            marks_obtained=marks_obtained,
-                        )
-            messages.success(
-                request, f"Student marks for {assessment.name} updated successfully!"
+            diff = save_assessment_marks(
+                assessment,
+                {
+                    form.cleaned_data["student"].pk: form.cleaned_data["marks_obtained"]
+                    for form in formset
+                    if form.cleaned_data.get("student") and form.cleaned_data.get("marks_obtained") is not None
+                },
             )
+            messages.success(request, f"Student marks for {assessment.name} updated successfully! {diff}.")
             return redirect("assessment_list")
-        else:
-            # --- DEBUGGING LINES START ---
-            print("====================================")
-            print("Student Mark Formset is NOT valid!")
-            print(
-                "Overall Formset Errors:", formset.non_form_errors()
-            )  # General formset errors
-            for i, form in enumerate(formset):
-                if form.errors:  # Check if individual form has errors
-                    # Access the student directly from the current form being processed for better context
-                    student_obj_for_error = None
-                    try:
-                        # Attempt to get the student object based on submitted data or instance
-                        if "student" in form.cleaned_data:
-                            student_obj_for_error = User.objects.get(
-                                pk=form.cleaned_data["student"].pk
-                            )
-                        elif form.instance and form.instance.student:
-                            student_obj_for_error = form.instance.student
-                    except User.DoesNotExist:
-                        pass  # Ignore if student not found (shouldn't happen)
-
-                    print(
-                        f"Form {i} Errors (for Student: {student_obj_for_error.username if student_obj_for_error else 'N/A'}):",
-                        form.errors,
-                    )
-            print("====================================")
-            # --- DEBUGGING LINES END ---
-            messages.error(request, "Please correct the errors in the marks form.")
+        messages.error(request, "Please correct the errors in the marks form.")
     else:
-        # For GET requests, re-initialize the formset for display
-        formset = StudentMarkFormSet(request.POST, prefix="marks")
+        existing_marks = {
+            mark.student_id: mark
+            for mark in StudentMark.objects.filter(assessment=assessment).only("pk", "student_id", "marks_obtained")
+            if mark.student_id in roster
+        }
+        formset = StudentMarkFormSet(
+            initial=[
+                {
+                    "id": existing_marks[student_id].pk if student_id in existing_marks else None,
+                    "student": student_id,
+                    "marks_obtained": existing_marks[student_id].marks_obtained if student_id in existing_marks else "",
+                }
+                for student_id in roster
+            ],
+            prefix="marks",
+            form_kwargs={"roster": roster},
+        )
 
     context = {
         "assessment": assessment,
-        "formset": MarkFormSet,  # Pass the initialized formset (either empty or with POST data)
-        "enrolled_students": enrolled_students,
+        "formset": formset,
+        "enrolled_students": roster.values(),
+        "import_form": StudentMarkImportForm(),
+        "import_report": str(assessment.pk) in request.session.get(MARK_IMPORT_REPORTS, {}),
     }
     return render(request, "academics/student_mark_entry_form.html", context)
 
 
-# --- Attainment Calculation Engine ---
+# Session key: {assessment pk: storage name of the error report of its last failed import}
+MARK_IMPORT_REPORTS = "mark_import_reports"
 
-# UPDATE a single line in this function signature
-def calculate_co_attainment_for_course(course_obj, academic_year_obj, success_threshold=60.0):
+
+def _replace_import_report(request, assessment, name=None):
+    """Records the assessment's import error report in the session, deleting the previous one."""
+    reports = request.session.get(MARK_IMPORT_REPORTS, {})
+    previous = reports.pop(str(assessment.pk), None)
+    if previous is not None:
+        default_storage.delete(previous)
+    if name is not None:
+        reports[str(assessment.pk)] = name
+    request.session[MARK_IMPORT_REPORTS] = reports
+
+
+@login_required
+@user_passes_test(is_admin_or_hod_or_faculty, login_url="/accounts/login/")
+@require_http_methods(["POST"])
+def student_marks_import(request, assessment_pk):
     """
-    Calculates the attainment for each Course Outcome (CO) of a given course
-    for a specific academic year.
+    Imports a CSV or XLSX mark sheet for an assessment. When any row is invalid
+    nothing is saved, and a CSV report of the invalid rows can be downloaded
+    from the mark entry page.
     """
-    course_outcomes = CourseOutcome.objects.filter(course=course_obj)
+    assessment = get_object_or_404(Assessment, pk=assessment_pk)
+    if not _can_enter_marks(request.user, assessment):
+        messages.error(request, "You do not have permission to enter marks for this assessment.")
+        return redirect("assessment_list")
 
-    for co in course_outcomes:
-        # Find all assignments that assess this specific CO for the given academic year
-        assignments_for_co = Assignment.objects.filter(
-            assesses_cos=co,
-            course__semester__academic_department__academic_year=academic_year_obj
-        )
-        
-        if not assignments_for_co.exists():
-            continue
-
-        # Get all graded submissions for these assignments
-        submissions = Submission.objects.filter(
-            assignment__in=assignments_for_co,
-            marks_obtained__isnull=False
-        ).values('student').annotate(
-            total_marks=Sum('marks_obtained'),
-            max_marks=Sum('assignment__max_marks')
+    form = StudentMarkImportForm(request.POST, request.FILES)
+    if not form.is_valid():
+        messages.error(request, " ".join(form.errors["file"]))
+        return redirect("student_mark_entry", assessment_pk=assessment.pk)
+
+    # The report spills to disk past 1 MB, so a large sheet of errors is not held in memory
+    with tempfile.SpooledTemporaryFile(max_size=2 ** 20, mode="w+", newline="") as report:
+        try:
+            result = import_mark_sheet(
+                assessment,
+                form.cleaned_data["file"],
+                _roster(assessment).values_list("pk", "username", "profile__roll_number").iterator(),
+                report,
+            )
+        except ValueError as error:
+            messages.error(request, str(error))
+            return redirect("student_mark_entry", assessment_pk=assessment.pk)
+
+        if result.diff is not None:
+            _replace_import_report(request, assessment)
+            messages.success(request, f"Student marks for {assessment.name} imported successfully! {result}.")
+            return redirect("assessment_list")
+
+        report.seek(0)
+        name = default_storage.save(f"mark_import_reports/{uuid.uuid4().hex}.csv", File(report))
+    _replace_import_report(request, assessment, name)
+    messages.error(request, f"No marks were saved: {result}. Download the error report, fix those rows and upload the sheet again.")
+    return redirect("student_mark_entry", assessment_pk=assessment.pk)
+
+
+@login_required
+@user_passes_test(is_admin_or_hod_or_faculty, login_url="/accounts/login/")
+def student_marks_import_report(request, assessment_pk):
+    """Downloads the error report of the user's last failed mark sheet import for an assessment."""
+    assessment = get_object_or_404(Assessment, pk=assessment_pk)
+    if not _can_enter_marks(request.user, assessment):
+        messages.error(request, "You do not have permission to enter marks for this assessment.")
+        return redirect("assessment_list")
+
+    name = request.session.get(MARK_IMPORT_REPORTS, {}).get(str(assessment.pk))
+    if name is None or not default_storage.exists(name):
+        raise Http404("There is no import error report for this assessment.")
+    return FileResponse(
+        default_storage.open(name, "rb"),
+        as_attachment=True,
+        filename=f"assessment_{assessment.pk}_import_errors.csv",
+        content_type="text/csv",
+    )
+
+
+@login_required
+@user_passes_test(is_admin_or_hod_or_faculty, login_url="/accounts/login/")
+@require_http_methods(["GET", "POST", "PATCH"])
+def student_marks_api(request, assessment_pk):
+    """
+    Mark entry as a compact grid. GET returns the course roster as
+    {"max_marks", "students": [[student_id, username, marks, version], ...]}
+    (version 0 where there is no mark). POST takes a JSON array of
+    [student_id, marks] rows; when every row is valid the marks are saved and the
+    inserted/updated/unchanged counts returned, otherwise nothing is saved and
+    the response lists the errors per row with status 400.
+
+    PATCH autosaves edited cells: a JSON array of up to MARKS_AUTOSAVE_MAX_CELLS
+    [student_id, marks, version] cells, each saved on its own. The response lists
+    the "saved" cells as [student_id, marks, new version], the "conflicts" whose
+    stored mark moved past the cell's version as [student_id, stored marks,
+    stored version], and the "errors" per cell.
+    """
+    assessment = get_object_or_404(Assessment, pk=assessment_pk)
+    if not _can_enter_marks(request.user, assessment):
+        return JsonResponse({"error": "You do not have permission to enter marks for this assessment."}, status=403)
+
+    if request.method == "GET":
+        marks = {
+            pk: (marks_obtained, version)
+            for pk, marks_obtained, version in StudentMark.objects.filter(assessment=assessment).values_list(
+                "student_id", "marks_obtained", "version"
+            )
+        }
+        return JsonResponse({
+            "assessment": assessment.pk,
+            "max_marks": str(assessment.max_marks),
+            "students": [
+                [pk, username, _mark_text(stored), version]
+                for pk, username in _roster(assessment).order_by("username").values_list("pk", "username")
+                for stored, version in [marks.get(pk, (None, 0))]
+            ],
+        })
+
+    try:
+        rows = json.loads(request.body)
+    except ValueError:
+        return JsonResponse({"error": "The request body is not valid JSON."}, status=400)
+    if request.method == "PATCH":
+        try:
+            marks, diff, errors = _autosave_marks(assessment, rows)
+        except ValueError as error:
+            return JsonResponse({"error": str(error)}, status=400)
+        return JsonResponse({
+            "saved": [[pk, _mark_text(marks[pk]), version] for pk, version in diff.versions.items()],
+            "conflicts": [[pk, _mark_text(stored), version] for pk, (stored, version) in diff.conflicts.items()],
+            "errors": errors,
+        })
+    try:
+        marks, errors = validate_mark_rows(
+            rows, set(_roster(assessment).values_list("pk", flat=True)), assessment.max_marks
         )
+    except ValueError as error:
+        return JsonResponse({"error": str(error)}, status=400)
+    if errors:
+        return JsonResponse({"errors": errors}, status=400)
 
-        if not submissions:
-            continue
+    diff = save_assessment_marks(assessment, marks)
+    return JsonResponse({"inserted": len(diff.inserted), "updated": len(diff.updated), "unchanged": diff.unchanged})
 
-        students_above_threshold = 0
-        total_students_with_grades = submissions.count()
 
-        for sub in submissions:
-            if sub['max_marks'] > 0:
-                percentage = (sub['total_marks'] / sub['max_marks']) * 100
-                if percentage >= success_threshold:
-                    students_above_threshold += 1
+def _mark_text(marks):
+    """Marks as the JSON APIs send them: text with the stored number of decimal places."""
+    if marks is None:
+        return None
+    places = StudentMark._meta.get_field("marks_obtained").decimal_places
+    return str(Decimal(marks).quantize(Decimal(1).scaleb(-places)))
 
-        if total_students_with_grades > 0:
-            attainment_percentage = (students_above_threshold / total_students_with_grades) * 100
-        else:
-            attainment_percentage = 0
 
-        # THIS IS THE FIX: Pass the academic_year_obj when creating the record
-        CourseOutcomeAttainment.objects.update_or_create(
-            course_outcome=co,
-            academic_year=academic_year_obj,
-            defaults={'attainment_percentage': attainment_percentage}
+def _autosave_marks(assessment, cells):
+    """
+    Validates and saves autosave cells, checking roster membership only for the
+    students they name. Returns (marks, diff, errors); raises ValueError for a
+    malformed payload.
+    """
+    marks, versions, errors = validate_autosave_cells(
+        cells,
+        lambda student_ids: set(_roster(assessment).filter(pk__in=student_ids).values_list("pk", flat=True)),
+        assessment.max_marks,
+    )
+    return marks, save_assessment_marks(assessment, marks, versions), errors
+
+
+@login_required
+@user_passes_test(is_admin_or_hod_or_faculty, login_url="/accounts/login/")
+@require_http_methods(["PATCH"])
+def student_mark_autosave(request, assessment_pk, student_pk):
+    """
+    Autosaves one student's mark. Takes {"marks", "version"}, version being that
+    of the stored mark the edit started from (0 for none), and returns
+    {"student", "marks", "version"} with the new version; when the stored mark
+    has moved on since, nothing is saved and the response carries the stored
+    marks and version with status 409.
+    """
+    assessment = get_object_or_404(Assessment, pk=assessment_pk)
+    if not _can_enter_marks(request.user, assessment):
+        return JsonResponse({"error": "You do not have permission to enter marks for this assessment."}, status=403)
+
+    try:
+        cell = json.loads(request.body)
+    except ValueError:
+        return JsonResponse({"error": "The request body is not valid JSON."}, status=400)
+    if not isinstance(cell, dict):
+        return JsonResponse({"error": "Send a JSON object with marks and version."}, status=400)
+    try:
+        marks, diff, errors = _autosave_marks(assessment, [[student_pk, cell.get("marks"), cell.get("version")]])
+    except ValueError as error:
+        return JsonResponse({"error": str(error)}, status=400)
+    if errors:
+        return JsonResponse({"error": errors[0]["error"]}, status=400)
+    if student_pk in diff.conflicts:
+        stored, version = diff.conflicts[student_pk]
+        return JsonResponse(
+            {
+                "error": "This mark was changed by someone else since you loaded it.",
+                "student": student_pk,
+                "marks": _mark_text(stored),
+                "version": version,
+            },
+            status=409,
         )
-    return True
+    return JsonResponse({"student": student_pk, "marks": _mark_text(marks[student_pk]), "version": diff.versions[student_pk]})
+
+
+# --- Attainment Calculation Engine ---
+
+def calculate_co_attainment_for_course(course_obj, academic_year_obj, success_threshold=60.0, force=False, user=None):
+    """
+    Calculates the attainment for each Course Outcome (CO) of a given course
+    for a specific academic year. Returns an AttainmentDiff of the saved rows,
+    or None when the course's marks and mappings are unchanged since the last
+    run (pass force=True to recalculate anyway).
+    """
+    return recalculate_course(
+        course_obj, academic_year_obj, success_threshold=success_threshold, force=force, user=user
+    )
+
+
+def calculate_co_attainment_for_department(department_obj, academic_year_obj, success_threshold=60.0, user=None):
+    """
+    Calculates the attainment for every Course Outcome (CO) of every course in a
+    department for a specific academic year in one batch. Returns an
+    AttainmentDiff of the saved rows.
+    """
+    return recalculate_department_co(
+        department_obj, academic_year_obj, success_threshold=success_threshold, user=user
+    )
 
 
 # UPDATE a single line in this function signature
-def calculate_po_attainment_for_department(department_obj, academic_year_obj):
+def calculate_po_attainment_for_department(department_obj, academic_year_obj, user=None):
     """
     Calculates the attainment for each Program Outcome (PO) of a given department
-    for a specific academic year.
+    for a specific academic year. Returns an AttainmentDiff of the saved rows.
     """
-    program_outcomes = ProgramOutcome.objects.filter(department=department_obj)
-
-    for po in program_outcomes:
-        print(f"[DEBUG] Processing PO: {po.code}")
-        total_weighted_attainment = 0
-        total_weight = 0
-        # Initialize attainment_percentage for each PO to avoid UnboundLocalError
-        attainment_percentage = 0  # Default value in case no valid calculations occur
-
-        # Find all COs in this department that are mapped to this PO
-        mappings = COPOMapping.objects.filter(
-            program_outcome=po,
-            course_outcome__course__department=department_obj,
-            course_outcome__attainments__academic_year=academic_year_obj # Filter by year
-        ).prefetch_related('course_outcome__attainments')
-
-        print(f"[DEBUG] Total COPOMappings found for PO {po.code}: {mappings.count()}")
-
-        for mapping in mappings:
-            print(f"[DEBUG] Attempting to get attainment for CO: {mapping.course_outcome.code}")
-            try:
-                # Get the attainment for the specific academic year
-                attainment_qs = mapping.course_outcome.attainments.filter(academic_year=academic_year_obj)
-                if attainment_qs.exists():
-                    attainment = attainment_qs.first()
-                    print(f"[DEBUG] Attainment found: {attainment.attainment_percentage}%")
-                    if attainment.attainment_percentage is not None:
-                        weight = mapping.correlation_level
-                        total_weighted_attainment += (attainment.attainment_percentage * weight)
-                        total_weight += weight
-                    else:
-                        print(f"[DEBUG] Skipping: attainment percentage is None for CO {mapping.course_outcome.code}")
-            except CourseOutcomeAttainment.DoesNotExist:
-                continue
-
-        if total_weight > 0:
-            attainment_percentage = total_weighted_attainment / total_weight # Calculate first
-            print(f"[DEBUG] Final PO attainment % for {po.code}: {attainment_percentage:.2f}%") # Then print
-        else:
-            attainment_percentage = 0
-            print(f"[DEBUG] No valid mappings with attainment. PO attainment for {po.code} set to 0.00%")
-
-        # THIS IS THE FIX: Pass the academic_year_obj when creating the record
-        ProgramOutcomeAttainment.objects.update_or_create(
-            program_outcome=po,
-            academic_year=academic_year_obj,
-            defaults={'attainment_percentage': attainment_percentage}
-        )
-    return True
+    return recalculate_department_po(department_obj, academic_year_obj, user=user)
 
 
 # UPDATE the calls to the helper functions in this main view
@@ -1598,12 +1717,7 @@ def calculate_po_attainment_for_department(department_obj, academic_year_obj):
 @user_passes_test(is_admin_or_hod)
 def calculate_attainment_view(request):
     # Scope the dropdowns based on the user's role
-    if is_hod(request.user):
-        departments = Department.objects.filter(pk=request.user.profile.department.pk)
-        courses = Course.objects.filter(department__in=departments)
-    else: # Admin
-        departments = Department.objects.all()
-        courses = Course.objects.all()
+    departments, courses = _attainment_scope(request.user)
     
     academic_years = AcademicYear.objects.all().order_by("-start_date")
 
@@ -1614,10 +1728,20 @@ def calculate_attainment_view(request):
             course_id = request.POST.get("co_course")
             academic_year_id = request.POST.get("co_academic_year")
             if course_id and academic_year_id:
-                course_obj = get_object_or_404(Course, pk=course_id)
+                course_obj = get_object_or_404(courses, pk=course_id)
                 academic_year_obj = get_object_or_404(AcademicYear, pk=academic_year_id)
-                calculate_co_attainment_for_course(course_obj, academic_year_obj)
-                messages.success(request, f"CO Attainment calculated for {course_obj.code} in {academic_year_obj}!")
+                job = enqueue(
+                    "attainment.co_by_course",
+                    {
+                        "course_id": course_obj.pk,
+                        "academic_year_id": academic_year_obj.pk,
+                        "force": request.POST.get("co_force") == "on",
+                    },
+                    user=request.user,
+                    coalesce=True,
+                )
+                messages.info(request, f"CO Attainment for {course_obj.code} in {academic_year_obj} has been queued.")
+                return redirect("job_status", job_id=job.pk)
             else:
                 messages.error(request, "Please select both a Course and an Academic Year.")
 
@@ -1625,10 +1749,16 @@ def calculate_attainment_view(request):
             department_id = request.POST.get("po_department")
             academic_year_id = request.POST.get("po_academic_year")
             if department_id and academic_year_id:
-                department_obj = get_object_or_404(Department, pk=department_id)
+                department_obj = get_object_or_404(departments, pk=department_id)
                 academic_year_obj = get_object_or_404(AcademicYear, pk=academic_year_id)
-                calculate_po_attainment_for_department(department_obj, academic_year_obj)
-                messages.success(request, f"PO Attainment calculated for {department_obj.name} in {academic_year_obj}!")
+                job = enqueue(
+                    "attainment.po_by_department",
+                    {"department_id": department_obj.pk, "academic_year_id": academic_year_obj.pk},
+                    user=request.user,
+                    coalesce=True,
+                )
+                messages.info(request, f"PO Attainment for {department_obj.name} in {academic_year_obj} has been queued.")
+                return redirect("job_status", job_id=job.pk)
             else:
                  messages.error(request, "Please select both a Department and an Academic Year.")
         
@@ -1643,6 +1773,162 @@ def calculate_attainment_view(request):
     return render(request, "academics/calculate_attainment_form.html", context)
 
 
+# --- Threshold Sweep ("what-if") ---
+
+def _attainment_scope(user):
+    """Departments and courses a user may calculate attainment for."""
+    if is_hod(user):
+        departments = Department.objects.filter(pk=user.profile.department.pk)
+        return departments, Course.objects.filter(department__in=departments)
+    return Department.objects.all(), Course.objects.all()
+
+
+@login_required
+@user_passes_test(is_admin_or_hod)
+def attainment_threshold_sweep_view(request):
+    departments, courses = _attainment_scope(request.user)
+    context = {
+        "courses": courses.order_by("code"),
+        "departments": departments.order_by("name"),
+        "academic_years": AcademicYear.objects.all().order_by("-start_date"),
+        "form_title": "Attainment Threshold Explorer",
+    }
+    return render(request, "academics/attainment_threshold_sweep.html", context)
+
+
+@login_required
+@user_passes_test(is_admin_or_hod)
+def attainment_threshold_sweep_api(request):
+    """
+    Attainment of every CO of a course or department at every threshold from 0 to
+    100, for charting. Query parameters: academic_year, and course or department.
+    """
+    departments, courses = _attainment_scope(request.user)
+    academic_year_id = request.GET.get("academic_year")
+    course_id = request.GET.get("course")
+    department_id = request.GET.get("department")
+    if not academic_year_id or not (course_id or department_id):
+        return JsonResponse({"error": "Select an academic year and a course or department."}, status=400)
+
+    try:
+        academic_year_obj = AcademicYear.objects.get(pk=academic_year_id)
+        course_obj = courses.get(pk=course_id) if course_id else None
+        department_obj = departments.get(pk=department_id) if department_id and not course_id else None
+    except (AcademicYear.DoesNotExist, Course.DoesNotExist, Department.DoesNotExist, ValueError):
+        return JsonResponse({"error": "Academic year, course or department not found."}, status=404)
+
+    curves = sweep_co_attainment(academic_year_obj, course_obj=course_obj, department_obj=department_obj)
+    labels = {
+        pk: f"{course_code} {code}"
+        for pk, code, course_code in CourseOutcome.objects.filter(pk__in=curves).values_list("pk", "code", "course__code")
+    }
+    return JsonResponse({
+        "thresholds": list(range(0, 101)),
+        "curves": [
+            {
+                "co_id": co_id,
+                "label": labels.get(co_id, str(co_id)),
+                "students": students,
+                "attainment": [round(float(value), 2) for value in attainment],
+            }
+            for co_id, (students, attainment) in sorted(curves.items(), key=lambda item: labels.get(item[0], ""))
+        ],
+    })
+
+
+# --- Attainment Trends ---
+
+@login_required
+@user_passes_test(is_admin_or_hod)
+def attainment_trends_view(request):
+    departments, _ = _attainment_scope(request.user)
+    context = {
+        "departments": departments.order_by("name"),
+        "trend_years": DEFAULT_TREND_YEARS,
+        "form_title": "Attainment Trends",
+    }
+    return render(request, "academics/attainment_trends.html", context)
+
+
+@login_required
+@user_passes_test(is_admin_or_hod)
+def attainment_trends_api(request):
+    """
+    A department's PO and per-course CO attainment over its latest academic years,
+    from the precomputed trend cube. Query parameters: department, years (default 5).
+    """
+    departments, _ = _attainment_scope(request.user)
+    department_id = request.GET.get("department")
+    if not department_id:
+        return JsonResponse({"error": "Select a department."}, status=400)
+    try:
+        years = int(request.GET.get("years", DEFAULT_TREND_YEARS))
+    except ValueError:
+        return JsonResponse({"error": "Years must be a whole number."}, status=400)
+    try:
+        department_obj = departments.get(pk=department_id)
+    except (Department.DoesNotExist, ValueError):
+        return JsonResponse({"error": "Department not found."}, status=404)
+
+    return JsonResponse(department_trends(department_obj, years=max(1, min(years, 20))))
+
+
+# --- Background Job Status ---
+
+def _get_visible_job(request, job_id):
+    """
+    Admins see every job; everyone else the jobs they queued, and admins and HODs
+    also the attainment jobs of the courses and departments they may calculate,
+    since their triggers join a job someone else queued for the same scope.
+    """
+    job = get_object_or_404(BackgroundJob, pk=job_id)
+    if is_admin(request.user) or job.created_by_id == request.user.pk:
+        return job
+    if job.task.startswith("attainment.") and is_admin_or_hod(request.user):
+        departments, courses = _attainment_scope(request.user)
+        if "course_id" in job.payload and courses.filter(pk=job.payload["course_id"]).exists():
+            return job
+        if "department_id" in job.payload and departments.filter(pk=job.payload["department_id"]).exists():
+            return job
+    raise Http404("No job matches the given query.")
+
+
+def _job_as_dict(job):
+    return {
+        "id": job.pk,
+        "task": job.task,
+        "status": job.status,
+        "status_display": job.get_status_display(),
+        "is_finished": job.is_finished,
+        "attempts": job.attempts,
+        "max_attempts": job.max_attempts,
+        "created_at": job.created_at.isoformat(),
+        "started_at": job.started_at.isoformat() if job.started_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+        "run_after": job.run_after.isoformat(),
+        "result": job.result,
+        # Tracebacks stay in the admin; users get the last line
+        "error": job.error.strip().splitlines()[-1] if job.error.strip() else "",
+    }
+
+
+@login_required
+def job_status(request, job_id):
+    job = _get_visible_job(request, job_id)
+    context = {
+        "job": job,
+        "job_data": _job_as_dict(job),
+        "form_title": f"Job #{job.pk}",
+    }
+    return render(request, "academics/job_status.html", context)
+
+
+@login_required
+def job_status_api(request, job_id):
+    job = _get_visible_job(request, job_id)
+    return JsonResponse(_job_as_dict(job))
+
+
 @login_required
 @user_passes_test(is_admin_or_hod_or_faculty, login_url="/accounts/login/")
 def co_attainment_report_list(request):
@@ -1741,6 +2027,7 @@ def po_attainment_report_list(request):
         "selected_academic_year_id": selected_academic_year_id,
         "selected_department_id": selected_department_id, # Pass to template
         "is_hod": is_hod_user,
+        "can_export_student_po": is_admin_or_hod(request.user),
         "form_title": "Program Outcome Attainment Report",
     }
     return render(request, "academics/po_attainment_report_list.html", context)
@@ -1789,40 +2076,27 @@ def student_personal_marks_view(request):
 def student_personal_attainment_view(request):
     student_user = request.user
 
-    # Get courses where student has marks
-    courses_with_student_marks = Course.objects.filter(
-        assessments__student_marks__student=student_user
-    ).distinct()
-
-    # Fix: Get academic years through assessments
-    academic_years = AcademicYear.objects.filter(
-        assessments__student_marks__student=student_user
-    ).distinct()
-
-    # CO Attainments
-    co_attainments = (
-        CourseOutcomeAttainment.objects.filter(
-            course_outcome__course__in=courses_with_student_marks,
-            academic_year__in=academic_years,
-        )
-        .select_related(
-            "course_outcome__course",
-            "course_outcome__course__department",
-            "academic_year",
-        )
-        .order_by(
-            "-academic_year__start_date",
-            "course_outcome__course__code",
-            "course_outcome__code",
-        )
-    )
+    # The student's own CO percentages next to the class attainment, precomputed
+    # in StudentCOScore when attainment is calculated: one indexed query
+    co_attainments = list(student_co_scores(student_user.profile))
+    academic_year_ids = {score.academic_year_id for score in co_attainments}
 
-    # PO Attainments
-    po_attainments = (
-        ProgramOutcomeAttainment.objects.filter(academic_year__in=academic_years)
+    # PO Attainments of the student's department, with the student's own PO percentages
+    po_attainments = list(
+        ProgramOutcomeAttainment.objects.filter(
+            academic_year__in=academic_year_ids,
+            program_outcome__department_id=student_user.profile.department_id,
+        )
         .select_related("program_outcome", "academic_year")
         .order_by("-academic_year__start_date", "program_outcome__code")
     )
+    student_po = dict(
+        StudentPOAttainment.objects.filter(
+            student=student_user.profile, department_id=student_user.profile.department_id
+        ).values_list("academic_year_id", "attainment")
+    )
+    for po_att in po_attainments:
+        po_att.student_percentage = student_po.get(po_att.academic_year_id, {}).get(str(po_att.program_outcome_id))
 
     context = {
         "student_user": student_user,
@@ -1887,6 +2161,9 @@ def export_co_attainment_csv(request):
             "CO Code",
             "CO Description",
             "Attainment Percentage",
+            "Attainment Level",
+            "95% CI Lower",
+            "95% CI Upper",
         ]
     )
 
@@ -1909,12 +2186,61 @@ def export_co_attainment_csv(request):
                     if co_att.attainment_percentage is not None
                     else "N/A"
                 ),
+                (
+                    co_att.attainment_level
+                    if co_att.attainment_level is not None
+                    else "N/A"
+                ),
+                f"{co_att.ci_lower:.2f}%" if co_att.ci_lower is not None else "N/A",
+                f"{co_att.ci_upper:.2f}%" if co_att.ci_upper is not None else "N/A",
             ]
         )
 
     return response
 
 
+@login_required
+@user_passes_test(is_admin_or_hod, login_url="/accounts/login/")
+def export_student_po_attainment_csv(request):
+    """Exports every student's PO attainment for one department and academic year, one row per student."""
+    selected_academic_year_id = request.GET.get("academic_year")
+    selected_department_id = request.GET.get("department")
+    if is_hod(request.user):
+        selected_department_id = request.user.profile.department_id
+
+    if not (selected_academic_year_id and selected_department_id):
+        messages.error(request, "Select an academic year and a department to export student PO attainment.")
+        return redirect("po_attainment_report_list")
+
+    department = get_object_or_404(Department, pk=selected_department_id)
+    academic_year = get_object_or_404(AcademicYear, pk=selected_academic_year_id)
+    program_outcomes = list(ProgramOutcome.objects.filter(department=department).order_by("code"))
+    student_attainments = (
+        StudentPOAttainment.objects.filter(department=department, academic_year=academic_year)
+        .select_related("student__user")
+        .order_by("student__user__username")
+    )
+
+    response = HttpResponse(content_type="text/csv")
+    response["Content-Disposition"] = (
+        f'attachment; filename="student_po_attainment_{department.pk}_{academic_year.start_date.year}.csv"'
+    )
+    writer = csv.writer(response)
+    writer.writerow(
+        ["Academic Year", "Department", "Username", "Student Name"] + [po.code for po in program_outcomes]
+    )
+    year_label = f"{academic_year.start_date.year}-{academic_year.end_date.year}"
+    po_keys = [str(po.pk) for po in program_outcomes]
+    for row in student_attainments.iterator(chunk_size=2000):
+        percentages = [row.attainment.get(key) for key in po_keys]
+        writer.writerow(
+            [year_label, department.name, row.student.user.username, row.student.user.get_full_name()]
+            + [f"{value:.2f}%" if value is not None else "N/A" for value in percentages]
+        )
+
+    return response
+
+
 @login_required
 @user_passes_test(is_faculty)
 def create_student_by_faculty(request):
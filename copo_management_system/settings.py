@@ -135,3 +135,20 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 MEDIA_URL = '/submissions/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'submissions')
 
+
+# Attainment engine used by the CO/PO calculations: 'sql' (grouped queries),
+# 'matrix' (NumPy bulk load, suited to department-wide runs), 'scores'
+# (reads the precomputed StudentCOScore table) or 'cia' (aggregates per CIA
+# component of the course plan, scaled to the component weights, then per CO).
+ATTAINMENT_ENGINE = 'sql'
+
+# Attainment level bands: the minimum attainment percentage for levels 1, 2 and 3
+# (below the first band is level 0).
+ATTAINMENT_LEVEL_BANDS = (50, 60, 70)
+
+# Resamples drawn for the 95% bootstrap confidence interval stored with each CO
+# attainment.
+ATTAINMENT_BOOTSTRAP_RESAMPLES = 1000
+
+# The most mark cells one autosave PATCH may carry.
+MARKS_AUTOSAVE_MAX_CELLS = 200
@@ -10,7 +10,7 @@ class UserProfileInline(admin.StackedInline):
     can_delete = False
     verbose_name_plural = 'profile'
     fk_name = 'user'
-    fields = ('role',) # Only display the role field
+    fields = ('role', 'roll_number')
 
 # Define a new User admin
 class UserAdmin(BaseUserAdmin):
@@ -38,6 +38,6 @@ admin.site.register(User, UserAdmin)
 class UserProfileAdmin(admin.ModelAdmin):
     list_display = ('user', 'role')
     list_filter = ('role',)
-    search_fields = ('user__username', 'user__first_name', 'user__last_name') # Fields to search on for autocomplete
+    search_fields = ('user__username', 'user__first_name', 'user__last_name', 'roll_number') # Fields to search on for autocomplete
     raw_id_fields = ('user',) # Allows selecting User by ID, useful if many users
     autocomplete_fields = ['user'] # User model needs to have search_fields defined in its admin (which BaseUserAdmin does)
\ No newline at end of file
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.3 on 2026-10-18 10:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='roll_number',
+            field=models.CharField(blank=True, max_length=30, null=True, unique=True),
+        ),
+    ]
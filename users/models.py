@@ -28,6 +28,9 @@ class UserProfile(models.Model):
         related_name='user_profiles'
     )
 
+    # The institution's roll number for students, e.g. as the exam cell's mark sheets list them
+    roll_number = models.CharField(max_length=30, unique=True, null=True, blank=True)
+
     def __str__(self):
         return f"{self.user.username}'s Profile ({self.get_role_display()})"
 